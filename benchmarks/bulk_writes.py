@@ -0,0 +1,63 @@
+#!/usr/bin/env python
+"""
+Benchmark for TranslationQueryset bulk writes: update() of shared fields,
+delete() and delete_translations().
+
+Run from the repository root. Tables are created in a test database, which
+is an in-memory SQLite database unless DATABASE_URL is set:
+
+    python benchmarks/bulk_writes.py [--count N]
+"""
+from __future__ import print_function
+import os
+import sys
+import time
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hvad.test_utils.cli import configure
+configure()
+import django
+if django.VERSION >= (1, 7):
+    django.setup()
+
+from django.db import connection
+from hvad.test_utils.project.app.models import Normal
+
+
+def populate(count):
+    Normal.objects.all().delete()
+    for index in range(count):
+        obj = Normal.objects.language('en').create(shared_field='shared%d' % index,
+                                                   translated_field='English%d' % index)
+        obj.translate('ja')
+        obj.translated_field = 'Japanese%d' % index
+        obj.save()
+
+
+CASES = (
+    ('update shared fields', lambda: Normal.objects.language('en').update(shared_field='updated')),
+    ('update filtered on shared', lambda: Normal.objects.language('en')
+                                                        .filter(shared_field__startswith='shared1')
+                                                        .update(shared_field='updated')),
+    ('delete_translations', lambda: Normal.objects.language('ja').delete_translations()),
+    ('delete_translations filtered', lambda: Normal.objects.language('ja')
+                                                           .filter(shared_field__startswith='shared1')
+                                                           .delete_translations()),
+    ('delete', lambda: Normal.objects.language('en').delete()),
+)
+
+
+def main(count):
+    connection.creation.create_test_db(verbosity=0)
+    for name, case in CASES:
+        populate(count)
+        start = time.time()
+        case()
+        print('%-30s %8.2f ms' % (name, (time.time() - start) * 1e3))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--count', type=int, default=2000)
+    main(parser.parse_args().count)
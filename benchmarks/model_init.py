@@ -0,0 +1,39 @@
+#!/usr/bin/env python
+"""
+Microbenchmark for TranslatableModel instantiation.
+
+Run from the repository root:
+
+    python benchmarks/model_init.py [--number N]
+"""
+from __future__ import print_function
+import os
+import sys
+import timeit
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from hvad.test_utils.cli import configure
+configure()
+
+from hvad.test_utils.project.app.models import Normal
+
+CASES = (
+    ('positional (database rows)', lambda: Normal(1, 'shared')),
+    ('shared fields only', lambda: Normal(shared_field='shared')),
+    ('shared and translated fields', lambda: Normal(shared_field='shared',
+                                                    translated_field='translated',
+                                                    language_code='en')),
+)
+
+
+def main(number):
+    for name, case in CASES:
+        best = min(timeit.repeat(case, number=number, repeat=3))
+        print('%-30s %8.2f us per instance' % (name, best * 1e6 / number))
+
+
+if __name__ == '__main__':
+    import argparse
+    parser = argparse.ArgumentParser()
+    parser.add_argument('--number', type=int, default=100000)
+    main(parser.parse_args().number)
@@ -1,17 +1,21 @@
 import functools
 import django
 from django.conf import settings
-from django.contrib.admin.options import ModelAdmin, csrf_protect_m, InlineModelAdmin
+from django.contrib.admin.options import (ModelAdmin, csrf_protect_m, InlineModelAdmin,
+                                          IncorrectLookupParameters)
+from django.contrib.admin.views.main import ChangeList, PAGE_VAR
 if django.VERSION >= (1, 7):
     from django.contrib.admin.utils import (flatten_fieldsets, unquote,
         get_deleted_objects)
 else:
     from django.contrib.admin.util import (flatten_fieldsets, unquote,
         get_deleted_objects)
-from django.contrib.contenttypes.models import ContentType
-from django.core.exceptions import PermissionDenied
+from django.core.exceptions import PermissionDenied, ValidationError
+from django.core.paginator import InvalidPage, Page, Paginator
 from django.core.urlresolvers import reverse
-from django.db import router, transaction
+from django.db import connections, router
+from django.db.models import Q
+from django.db.models.fields import FieldDoesNotExist
 from django.forms.models import model_to_dict
 if django.VERSION >= (1, 7):
     from django.forms.utils import ErrorList
@@ -26,17 +30,16 @@ from django.utils.encoding import iri_to_uri
 from django.utils.functional import curry
 from django.utils.translation import ugettext_lazy as _, get_language
 from functools import update_wrapper
+import json
+from hvad.compat.atomic import atomic
 from hvad.compat.force_unicode import force_unicode
+from hvad.compat.string_types import string_types
 from hvad.compat.urls import urlencode
 from hvad.forms import TranslatableModelForm, translatable_inlineformset_factory, translatable_modelform_factory
 from hvad.utils import get_cached_translation, get_translation
 from hvad.manager import FALLBACK_LANGUAGES
 
 
-atomic = (transaction.atomic if django.VERSION >= (1, 6) else
-          transaction.commit_on_success)
-
-
 def get_language_name(language_code):
     return dict(settings.LANGUAGES).get(language_code, language_code)
 
@@ -139,8 +142,9 @@ class TranslatableAdmin(ModelAdmin, TranslatableModelAdminMixin):
 
 
     def get_url(self, obj, lang=None, get={}):
-        ct = ContentType.objects.get_for_model(self.model)
-        info = ct.app_label, ct.model
+        opts = self.model._meta
+        info = opts.app_label, opts.object_name.lower()
+        get = dict(get)
         if lang:
             get.update({self.query_language_key: lang})
         url = '%s?%s' % (self.reverse('admin:%s_%s_change' % info, args=(obj.id,)), urlencode(get))
@@ -341,20 +345,29 @@ class TranslatableAdmin(ModelAdmin, TranslatableModelAdminMixin):
         obj.delete()
     
     def get_object(self, request, object_id):
-        obj = super(TranslatableAdmin, self).get_object(request, object_id)
-        if obj is None: # object was not in queryset, bail out
+        if django.VERSION >= (1, 6):
+            queryset = self.get_queryset(request)
+        else:
+            queryset = self.queryset(request)
+        request_lang = self._language(request)
+        if hasattr(queryset, 'use_fallbacks'):
+            # Translations in other languages would be discarded below, so
+            # only load the requested one
+            queryset = queryset.use_fallbacks(request_lang)
+        model = queryset.model
+        try:
+            obj = queryset.get(pk=model._meta.pk.to_python(object_id))
+        except (model.DoesNotExist, ValidationError, ValueError):
+            # object was not in queryset, bail out
             return None
 
-        # object was in queryset - need to make sure we got the right translation
-        # we use getattr to trigger a load if instance exists but translation was
-        # not cached yet. Should not happen with current code, but is correct,
-        # future-proof behavior.
-        language_code = getattr(obj, 'language_code', None)
-        request_lang = self._language(request)
-        if language_code is None or language_code != request_lang:
-            # if language does not match that of request, we know request_lang
-            # does not exist, because it was the first language in the use_fallbacks
-            # list. We prepare it as a new translation.
+        # object was in queryset - need to make sure we got the right
+        # translation. Only the cached translation is checked, so that no
+        # query is made if there is none.
+        trans = get_cached_translation(obj)
+        if trans is None or trans.language_code != request_lang:
+            # request_lang does not exist, as it was the only fallback
+            # language. We prepare it as a new translation.
             obj.translate(request_lang)
         return obj
 
@@ -365,6 +378,9 @@ class TranslatableAdmin(ModelAdmin, TranslatableModelAdminMixin):
             if not lang in languages:
                 languages.append(lang)
         qs = self.model._default_manager.untranslated().use_fallbacks(*languages)
+        if hasattr(qs, 'load_languages'):
+            # all_translations and language tabs need them for every object
+            qs = qs.load_languages()
         # TODO: this should be handled by some parameter to the ChangeList.
         ordering = getattr(self, 'ordering', None) or () # otherwise we might try to *None, which is bad ;)
         if ordering:
@@ -621,3 +637,280 @@ class TranslatableStackedInline(TranslatableInlineModelAdmin):
 
 class TranslatableTabularInline(TranslatableInlineModelAdmin):
     template = 'admin/hvad/edit_inline/tabular.html'
+
+
+#===============================================================================
+# Keyset pagination
+#===============================================================================
+
+CURSOR_VAR = 'k'
+SORT_PREFIX = '_hvad_sort_'
+
+def _get_keyset_field(model, name):
+    if name == 'pk':
+        return model._meta.pk
+    return model._meta.get_field(name)
+
+def get_keyset_keys(queryset):
+    """
+    Return the ordering of queryset as a list of (lookup, field, descending)
+    tuples, up to the first unique field, or None if it cannot be used for
+    seeking: random or related ordering, or no unique field. Extra selects
+    named by KeysetChangeList after translated fields use that field.
+    """
+    model = queryset.model
+    shared_model = getattr(model._meta, 'shared_model', None)
+    keys = []
+    for name in queryset.query.order_by:
+        if not isinstance(name, string_types) or name == '?':
+            return None
+        lookup = name.lstrip('-')
+        try:
+            if lookup in queryset.query.extra:
+                if not lookup.startswith(SORT_PREFIX) or shared_model is not None:
+                    return None
+                field = _get_keyset_field(model._meta.translations_model,
+                                          lookup[len(SORT_PREFIX):])
+            elif shared_model is not None and lookup.startswith('master__'):
+                # TranslationQueryset, ordered on a shared field
+                field = _get_keyset_field(shared_model, lookup[len('master__'):])
+            else:
+                field = _get_keyset_field(model, lookup)
+        except FieldDoesNotExist:
+            return None
+        if field.rel is not None:
+            return None
+        keys.append((lookup, field, name.startswith('-')))
+        if field.unique and lookup not in queryset.query.extra:
+            return keys
+    return None
+
+def _nulls_follow(connection, descending):
+    """ Whether rows with NULL values come after others in given direction """
+    nulls_largest = connection.vendor in ('postgresql', 'oracle')
+    return nulls_largest != descending
+
+def _keyset_q(queryset, keys, values):
+    """
+    Build the condition selecting rows after values in the given ordering:
+    (a > x) OR (a = x AND b > y) OR ...
+    """
+    connection = connections[queryset.db]
+    q = None
+    for index, (lookup, field, descending) in enumerate(keys):
+        term = Q(**{'%s__%s' % (lookup, 'lt' if descending else 'gt'): values[index]})
+        if field.null and _nulls_follow(connection, descending):
+            term |= Q(**{'%s__isnull' % lookup: True})
+        for key, value in zip(keys[:index], values[:index]):
+            term &= Q(**{key[0]: value})
+        q = term if q is None else q | term
+    return q
+
+def _keyset_where(queryset, keys, values):
+    """
+    Same as _keyset_q, as raw SQL and parameters, for orderings that include
+    extra selects.
+    """
+    connection = connections[queryset.db]
+    qn = connection.ops.quote_name
+    table = qn(queryset.model._meta.db_table)
+    columns = []
+    for lookup, field, descending in keys:
+        if lookup in queryset.query.extra:
+            sql, params = queryset.query.extra[lookup]
+            columns.append((sql, list(params), True))
+        else:
+            columns.append(('%s.%s' % (table, qn(field.column)), [], field.null))
+    terms, params = [], []
+    for index, (lookup, field, descending) in enumerate(keys):
+        parts = []
+        for (sql, sql_params, null), key, value in zip(columns[:index], keys[:index], values[:index]):
+            parts.append('%s = %%s' % sql)
+            params.extend(sql_params)
+            params.append(key[1].get_db_prep_value(value, connection=connection))
+        sql, sql_params, null = columns[index]
+        condition = '%s %s %%s' % (sql, '<' if descending else '>')
+        params.extend(sql_params)
+        params.append(field.get_db_prep_value(values[index], connection=connection))
+        if null and _nulls_follow(connection, descending):
+            condition = '(%s OR %s IS NULL)' % (condition, sql)
+            params.extend(sql_params)
+        parts.append(condition)
+        terms.append('(%s)' % ' AND '.join(parts))
+    return '(%s)' % ' OR '.join(terms), params
+
+
+class KeysetPaginator(Paginator):
+    """
+    Paginator able to get a page from the ordering values of the last object
+    of previous page, seeking to it instead of using an OFFSET, whose cost
+    grows with the page number. The object list must be a queryset ordered
+    by fields of the model, the last one being unique.
+    """
+    _keys = False
+
+    def get_keys(self):
+        if self._keys is False:
+            self._keys = get_keyset_keys(self.object_list)
+        return self._keys
+
+    def get_cursor(self, obj):
+        """
+        Return the ordering values of obj, as a list of strings to pass to
+        page_after(), or None if they cannot be used for seeking.
+        """
+        keys = self.get_keys()
+        if keys is None:
+            return None
+        extra = self.object_list.query.extra
+        cursor = []
+        for lookup, field, descending in keys:
+            value = getattr(obj, lookup if lookup in extra else field.attname, None)
+            if value is None:
+                # NULL values cannot be compared
+                return None
+            cursor.append(force_unicode(value) if lookup in extra else
+                          field.value_to_string(obj))
+        return cursor
+
+    def page_after(self, number, cursor):
+        """
+        Return page number, which must come right after the page whose last
+        object gave cursor. Raises ValueError if cursor is not valid for the
+        current ordering.
+        """
+        number = self.validate_number(number)
+        keys = self.get_keys()
+        if keys is None or len(cursor) != len(keys):
+            raise ValueError('Cursor does not match ordering.')
+        try:
+            values = [field.to_python(value) for (lookup, field, descending), value
+                      in zip(keys, cursor)]
+        except ValidationError:
+            raise ValueError('Cursor does not match ordering.')
+        bottom = (number - 1) * self.per_page
+        top = bottom + self.per_page
+        if top + self.orphans >= self.count:
+            top = self.count
+        qs = self.object_list
+        if any(lookup in qs.query.extra for lookup, field, descending in keys):
+            where, params = _keyset_where(qs, keys, values)
+            qs = qs.extra(where=[where], params=params)
+        else:
+            qs = qs._clone()
+            qs.query.add_q(_keyset_q(qs, keys, values))
+        return Page(qs[:top - bottom], number, self)
+
+
+class KeysetChangeList(ChangeList):
+    """
+    ChangeList using KeysetPaginator to seek to next page, and able to sort
+    on translated fields, in current language. Objects not translated in that
+    language are still listed, sorted as if the field was NULL.
+    Links to next page carry the ordering values of the last instance of
+    current page. Other pages still use an OFFSET.
+    """
+    def __init__(self, request, *args, **kwargs):
+        self.cursor = request.GET.get(CURSOR_VAR)
+        self._next_cursor = False
+        super(KeysetChangeList, self).__init__(request, *args, **kwargs)
+
+    def _get_root_queryset(self):
+        if django.VERSION >= (1, 6):
+            return self.root_queryset
+        return self.root_query_set
+
+    def _set_root_queryset(self, queryset):
+        if django.VERSION >= (1, 6):
+            self.root_queryset = queryset
+        else:
+            self.root_query_set = queryset
+
+    def _get_translated_sort_names(self, ordering):
+        names = self.model._translated_field_names.difference(('master',))
+        return [name.lstrip('-') for name in ordering
+                if isinstance(name, string_types) and name.lstrip('-') in names]
+
+    def _get_translated_sort_sql(self, queryset, name):
+        """
+        Correlated subquery selecting field name of the translation in
+        current language. The changelist query is never used as a subquery
+        itself, so the shared table keeps its name.
+        """
+        qn = connections[queryset.db].ops.quote_name
+        opts = self.model._meta
+        topts = opts.translations_model._meta
+        return '(SELECT hvad_sort.%s FROM %s hvad_sort WHERE hvad_sort.%s = %s.%s AND hvad_sort.%s = %%s)' % (
+            qn(topts.get_field(name).column), qn(topts.db_table),
+            qn(topts.get_field('master').column), qn(opts.db_table), qn(opts.pk.column),
+            qn(topts.get_field('language_code').column))
+
+    def get_ordering(self, request, queryset):
+        ordering = super(KeysetChangeList, self).get_ordering(request, queryset)
+        names = self._get_translated_sort_names(ordering)
+        return [('-' if name.startswith('-') else '') + SORT_PREFIX + name.lstrip('-')
+                if isinstance(name, string_types) and name.lstrip('-') in names else name
+                for name in ordering]
+
+    def get_queryset(self, request):
+        # Not a lookup, keep it away from filters
+        self.params.pop(CURSOR_VAR, None)
+        queryset = self._get_root_queryset()
+        names = self._get_translated_sort_names(
+            super(KeysetChangeList, self).get_ordering(request, queryset))
+        if names:
+            # Sort on subqueries, as joining the translation would drop
+            # untranslated objects
+            language_code = (self.model_admin._language(request)
+                             if hasattr(self.model_admin, '_language') else get_language())
+            for name in names:
+                queryset = queryset.extra(
+                    select={SORT_PREFIX + name: self._get_translated_sort_sql(queryset, name)},
+                    select_params=(language_code,))
+            self._set_root_queryset(queryset)
+        if django.VERSION >= (1, 6):
+            return super(KeysetChangeList, self).get_queryset(request)
+        return super(KeysetChangeList, self).get_query_set(request)
+    if django.VERSION < (1, 6):
+        get_query_set = get_queryset
+
+    def get_results(self, request):
+        super(KeysetChangeList, self).get_results(request)
+        if (self.cursor is None or not isinstance(self.paginator, KeysetPaginator) or
+                not self.multi_page or (self.show_all and self.can_show_all)):
+            return
+        try:
+            cursor = json.loads(self.cursor)
+            if cursor[0] != self.page_num:
+                return
+            self.result_list = self.paginator.page_after(self.page_num + 1,
+                                                         cursor[1:]).object_list
+        except InvalidPage:
+            raise IncorrectLookupParameters
+        except (ValueError, TypeError, IndexError, KeyError):
+            # Stale or tampered cursor, fall back to the OFFSET
+            pass
+
+    def get_next_cursor(self):
+        """
+        Return the cursor of next page, or None if there is none or it cannot
+        be computed. Loads the results of current page.
+        """
+        if self._next_cursor is False:
+            self._next_cursor = None
+            if (isinstance(self.paginator, KeysetPaginator) and self.multi_page and
+                    not (self.show_all and self.can_show_all)):
+                objects = list(self.result_list)
+                if len(objects) == self.list_per_page:
+                    cursor = self.paginator.get_cursor(objects[-1])
+                    if cursor is not None:
+                        self._next_cursor = json.dumps([self.page_num + 1] + cursor)
+        return self._next_cursor
+
+    def get_query_string(self, new_params=None, remove=None):
+        if new_params and new_params.get(PAGE_VAR) == self.page_num + 1:
+            cursor = self.get_next_cursor()
+            if cursor is not None:
+                new_params = dict(new_params)
+                new_params[CURSOR_VAR] = cursor
+        return super(KeysetChangeList, self).get_query_string(new_params, remove)
@@ -0,0 +1,170 @@
+from contextlib import contextmanager
+from django.db import router, DEFAULT_DB_ALIAS
+from hvad.compat.atomic import atomic
+from hvad.utils import write_translations
+import threading
+
+_local = threading.local()
+
+def get_batch():
+    """
+    Return the batch collecting writes in this thread, or None.
+    """
+    return getattr(_local, 'batch', None)
+
+@contextmanager
+def batch(using=None):
+    """
+    Context manager collecting writes to translatable models, and flushing
+    them at exit, all inside one transaction on database using:
+        - saves of existing translatable instances are delayed, so saving
+          an instance several times writes it once;
+        - saves of cached translations, including new ones from translate(),
+          are delayed and written with a single INSERT per translations
+          model, and one UPDATE per translation that changed;
+        - translations deleted with delete_translations() are deleted with
+          a single DELETE per translations model.
+    New instances are inserted right away, as their primary key may be
+    needed. Deleting an instance drops its queued saves. Writes routed to
+    another database raise ValueError, as they would escape the transaction.
+    Nested batches join the outermost one.
+    """
+    current = get_batch()
+    if current is not None:
+        yield current
+        return
+    current = _local.batch = Batch(using or DEFAULT_DB_ALIAS)
+    try:
+        with atomic(using=using):
+            yield current
+            current.flush()
+    finally:
+        _local.batch = None
+
+
+def _merge_update_fields(previous, update_fields):
+    if previous is None or update_fields is None:
+        return None
+    return set(previous).union(update_fields)
+
+
+class Batch(object):
+    """
+    Writes collected by batch(). Queued writes are flushed in dependency
+    order: shared instances first, then deleted translations, then saved
+    translations.
+    """
+    def __init__(self, using=DEFAULT_DB_ALIAS):
+        self.using = using
+        self.flushing = False
+        self._shared = {}           # id(instance) -> (instance, kwargs)
+        self._shared_order = []
+        self._translations = {}     # id(translation) -> (translation, master, update_fields)
+        self._translations_order = []
+        self._deleted = {}          # (model, alias) -> {pk: master_id}
+        self._discarded = {}        # id(translation) -> translation, deleted
+
+    def get_database(self, instance, using=None):
+        """
+        Return the database instance is written to, which must be the one
+        of the batch.
+        """
+        using = using or instance._state.db or router.db_for_write(instance.__class__,
+                                                                  instance=instance)
+        if using != self.using:
+            raise ValueError('Cannot write %s to database %r within a batch on database %r.' %
+                             (instance.__class__.__name__, using, self.using))
+        return using
+
+    def save_shared(self, instance, kwargs):
+        self.get_database(instance, kwargs.get('using'))
+        # Saving again after deleting its translation writes it back
+        self._discarded.pop(id(getattr(instance, instance._meta.translations_cache, None)), None)
+        key = id(instance)
+        if key in self._shared:
+            previous = self._shared[key][1]
+            if 'update_fields' in previous or 'update_fields' in kwargs:
+                kwargs = dict(kwargs, update_fields=_merge_update_fields(
+                    previous.get('update_fields'), kwargs.get('update_fields')))
+        else:
+            self._shared_order.append(key)
+        self._shared[key] = (instance, kwargs)
+
+    def save_translation(self, translation, master, update_fields=None):
+        self.get_database(master)
+        key = id(translation)
+        if key in self._discarded:
+            return
+        if key in self._translations:
+            update_fields = _merge_update_fields(self._translations[key][2], update_fields)
+        else:
+            self._translations_order.append(key)
+        self._translations[key] = (translation, master, update_fields)
+
+    def delete_translations(self, model, using, rows):
+        """
+        Queue deletion of translations, given as (pk, master_id) tuples.
+        """
+        if using != self.using:
+            raise ValueError('Cannot delete %s on database %r within a batch on database %r.' %
+                             (model.__name__, using, self.using))
+        self._deleted.setdefault((model, using), {}).update(rows)
+
+    def discard(self, instance):
+        """
+        Drop queued saves of instance, which is being deleted: the shared
+        instance and its translations, or a translation.
+        """
+        key = id(instance)
+        if self._shared.pop(key, None) is not None:
+            self._shared_order.remove(key)
+        elif hasattr(instance._meta, 'shared_model'):
+            # Its master may still be queued, and queue it when flushed
+            self._discarded[key] = instance
+        for key in list(self._translations_order):
+            translation, master = self._translations[key][:2]
+            if translation is instance or master is instance:
+                del self._translations[key]
+                self._translations_order.remove(key)
+
+    def flush(self):
+        self.flushing = True
+        try:
+            # Saving shared instances queues their translations
+            while self._shared_order:
+                shared, order = self._shared, self._shared_order
+                self._shared, self._shared_order = {}, []
+                for key in order:
+                    instance, kwargs = shared[key]
+                    instance.save(**kwargs)
+            self._flush_translations()
+        finally:
+            self.flushing = False
+
+    def _flush_translations(self):
+        groups = {}     # (model, alias) -> (updated, created, deleted)
+        for (tmodel, using), rows in self._deleted.items():
+            group = groups.setdefault((tmodel._meta.shared_model, using), ([], [], {}))
+            group[2].update(rows)
+        for key in self._translations_order:
+            translation, master, update_fields = self._translations[key]
+            tmodel = translation.__class__
+            using = self.get_database(master)
+            updated, created, deleted = groups.setdefault((tmodel._meta.shared_model, using),
+                                                          ([], [], {}))
+            if translation.pk is None:
+                created.append((translation, master))
+            elif translation.pk not in deleted:
+                updated.append((translation, update_fields))
+        self._translations, self._translations_order = {}, []
+        self._deleted, self._discarded = {}, {}
+
+        for (model, using), (updated, created, deleted) in groups.items():
+            values = write_translations(model, using, updated,
+                                        [item[0] for item in created], deleted)
+            for translation, master in created:
+                if values is not None:
+                    setattr(master, model._meta.available_languages_field, values[master.pk])
+                languages = master._available_languages
+                if languages is not None and translation.language_code not in languages:
+                    master._available_languages = sorted(languages + [translation.language_code])
@@ -0,0 +1,488 @@
+from collections import defaultdict
+import django
+from django.conf import settings
+from django.core.signals import request_started
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.query import QuerySet
+from django.db.models.signals import post_save, post_delete
+from django.db.models.sql.datastructures import EmptyResultSet
+from hvad.compat.settings import settings_updater
+import hashlib
+import time
+if django.VERSION >= (1, 7):
+    from django.core.cache import caches
+else:
+    from django.core.cache import get_cache
+
+_backends = {}
+_local_generations = defaultdict(int)
+_local_modified = {}
+_snapshots = {}
+_models = set()
+
+def get_backend(alias=None):
+    alias = alias or CACHE_ALIAS
+    if django.VERSION >= (1, 7):
+        return caches[alias]
+    try:
+        return _backends[alias]
+    except KeyError:
+        backend = _backends[alias] = get_cache(alias)
+        return backend
+
+def enabled():
+    return CACHE_ALIAS is not None
+
+def generations_shared():
+    """
+    Return whether generations are shared between processes, so snapshots
+    and catalogs detect changes made by other processes.
+    """
+    return GENERATION_ALIAS is not None
+
+#===============================================================================
+# Keys and payloads
+#===============================================================================
+
+def _make_key(using, model, pk, language_code=''):
+    # db_table is shared by proxy models and their concrete model
+    return 'hvad:%s:%s:%s:%s' % (using or DEFAULT_DB_ALIAS, model._meta.db_table,
+                                 pk, language_code)
+
+def _dump(obj):
+    return tuple(getattr(obj, field.attname) for field in obj._meta.fields)
+
+def _make_generation_key(using, model):
+    return 'hvad:%s:%s:generation' % (using or DEFAULT_DB_ALIAS, model._meta.db_table)
+
+def _make_queryset_key(qs, model, extra):
+    # Compile a copy, as the compiler sets up joins on the query it works on
+    try:
+        sql, params = qs.query.clone().get_compiler(qs.db).as_sql()
+    except EmptyResultSet:
+        return None
+    digest = hashlib.md5(repr((sql, params, extra)).encode('utf-8')).hexdigest()
+    return 'hvad:%s:%s:%s:%s' % (qs.db, model._meta.db_table,
+                                 get_generation(model, qs.db), digest)
+
+def _load(model, values, using):
+    obj = model(*values)
+    obj._state.adding = False
+    obj._state.db = using or DEFAULT_DB_ALIAS
+    return obj
+
+def _set_master(trans, master):
+    setattr(trans, trans._meta.get_field('master').get_cache_name(), master)
+
+def _dump_row(instance):
+    trans = getattr(instance, instance._meta.translations_cache, None)
+    return (_dump(instance), None if trans is None else _dump(trans))
+
+def _load_row(model, row, using):
+    shared, translated = row
+    instance = _load(model, shared, using)
+    if translated is not None:
+        trans = _load(model._meta.translations_model, translated, using)
+        _set_master(trans, instance)
+        setattr(instance, model._meta.translations_cache, trans)
+    return instance
+
+#===============================================================================
+# Read-through API
+#===============================================================================
+
+def load_translation(instance, language_code):
+    """
+    Return the cached translation of instance in given language, or None.
+    """
+    if instance.pk is None:
+        return None
+    snapshot = get_snapshot(instance.__class__)
+    if snapshot is not None:
+        trans = snapshot.load_translation(instance, language_code)
+        if trans is not None:
+            return trans
+    if CACHE_ALIAS is None:
+        return None
+    tmodel = instance._meta.translations_model
+    values = get_backend().get(_make_key(instance._state.db, tmodel,
+                                         instance.pk, language_code))
+    if values is None:
+        return None
+    trans = _load(tmodel, values, instance._state.db)
+    _set_master(trans, instance)
+    return trans
+
+def store_translation(trans):
+    if CACHE_ALIAS is None or trans.master_id is None:
+        return
+    key = _make_key(trans._state.db, trans.__class__, trans.master_id,
+                    trans.language_code)
+    get_backend().set(key, _dump(trans), *CACHE_TIMEOUT_ARGS)
+
+def load_instance(model, pk, language_code, using=None):
+    """
+    Return a combined instance of model with given primary key, in given
+    language, if both its shared and translated parts are cached, or None.
+    """
+    snapshot = get_snapshot(model)
+    if snapshot is not None:
+        instance = snapshot.load_instance(model, pk, language_code, using)
+        if instance is not None:
+            return instance
+    if CACHE_ALIAS is None:
+        return None
+    tmodel = model._meta.translations_model
+    skey = _make_key(using, model, pk)
+    tkey = _make_key(using, tmodel, pk, language_code)
+    found = get_backend().get_many((skey, tkey))
+    if len(found) < 2:
+        return None
+    instance = _load(model, found[skey], using)
+    trans = _load(tmodel, found[tkey], using)
+    _set_master(trans, instance)
+    setattr(instance, model._meta.translations_cache, trans)
+    return instance
+
+def store_instance(instance):
+    if CACHE_ALIAS is None or instance.pk is None:
+        return
+    opts = instance._meta
+    data = {_make_key(instance._state.db, instance.__class__, instance.pk): _dump(instance)}
+    trans = getattr(instance, opts.translations_cache, None)
+    if trans is not None and trans.master_id is not None:
+        key = _make_key(trans._state.db, trans.__class__, trans.master_id,
+                        trans.language_code)
+        data[key] = _dump(trans)
+    get_backend().set_many(data, *CACHE_TIMEOUT_ARGS)
+
+#===============================================================================
+# Queryset results
+#===============================================================================
+
+def get_generation(model, using=None):
+    """
+    Return the current generation of model's cached queryset results.
+    """
+    backend = get_backend(GENERATION_ALIAS)
+    key = _make_generation_key(using, model)
+    generation = backend.get(key)
+    if generation is None:
+        # Start from the current time, so a generation evicted from the
+        # cache does not restart at a value older results were stored under
+        backend.add(key, int(time.time() * 1000))
+        generation = backend.get(key, 0)
+    return generation
+
+def get_local_generation(model, using=None):
+    """
+    Return the generation of model as seen by this process. Unlike
+    get_generation(), it is only aware of changes made by this process, and
+    it is tracked even if the cache is disabled.
+    """
+    return _local_generations[_make_generation_key(using, model)]
+
+def get_local_modified(model, using=None):
+    """
+    Return the time model was last changed by this process, or None.
+    """
+    return _local_modified.get(_make_generation_key(using, model))
+
+def bump_generation(model, using=None):
+    """
+    Make all cached queryset results and snapshots of model stale. Model is
+    the shared model.
+    """
+    key = _make_generation_key(using, model)
+    _local_generations[key] += 1
+    _local_modified[key] = time.time()
+    if GENERATION_ALIAS is None:
+        return
+    try:
+        get_backend(GENERATION_ALIAS).incr(key)
+    except ValueError:
+        pass    # not set yet, next get_generation() will start a new one
+
+def cached_results(qs, model, fetch, timeout=None, extra=()):
+    """
+    Return an iterator over the results of qs, a queryset of model instances
+    with their translations. Results are loaded from the cache if possible,
+    otherwise they are fetched by calling fetch() and stored.
+    Extra is hashed into the cache key, for settings the query depends on
+    that are not part of its SQL.
+    """
+    key = _make_queryset_key(qs, model, extra)
+    if key is None:
+        return fetch()
+    backend = get_backend()
+    rows = backend.get(key)
+    if rows is not None:
+        return iter([_load_row(model, row, qs.db) for row in rows])
+
+    objects = list(fetch())
+    # Translations without a master cannot be rebuilt, do not cache those
+    if all(hasattr(obj._meta, 'translations_model') for obj in objects):
+        rows = [_dump_row(obj) for obj in objects]
+        backend.set(key, rows, *(CACHE_TIMEOUT_ARGS if timeout is None else (timeout,)))
+    return iter(objects)
+
+#===============================================================================
+# Invalidation
+#===============================================================================
+
+def invalidate(sender, instance, **kwargs):
+    """
+    Signal receiver for post_save and post_delete, dropping the cache entry of
+    saved or deleted shared and translations model instances, and making
+    cached queryset results of their model stale.
+    """
+    if sender not in _models:
+        return
+    opts = sender._meta
+    if hasattr(opts, 'translations_model'):
+        if CACHE_ALIAS is not None and instance.pk is not None:
+            get_backend().delete(_make_key(instance._state.db, sender, instance.pk))
+        bump_generation(sender, instance._state.db)
+    elif hasattr(opts, 'shared_model'):
+        if CACHE_ALIAS is not None and instance.master_id is not None:
+            get_backend().delete(_make_key(instance._state.db, sender, instance.master_id,
+                                           instance.language_code))
+        bump_generation(opts.shared_model, instance._state.db)
+
+def invalidate_queryset(qs):
+    """
+    Invalidate all shared and translated cache entries matching a queryset on
+    a translations model, or shared cache entries matching a queryset on a
+    shared model. Bulk operations do not send signals, so they must call this
+    before altering the rows, and bump_generation() after.
+    Runs one query if the cache is enabled.
+    """
+    if CACHE_ALIAS is None:
+        return
+    if hasattr(qs.model._meta, 'translations_model'):
+        keys = [_make_key(qs.db, qs.model, pk)
+                for pk in QuerySet.values_list(qs, 'pk', flat=True)]
+        if keys:
+            get_backend().delete_many(keys)
+        return
+    tmodel = qs.model
+    smodel = tmodel._meta.shared_model
+    keys = set()
+    for master_id, language_code in QuerySet.values_list(qs, 'master', 'language_code'):
+        if master_id is None:
+            continue
+        keys.add(_make_key(qs.db, smodel, master_id))
+        keys.add(_make_key(qs.db, tmodel, master_id, language_code))
+    if keys:
+        get_backend().delete_many(list(keys))
+
+#===============================================================================
+# Snapshots
+#===============================================================================
+
+def dump_model(model, using=None):
+    """
+    Return all instances of model as a dict of tuples of field values indexed
+    by primary key, and all their translations as a dict of dicts of tuples
+    of field values, indexed by primary key then language code.
+    Runs two queries.
+    """
+    fields = model._meta.fields
+    pk_index = fields.index(model._meta.pk)
+    shared = {}
+    qs = QuerySet(model, using=using).order_by()
+    for values in qs.values_list(*[field.name for field in fields]):
+        shared[values[pk_index]] = values
+
+    tmodel = model._meta.translations_model
+    names = [field.name for field in tmodel._meta.fields]
+    master_index, language_index = names.index('master'), names.index('language_code')
+    translations = defaultdict(dict)
+    qs = QuerySet(tmodel, using=using).filter(master__isnull=False).order_by()
+    for values in qs.values_list(*names):
+        translations[values[master_index]][values[language_index]] = values
+    return shared, dict(translations)
+
+
+class Snapshot(object):
+    """
+    Process-local, read-only copy of all instances of a model along with all
+    their translations, loaded in two queries at first use. Instances are
+    stored as tuples of field values and rebuilt on every lookup, so callers
+    cannot alter the snapshot.
+
+    The snapshot is reloaded once the local generation of the model changes,
+    or the shared generation does if generations are shared. The latter is
+    only checked once per request.
+    """
+    def __init__(self, model):
+        self.model = model
+        self._data = {}
+        self._checked = set()
+
+    def clear(self):
+        self._data.clear()
+        self._checked.clear()
+
+    def _load(self, using):
+        # Read versions first, so changes made while loading trigger a reload
+        version = (get_local_generation(self.model, using),
+                   get_generation(self.model, using) if generations_shared() else None)
+        return (version,) + dump_model(self.model, using)
+
+    def _get_data(self, using):
+        using = using or DEFAULT_DB_ALIAS
+        data = self._data.get(using)
+        if data is not None and data[0][0] == get_local_generation(self.model, using):
+            if not generations_shared() or using in self._checked:
+                return data
+            if data[0][1] == get_generation(self.model, using):
+                self._checked.add(using)
+                return data
+        data = self._data[using] = self._load(using)
+        self._checked.add(using)
+        return data
+
+    # Lookup primitives, returning tuples of field values
+
+    def available(self, using):
+        return True
+
+    def _get_shared(self, using, pk):
+        return self._get_data(using)[1].get(pk)
+
+    def _get_translations(self, using, pk):
+        return self._get_data(using)[2].get(pk, {})
+
+    def _get_translation(self, using, pk, language_code):
+        return self._get_translations(using, pk).get(language_code)
+
+    # Public API, returning instances
+
+    def _load_translation(self, values, instance):
+        trans = _load(self.model._meta.translations_model, values, instance._state.db)
+        _set_master(trans, instance)
+        return trans
+
+    def load_translation(self, instance, language_code):
+        """
+        Return the translation of instance in given language, or None.
+        """
+        values = self._get_translation(instance._state.db, instance.pk, language_code)
+        if values is None:
+            return None
+        return self._load_translation(values, instance)
+
+    def load_translations(self, instance):
+        """
+        Return a list of all translations of instance, or None if instance
+        is not in the snapshot.
+        """
+        using = instance._state.db
+        if self._get_shared(using, instance.pk) is None:
+            return None
+        return [self._load_translation(values, instance)
+                for values in self._get_translations(using, instance.pk).values()]
+
+    def load_instance(self, model, pk, language_code, using=None):
+        """
+        Return a combined instance of model, which can be a proxy model, or
+        None if it is not in the snapshot in given language.
+        """
+        values = self._get_shared(using, pk)
+        tvalues = self._get_translation(using, pk, language_code)
+        if values is None or tvalues is None:
+            return None
+        instance = _load(model, values, using)
+        setattr(instance, model._meta.translations_cache,
+                self._load_translation(tvalues, instance))
+        return instance
+
+    def iter_fallbacks(self, instances, fallbacks):
+        """
+        Attach to each instance its translation in the first language of
+        fallbacks it is available in, if any, and yield it.
+        """
+        tcache = self.model._meta.translations_cache
+        for instance in instances:
+            for language_code in fallbacks:
+                values = self._get_translation(instance._state.db, instance.pk, language_code)
+                if values is not None:
+                    setattr(instance, tcache, self._load_translation(values, instance))
+                    break
+            yield instance
+
+
+def get_snapshot(model):
+    """
+    Return the snapshot of model, or None if it has none.
+    """
+    return _snapshots.get(model._meta.db_table)
+
+def get_snapshots():
+    """
+    Return a list of all registered snapshots.
+    """
+    return list(_snapshots.values())
+
+def register_snapshot(model, snapshot=None):
+    """
+    Enable snapshots for model, using given Snapshot instance or a new
+    in-memory one. Called by TranslationManager(snapshot=True).
+    """
+    if snapshot is not None:
+        _snapshots[model._meta.db_table] = snapshot
+    else:
+        snapshot = _snapshots.get(model._meta.db_table)
+        if snapshot is None:
+            snapshot = _snapshots[model._meta.db_table] = Snapshot(model)
+    request_started.connect(reset_snapshot_checks, dispatch_uid='hvad.cache.reset_snapshot_checks')
+    _connect_receivers()
+    return snapshot
+
+def reset_snapshot_checks(**kwargs):
+    """
+    Signal receiver for request_started, having snapshots check the shared
+    generation of their model again on next access.
+    """
+    for snapshot in _snapshots.values():
+        snapshot._checked.clear()
+
+#===============================================================================
+# Settings
+#===============================================================================
+
+def _connect_receivers(models=None):
+    # Only listen to signals while needed, and only from translatable models
+    # and their translations models, as delete signal receivers prevent
+    # Django from using fast deletes
+    active = CACHE_ALIAS is not None or bool(_snapshots)
+    for model in (_models if models is None else models):
+        for signal in (post_save, post_delete):
+            if active:
+                signal.connect(invalidate, sender=model, dispatch_uid='hvad.cache.invalidate')
+            else:
+                signal.disconnect(sender=model, dispatch_uid='hvad.cache.invalidate')
+
+def register_model(model):
+    """
+    Have cache entries of model and its translations model invalidated when
+    their instances are saved or deleted, while the cache or any snapshot is
+    enabled. Called by TranslatableModelBase for every translatable model,
+    including proxy and deferred ones.
+    """
+    models = (model, model._meta.translations_model)
+    _models.update(models)
+    _connect_receivers(models)
+
+@settings_updater
+def update_settings(*args, **kwargs):
+    global CACHE_ALIAS, GENERATION_ALIAS, CACHE_TIMEOUT_ARGS
+    CACHE_ALIAS = getattr(settings, 'HVAD_TRANSLATION_CACHE', None)
+    # Generations are needed by the translation cache, and may be shared
+    # without it, for snapshots and catalogs only
+    GENERATION_ALIAS = getattr(settings, 'HVAD_GENERATION_CACHE', None) or CACHE_ALIAS
+    timeout = getattr(settings, 'HVAD_TRANSLATION_CACHE_TIMEOUT', None)
+    # Passing no timeout lets the backend use its default
+    CACHE_TIMEOUT_ARGS = () if timeout is None else (timeout,)
+    _connect_receivers()
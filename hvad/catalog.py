@@ -0,0 +1,236 @@
+from django.conf import settings
+from django.db import DEFAULT_DB_ALIAS
+from hvad import cache as translation_cache
+from hvad.compat.settings import settings_updater
+import hashlib
+import mmap
+import os
+import pickle
+import struct
+import time
+
+_MAGIC = b'HVADCAT1'
+_header = struct.Struct('<8sQ')     # magic, directory length
+_entry = struct.Struct('<QQI')      # key hash, record offset, record length
+
+_catalog = None
+
+def _set_catalog(catalog):
+    # Close the previous catalog, so replaced files are not kept mapped
+    global _catalog
+    if _catalog is not None and _catalog is not catalog:
+        _catalog.close()
+    _catalog = catalog
+
+@settings_updater
+def update_settings(*args, **kwargs):
+    global CATALOG_PATH
+    CATALOG_PATH = getattr(settings, 'HVAD_CATALOG', None)
+    _set_catalog(None)
+
+#===============================================================================
+# File format
+#===============================================================================
+# A catalog file is made of:
+#   - a header, giving the length of the directory;
+#   - the directory, a pickled dict mapping (database alias, table name) to a
+#     tuple (generation, export time, index offset, index length);
+#   - records, each a pickled (key, payload) tuple. Shared records have a
+#     (field values, language codes) payload, translation records have field
+#     values as payload;
+#   - for every model, an index of fixed-size entries sorted by key hash.
+# All offsets are relative to the end of the directory.
+
+def _make_key(pk, language_code=''):
+    return '%s:%s' % (pk, language_code)
+
+def _hash(key):
+    digest = hashlib.md5(key.encode('utf-8')).digest()
+    return struct.unpack('<Q', digest[:8])[0]
+
+def export_catalog(path, models, using=None):
+    """
+    Write all instances and translations of models to a catalog file at path.
+    The file is replaced atomically, so processes reading the previous
+    catalog are not disturbed. Runs two queries per model.
+    """
+    using = using or DEFAULT_DB_ALIAS
+    directory = {}
+    chunks, position = [], 0
+    for model in models:
+        # Read generation and time first, so changes made while exporting
+        # make the catalog stale
+        generation = (translation_cache.get_generation(model, using)
+                      if translation_cache.generations_shared() else None)
+        exported = time.time()
+        shared, translations = translation_cache.dump_model(model, using)
+
+        records = []
+        for pk, values in shared.items():
+            languages = translations.get(pk, {})
+            records.append((_make_key(pk), (values, tuple(sorted(languages)))))
+            for language_code, tvalues in languages.items():
+                records.append((_make_key(pk, language_code), tvalues))
+
+        index = []
+        for key, payload in records:
+            data = pickle.dumps((key, payload), 2)
+            index.append((_hash(key), position, len(data)))
+            chunks.append(data)
+            position += len(data)
+        index.sort()
+        directory[(using, model._meta.db_table)] = (generation, exported, position, len(index))
+        for entry in index:
+            chunks.append(_entry.pack(*entry))
+            position += _entry.size
+
+    directory = pickle.dumps(directory, 2)
+    tmp_path = '%s.tmp' % path
+    with open(tmp_path, 'wb') as fobj:
+        fobj.write(_header.pack(_MAGIC, len(directory)))
+        fobj.write(directory)
+        for data in chunks:
+            fobj.write(data)
+    # os.rename() does not replace existing files on Windows
+    getattr(os, 'replace', os.rename)(tmp_path, path)
+
+
+class Catalog(object):
+    """
+    Read-only, memory-mapped catalog file. Only the directory is loaded,
+    records are looked up in the mapping, so the memory is shared by all
+    processes through the page cache.
+    """
+    def __init__(self, path):
+        self.path = path
+        with open(path, 'rb') as fobj:
+            stat = os.fstat(fobj.fileno())
+            self.signature = (stat.st_ino, stat.st_mtime, stat.st_size)
+            self._map = mmap.mmap(fobj.fileno(), 0, access=mmap.ACCESS_READ)
+        self.closed = False
+        magic, length = _header.unpack_from(self._map, 0)
+        if magic != _MAGIC:
+            self.close()
+            raise ValueError('%s is not a translation catalog' % path)
+        self.directory = pickle.loads(self._map[_header.size:_header.size + length])
+        self._base = _header.size + length
+
+    def close(self):
+        """
+        Unmap the file. Lookups must not be made afterwards.
+        """
+        self._map.close()
+        self.closed = True
+
+    def is_current(self, model, using=None, shared=True):
+        """
+        Return whether model is in the catalog and unchanged since export.
+        Changes made by this process are always detected, changes made by
+        other processes only if generations are shared and shared is set.
+        """
+        try:
+            generation, exported = self.directory[(using or DEFAULT_DB_ALIAS,
+                                                   model._meta.db_table)][:2]
+        except KeyError:
+            return False
+        modified = translation_cache.get_local_modified(model, using)
+        if modified is not None and modified >= exported:
+            return False
+        if not shared or not translation_cache.generations_shared():
+            return True
+        return generation == translation_cache.get_generation(model, using)
+
+    def find(self, model, pk, language_code='', using=None):
+        """
+        Return the payload stored for (pk, language_code), or None.
+        """
+        try:
+            generation, exported, index, count = self.directory[(using or DEFAULT_DB_ALIAS,
+                                                       model._meta.db_table)]
+        except KeyError:
+            return None
+        key = _make_key(pk, language_code)
+        digest = _hash(key)
+        index += self._base
+
+        low, high = 0, count
+        while low < high:
+            middle = (low + high) // 2
+            if _entry.unpack_from(self._map, index + middle * _entry.size)[0] < digest:
+                low = middle + 1
+            else:
+                high = middle
+        # Check all entries with that hash, in case of collisions
+        while low < count:
+            entry = _entry.unpack_from(self._map, index + low * _entry.size)
+            if entry[0] != digest:
+                break
+            offset = self._base + entry[1]
+            stored_key, payload = pickle.loads(self._map[offset:offset + entry[2]])
+            if stored_key == key:
+                return payload
+            low += 1
+        return None
+
+
+def get_catalog():
+    """
+    Return the catalog named by the HVAD_CATALOG setting, opening it again if
+    the file was replaced, or None if there is none. The previous catalog is
+    closed when replaced.
+    """
+    if CATALOG_PATH is None:
+        return None
+    try:
+        stat = os.stat(CATALOG_PATH)
+    except OSError:
+        _set_catalog(None)
+        return None
+    if _catalog is None or _catalog.signature != (stat.st_ino, stat.st_mtime, stat.st_size):
+        _set_catalog(Catalog(CATALOG_PATH))
+    return _catalog
+
+
+class CatalogSnapshot(translation_cache.Snapshot):
+    """
+    Snapshot reading from the catalog instead of memory. The catalog is used
+    until the model is modified by this process or, if generations are
+    shared, by any process. Replaced catalog files are picked up at the start
+    of the next request.
+    """
+    def _get_catalog(self, using):
+        using = using or DEFAULT_DB_ALIAS
+        catalog = self._data.get(using)
+        # Another snapshot may have replaced and closed the catalog
+        if using not in self._checked or (catalog is not None and catalog.closed):
+            self._checked.add(using)
+            catalog = get_catalog()
+            if catalog is not None and not catalog.is_current(self.model, using):
+                catalog = None
+            self._data[using] = catalog
+        catalog = self._data[using]
+        if catalog is None or not catalog.is_current(self.model, using, shared=False):
+            return None
+        return catalog
+
+    def available(self, using):
+        return self._get_catalog(using) is not None
+
+    def _get_shared(self, using, pk):
+        catalog = self._get_catalog(using)
+        record = None if catalog is None else catalog.find(self.model, pk, using=using)
+        return None if record is None else record[0]
+
+    def _get_translations(self, using, pk):
+        catalog = self._get_catalog(using)
+        record = None if catalog is None else catalog.find(self.model, pk, using=using)
+        if record is None:
+            return {}
+        return dict((language_code, catalog.find(self.model, pk, language_code, using))
+                    for language_code in record[1])
+
+    def _get_translation(self, using, pk, language_code):
+        catalog = self._get_catalog(using)
+        if catalog is None:
+            return None
+        return catalog.find(self.model, pk, language_code, using)
@@ -0,0 +1,145 @@
+from django.conf import settings
+from django.db import connections, models
+from django.db.models.query import QuerySet
+from django.db.models.sql.datastructures import EmptyResultSet
+
+
+class Coverage(object):
+    """
+    Which instances of a model are translated in which languages.
+
+    Instances are described by their primary key, in pks, and a bit mask, in
+    masks, bit n being set if the instance has a translation in languages[n].
+    """
+    def __init__(self, model, languages, fields):
+        self.model = model
+        self.languages = tuple(languages)
+        self.fields = tuple(fields)
+        self.pks = []
+        self.masks = []
+        self.translated = dict((language_code, 0) for language_code in self.languages)
+        self.empty = dict(((name, language_code), 0)
+                          for name in self.fields for language_code in self.languages)
+        self._positions = None
+
+    def __len__(self):
+        return len(self.pks)
+
+    def has_translation(self, pk, language_code):
+        """
+        Return whether the instance with primary key pk is translated in
+        language_code.
+        """
+        if self._positions is None:
+            self._positions = dict((pk, index) for index, pk in enumerate(self.pks))
+        bit = 1 << self.languages.index(language_code)
+        return bool(self.masks[self._positions[pk]] & bit)
+
+    def missing(self, language_code):
+        """
+        Return the primary keys of instances not translated in language_code.
+        """
+        bit = 1 << self.languages.index(language_code)
+        return [pk for pk, mask in zip(self.pks, self.masks) if not mask & bit]
+
+    def matrix(self):
+        """
+        Return coverage as a list of rows, one per instance, each holding one
+        boolean per language.
+        """
+        bits = [1 << index for index in range(len(self.languages))]
+        return [[bool(mask & bit) for bit in bits] for mask in self.masks]
+
+
+def _fetch_rows(cursor, size=1000):
+    while True:
+        rows = cursor.fetchmany(size)
+        if not rows:
+            break
+        for row in rows:
+            yield row
+
+def _is_text(field):
+    return isinstance(field, (models.CharField, models.TextField))
+
+def get_coverage(queryset, languages=None, fields=None):
+    """
+    Compute the translation coverage of instances in queryset, which can be
+    a translatable model or a queryset on it. Runs a single query.
+
+    Besides which languages instances are translated in, the number of
+    translations in each language is counted, along with the number of
+    translations leaving each field empty, that is NULL or, for text fields,
+    an empty string. Fields default to all translated fields.
+    """
+    if not isinstance(queryset, QuerySet):
+        queryset = QuerySet(queryset)
+    if hasattr(queryset.model._meta, 'shared_model'):
+        # TranslationQueryset, select masters of matching translations
+        qs = queryset._clone()._add_language_filter()
+        model = queryset.shared_model
+        ids = QuerySet(qs.model, query=qs.query.clone(), using=qs.db)
+        ids = ids.order_by().values_list('master', flat=True)
+    else:
+        qs, model = queryset, queryset.model
+        ids = QuerySet(model, query=qs.query.clone(), using=qs.db)
+        ids = ids.order_by().values_list('pk', flat=True)
+
+    if languages is None:
+        languages = [code for code, name in settings.LANGUAGES]
+    opts = model._meta.translations_model._meta
+    if fields is None:
+        model_fields = [field for field in opts.fields
+                        if field.name not in ('master', 'language_code')
+                        and not field.primary_key]
+    else:
+        model_fields = [opts.get_field(name) for name in fields]
+    coverage = Coverage(model, languages, [field.name for field in model_fields])
+
+    try:
+        inner_sql, inner_params = ids.query.get_compiler(qs.db).as_sql()
+    except EmptyResultSet:
+        return coverage
+
+    connection = connections[qs.db]
+    qn = connection.ops.quote_name
+    language_code = qn('language_code')
+    checks = []
+    for field in model_fields:
+        column = 'T.%s' % qn(field.column)
+        if _is_text(field):
+            checks.append("CASE WHEN %s IS NULL OR %s = '' THEN 1 ELSE 0 END" % (column, column))
+        else:
+            checks.append('CASE WHEN %s IS NULL THEN 1 ELSE 0 END' % column)
+    pk = qn(model._meta.pk.column)
+    sql = ('SELECT S.%s, T.%s%s FROM %s S LEFT OUTER JOIN %s T '
+           'ON T.%s = S.%s AND T.%s IN (%s) WHERE S.%s IN (%s) ORDER BY S.%s' % (
+               pk, language_code, ''.join(', ' + check for check in checks),
+               qn(model._meta.db_table), qn(opts.db_table),
+               qn(opts.get_field('master').column), pk,
+               language_code, ', '.join(['%s'] * len(languages)),
+               pk, inner_sql, pk))
+    cursor = connection.cursor()
+    cursor.execute(sql, list(languages) + list(inner_params))
+
+    # Rows come ordered by pk, one per translation or a single one with
+    # a NULL language if there is none
+    positions = dict((code, index) for index, code in enumerate(coverage.languages))
+    names = coverage.fields
+    pks, masks = coverage.pks, coverage.masks
+    translated, empty = coverage.translated, coverage.empty
+    convert = connection.ops.convert_values
+    current = None
+    for row in _fetch_rows(cursor):
+        if not pks or row[0] != current:
+            current = row[0]
+            pks.append(convert(current, model._meta.pk))
+            masks.append(0)
+        if row[1] is None:
+            continue
+        masks[-1] |= 1 << positions[row[1]]
+        translated[row[1]] += 1
+        for name, flag in zip(names, row[2:]):
+            if flag:
+                empty[(name, row[1])] += 1
+    return coverage
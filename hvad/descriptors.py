@@ -1,6 +1,7 @@
 import django
 from django.utils.translation import get_language
-from hvad.utils import get_translation
+from hvad import cache as translation_cache
+from hvad.utils import get_translation, report_lazy_load
 if django.VERSION >= (1, 7):
     from django.apps import registry
 
@@ -17,13 +18,19 @@ class BaseDescriptor(object):
     def translation(self, instance):
         cached = getattr(instance, self.opts.translations_cache, None)
         if cached is None:
-            try:
-                cached = get_translation(instance)
-            except self.opts.translations_model.DoesNotExist:
-                raise self._NoTranslationError('Accessing a translated field requires that '
-                                               'the instance has a translation loaded, or a '
-                                               'valid translation in current language (%s) '
-                                               'loadable from the database' % get_language())
+            # Snapshots are in memory, so loading from them is not reported
+            snapshot = translation_cache.get_snapshot(instance.__class__)
+            if snapshot is not None:
+                cached = snapshot.load_translation(instance, get_language())
+            if cached is None:
+                report_lazy_load(instance, 'Translated field access')
+                try:
+                    cached = get_translation(instance)
+                except self.opts.translations_model.DoesNotExist:
+                    raise self._NoTranslationError('Accessing a translated field requires that '
+                                                   'the instance has a translation loaded, or a '
+                                                   'valid translation in current language (%s) '
+                                                   'loadable from the database' % get_language())
             setattr(instance, self.opts.translations_cache, cached)
         return cached
 
@@ -48,10 +55,14 @@ class TranslatedAttribute(BaseDescriptor):
         return getattr(self.translation(instance), self.name)
     
     def __set__(self, instance, value):
-        setattr(self.translation(instance), self.name, value)
+        translation = self.translation(instance)
+        translation._track_changes()
+        setattr(translation, self.name, value)
     
     def __delete__(self, instance):
-        delattr(self.translation(instance), self.name)
+        translation = self.translation(instance)
+        translation._track_changes()
+        delattr(translation, self.name)
 
 
 class LanguageCodeAttribute(TranslatedAttribute):
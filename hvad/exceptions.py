@@ -1,3 +1,7 @@
 from django.db.models.fields import FieldDoesNotExist
 
-class WrongManager(Exception): pass
\ No newline at end of file
+class WrongManager(Exception): pass
+
+class LazyLoadWarning(RuntimeWarning): pass
+
+class LazyLoadError(RuntimeError): pass
@@ -1,21 +1,28 @@
 import django
 from django.conf import settings
 from django.core.exceptions import FieldError, ValidationError
+from django.core.validators import EMPTY_VALUES
 from django.forms.fields import CharField
 from django.forms.forms import get_declared_fields
 from django.forms.formsets import formset_factory
 from django.forms.models import (ModelForm, ModelFormMetaclass, ModelFormOptions, 
     fields_for_model, model_to_dict, construct_instance, BaseInlineFormSet, BaseModelFormSet,
-    inlineformset_factory)
+    ModelChoiceField, inlineformset_factory)
 if django.VERSION >= (1, 7):
     from django.forms.utils import ErrorList
 else:
     from django.forms.util import ErrorList
 from django.forms.widgets import Select, media_property
 from django.utils.translation import get_language, ugettext as _
+from hvad.compat.atomic import atomic
 from hvad.compat.metaclasses import with_metaclass
+from hvad.compat.settings import settings_updater
 from hvad.models import TranslatableModel, BaseTranslationModel
-from hvad.utils import get_cached_translation, get_translation, combine
+from hvad.utils import (get_cached_translation, get_translation, combine, load_translations,
+                        write_translations)
+from collections import deque
+import threading
+import types
 
 
 class TranslatableModelFormMetaclass(ModelFormMetaclass):
@@ -182,6 +189,7 @@ class TranslatableModelForm(with_metaclass(TranslatableModelFormMetaclass, Model
         else:
             trans = trans_model()
 
+        trans._track_changes()
         trans = construct_instance(self, trans, self._meta.fields)
         trans.language_code = language_code
         trans.master = self.instance
@@ -197,8 +205,11 @@ class TranslatableModelForm(with_metaclass(TranslatableModelFormMetaclass, Model
                 # the instance is not translated into the current language. If
                 # it succeeded, then the instance would already be translated,
                 # and there'd be no point combining it with the same
-                # translation again.
-                trans = get_translation(self.instance, self.language)
+                # translation again. The cached translation is used if it is
+                # in the right language, saving a query.
+                trans = get_cached_translation(self.instance)
+                if trans is None or trans.language_code != self.language:
+                    trans = get_translation(self.instance, self.language)
                 trans.master = self.instance
                 self.instance = combine(trans, self.Meta.model)
             except self.instance._meta.translations_model.DoesNotExist:
@@ -218,9 +229,75 @@ def LanguageAwareCleanMixin(language):
     return type('BoundCleanMixin', (CleanMixin,), {'language': language})
 
 
+#===============================================================================
+# Form class cache
+#===============================================================================
+# Form classes built by translatable_modelform_factory are kept in a bounded
+# cache, oldest classes being dropped first. Only calls whose arguments
+# identify the resulting class are cached: formfield_callback must be None or
+# a plain function. Closures and bound methods, such as the admin's callback,
+# which is bound to the request, are not cached.
+
+_form_classes = {}
+_form_class_keys = deque()
+_form_class_lock = threading.Lock()     # serializes changes to both above
+
+def clear_form_class_cache():
+    with _form_class_lock:
+        _form_classes.clear()
+        _form_class_keys.clear()
+
+@settings_updater
+def update_settings(*args, **kwargs):
+    global FORM_CLASS_CACHE_SIZE
+    FORM_CLASS_CACHE_SIZE = getattr(settings, 'HVAD_FORM_CLASS_CACHE_SIZE', 100)
+    clear_form_class_cache()
+
+def _get_form_class_key(language, model, form, fields, exclude, formfield_callback):
+    if FORM_CLASS_CACHE_SIZE <= 0:
+        return None
+    if formfield_callback is not None:
+        if (not isinstance(formfield_callback, types.FunctionType) or
+            formfield_callback.__closure__ is not None):
+            return None
+    key = (language, model, form,
+           None if fields is None else tuple(fields),
+           None if exclude is None else tuple(exclude),
+           formfield_callback)
+    try:
+        hash(key)
+    except TypeError:
+        return None
+    return key
+
 def translatable_modelform_factory(language, model, form=TranslatableModelForm,
                                    fields=None, exclude=None,
                                    formfield_callback=None):
+    """
+    Returns a TranslatableModelForm class for given language and model.
+    Classes are cached, so calls with the same arguments may return the
+    same class, which must not be altered.
+    """
+    key = _get_form_class_key(language, model, form, fields, exclude, formfield_callback)
+    if key is not None:
+        try:
+            return _form_classes[key]
+        except KeyError:
+            pass
+    form_class = _build_modelform(language, model, form, fields, exclude,
+                                  formfield_callback)
+    if key is not None:
+        with _form_class_lock:
+            if key in _form_classes:
+                # Built concurrently by another thread: share its class
+                return _form_classes[key]
+            while _form_class_keys and len(_form_class_keys) >= FORM_CLASS_CACHE_SIZE:
+                _form_classes.pop(_form_class_keys.popleft(), None)
+            _form_classes[key] = form_class
+            _form_class_keys.append(key)
+    return form_class
+
+def _build_modelform(language, model, form, fields, exclude, formfield_callback):
     # Create the inner Meta class. FIXME: ideally, we should be able to
     # construct a ModelForm without creating and passing in a temporary
     # inner class.
@@ -250,8 +327,28 @@ def translatable_modelform_factory(language, model, form=TranslatableModelForm,
     clean_mixin = LanguageAwareCleanMixin(language)
     return type(class_name, (clean_mixin, form,), form_class_attrs)
 
+class TranslatableFormSetMixin(object):
+    """
+    Loads the translations of all instances in the language of the form at
+    once, instead of letting each form query its own.
+    """
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            qs = super(TranslatableFormSetMixin, self).get_queryset()
+            load_translations(qs, getattr(self.form, 'language', get_language()), qs.db)
+        return super(TranslatableFormSetMixin, self).get_queryset()
+
+
+class BaseTranslatableModelFormSet(TranslatableFormSetMixin, BaseModelFormSet):
+    pass
+
+
+class BaseTranslatableInlineFormSet(TranslatableFormSetMixin, BaseInlineFormSet):
+    pass
+
+
 def translatable_modelformset_factory(language, model, form=TranslatableModelForm, formfield_callback=None,
-                         formset=BaseModelFormSet,
+                         formset=BaseTranslatableModelFormSet,
                          extra=1, can_delete=False, can_order=False,
                          max_num=None, fields=None, exclude=None):
     """
@@ -265,7 +362,7 @@ def translatable_modelformset_factory(language, model, form=TranslatableModelFor
     return FormSet
 
 def translatable_inlineformset_factory(language, parent_model, model, form=TranslatableModelForm,
-                          formset=BaseInlineFormSet, fk_name=None,
+                          formset=BaseTranslatableInlineFormSet, fk_name=None,
                           fields=None, exclude=None,
                           extra=3, can_order=False, can_delete=True, max_num=None,
                           formfield_callback=None):
@@ -296,15 +393,141 @@ def translatable_inlineformset_factory(language, parent_model, model, form=Trans
     return FormSet
 
 
+class _LoadedObjectField(ModelChoiceField):
+    """
+    Primary key field of grid formset forms, looking up instances among those
+    already loaded by the formset instead of querying each.
+    """
+    def __init__(self, formset, *args, **kwargs):
+        self.formset = formset
+        super(_LoadedObjectField, self).__init__(*args, **kwargs)
+
+    def to_python(self, value):
+        if value in EMPTY_VALUES:
+            return None
+        try:
+            value = self.formset._existing_object(self.formset.model._meta.pk.to_python(value))
+        except ValidationError:
+            value = None
+        if value is None:
+            raise ValidationError(self.error_messages['invalid_choice'], code='invalid_choice')
+        return value
+
+
+class BaseTranslationGridFormSet(BaseTranslatableModelFormSet):
+    """
+    A formset editing the translations of many instances in a single
+    language, one form per instance. Instances are loaded along with their
+    translation in a single query, missing translations are created in memory
+    and only changed translations are written, all at once.
+    Forms may only include translated fields.
+    """
+    def get_queryset(self):
+        if not hasattr(self, '_queryset'):
+            qs = self.queryset
+            if qs is None:
+                qs = self.model._default_manager.untranslated()
+            if hasattr(qs, 'use_fallbacks'):
+                language = getattr(self.form, 'language', get_language())
+                qs = qs._clone().use_fallbacks(language)
+                if not qs.ordered:
+                    qs = qs.order_by(self.model._meta.pk.name)
+                # Translations in language are the first fallback, so any
+                # other loaded translation means there is none
+                for instance in qs:
+                    trans = get_cached_translation(instance)
+                    if trans is None or trans.language_code != language:
+                        instance.translate(language)
+                self._queryset = qs
+        return super(BaseTranslationGridFormSet, self).get_queryset()
+
+    def add_fields(self, form, index):
+        super(BaseTranslationGridFormSet, self).add_fields(form, index)
+        name = self._pk_field.name
+        field = form.fields.get(name)
+        if isinstance(field, ModelChoiceField):
+            form.fields[name] = _LoadedObjectField(self, field.queryset, initial=field.initial,
+                                                   required=False, widget=field.widget)
+
+    def save(self, commit=True):
+        if not commit:
+            return super(BaseTranslationGridFormSet, self).save(commit)
+        return self._bulk_save()
+    save.alters_data = True
+
+    @atomic
+    def _bulk_save(self):
+        """
+        Write changed translations: one UPDATE per changed translation, and
+        a single INSERT for new ones. Translations are written directly, so
+        their save() method is not called and no signals are sent for them.
+        """
+        using = self.get_queryset().db
+        self.new_objects, self.changed_objects, self.deleted_objects = [], [], []
+        created, updated = [], []
+        for form in self.initial_forms:
+            if not form.has_changed():
+                continue
+            instance = form.save(commit=False)
+            trans = get_cached_translation(instance)
+            if trans.pk is None:
+                created.append(trans)
+            else:
+                updated.append((trans, None))
+            self.changed_objects.append((instance, form.changed_data))
+
+        write_translations(self.model, using, updated, created)
+        if created:
+            for instance, changed in self.changed_objects:
+                # Loaded languages are stale, let them be queried again if needed
+                instance._available_languages = None
+        return [instance for instance, changed in self.changed_objects]
+
+
+def translationgridformset_factory(language, model, form=TranslatableModelForm,
+                                   formset=BaseTranslationGridFormSet,
+                                   fields=None, exclude=None, formfield_callback=None):
+    """
+    Returns a grid FormSet class, editing translated fields of many instances
+    in given language. Fields default to all translated fields.
+    """
+    tfields = [field.name for field in model._meta.translations_model._meta.fields
+               if field.name not in ('master', 'language_code') and not field.primary_key]
+    if fields is None:
+        fields = tfields
+    shared = [name for name in fields if name not in tfields]
+    if shared:
+        raise FieldError('Grid formsets edit translated fields only, %s %s shared.' % (
+                         ', '.join(shared), 'is' if len(shared) == 1 else 'are'))
+    return translatable_modelformset_factory(language, model, form=form, formset=formset,
+                                             fields=fields, exclude=exclude,
+                                             formfield_callback=formfield_callback,
+                                             extra=0, can_delete=False)
+
 class BaseTranslationFormSet(BaseInlineFormSet):
     """A kind of inline formset for working with an instance's translations.
     It keeps track of the real object and combine()s it to the translations
     for validation and saving purposes.
     It can delete translations, but will refuse to delete the last one.
+
+    If bulk_save is set, saving writes all translations at once instead of
+    saving the combined instance for each of them. See _bulk_save().
     """
+    bulk_save = False
+
     def __init__(self, *args, **kwargs):
         super(BaseTranslationFormSet, self).__init__(*args, **kwargs)
         self.queryset = self.order_translations(self.queryset)
+        self._master_state = self._get_master_state()
+
+    def _get_master_state(self):
+        return [getattr(self.instance, field.attname) for field in self.instance._meta.fields]
+
+    def _construct_form(self, i, **kwargs):
+        form = super(BaseTranslationFormSet, self)._construct_form(i, **kwargs)
+        # Forms change their translation directly when validated
+        form.instance._track_changes()
+        return form
 
     def order_translations(self, qs):
         return qs.order_by('language_code')
@@ -361,6 +584,64 @@ class BaseTranslationFormSet(BaseInlineFormSet):
                 setattr(master, master._meta.translations_cache, stashed)
         return obj
 
+    def save(self, commit=True):
+        if commit and self.bulk_save:
+            return self._bulk_save()
+        return super(BaseTranslationFormSet, self).save(commit)
+    save.alters_data = True
+
+    @atomic
+    def _bulk_save(self):
+        """
+        Save the master, only if it is new or changed since the formset was
+        created, then all translations at once: one UPDATE per changed
+        translation, one INSERT for new ones and one DELETE for deleted ones.
+        Translations are written directly, so their save() and delete()
+        methods are not called and no signals are sent for them.
+        """
+        master = self.instance
+        opts = master._meta
+        using = master._state.db or self.get_queryset().db
+
+        if master.pk is None or self._get_master_state() != self._master_state:
+            # Do not let save_translations() save the cached translation
+            stashed = get_cached_translation(master)
+            if stashed is not None:
+                delattr(master, opts.translations_cache)
+            master.save(using=using)
+            if stashed is not None:
+                setattr(master, opts.translations_cache, stashed)
+            using = master._state.db
+            self._master_state = self._get_master_state()
+
+        self.new_objects, self.changed_objects, self.deleted_objects = [], [], []
+        updated = []
+        forms_to_delete = self.deleted_forms
+        for form in self.initial_forms:
+            obj = form.instance
+            if form in forms_to_delete:
+                self.deleted_objects.append(obj)
+            elif form.has_changed():
+                obj = form.save(commit=False)
+                obj.master = master
+                updated.append((obj, None))
+                self.changed_objects.append((obj, form.changed_data))
+        for form in self.extra_forms:
+            if form.has_changed() and not (self.can_delete and self._should_delete_form(form)):
+                obj = form.save(commit=False)
+                obj.master = master
+                self.new_objects.append(obj)
+
+        deleted = dict((obj.pk, master.pk) for obj in self.deleted_objects)
+        values = write_translations(master.__class__, using, updated, self.new_objects, deleted)
+        if values is not None:
+            setattr(master, opts.available_languages_field, values[master.pk])
+        if (deleted or self.new_objects or
+            any('language_code' in changed for obj, changed in self.changed_objects)):
+            # Loaded languages are stale, let them be queried again if needed
+            master._available_languages = None
+        return [item[0] for item in self.changed_objects] + self.new_objects
+
     def save_new(self, form, commit=True):
         return self._save_translation(form, commit)
 
@@ -0,0 +1,42 @@
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from hvad.orphans import count_orphans, delete_orphans
+from hvad.utils import get_translatable_models
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--database', action='store', dest='database',
+                    default=DEFAULT_DB_ALIAS,
+                    help='Database to delete translations from. Defaults to "default".'),
+        make_option('--batch-size', action='store', type='int', dest='batch_size', default=1000,
+                    help='Number of translations deleted per query. Defaults to 1000.'),
+        make_option('--limit', action='store', type='int', dest='limit', default=None,
+                    help='Stop after deleting that many translations of each model.'),
+        make_option('--dry-run', action='store_true', dest='dry_run', default=False,
+                    help='Only count orphan translations, without deleting them.'),
+    )
+    args = '[app_label.ModelName ...]'
+    help = ('Deletes translations that are not attached to any instance. If no '
+            'model is given, all translatable models having tables in the '
+            'database are processed.')
+
+    def handle(self, *labels, **options):
+        using = options.get('database')
+        try:
+            models = get_translatable_models(labels, using=using)
+        except ValueError as e:
+            raise CommandError(str(e))
+        if options.get('batch_size') < 1:
+            raise CommandError('Batch size must be a positive integer.')
+
+        for model in models:
+            label = '%s.%s' % (model._meta.app_label, model._meta.object_name)
+            if options.get('dry_run'):
+                count = count_orphans(model, using=using)
+                self.stdout.write('%s: %d orphan translation(s)\n' % (label, count))
+            else:
+                count = delete_orphans(model, batch_size=options.get('batch_size'),
+                                       limit=options.get('limit'), using=using)
+                self.stdout.write('%s: %d orphan translation(s) deleted\n' % (label, count))
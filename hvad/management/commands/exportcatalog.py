@@ -0,0 +1,38 @@
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from hvad import cache as translation_cache, catalog
+from hvad.utils import get_translatable_models
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--database', action='store', dest='database',
+                    default=DEFAULT_DB_ALIAS,
+                    help='Database to export translations from. Defaults to "default".'),
+        make_option('-o', '--output', action='store', dest='output', default=None,
+                    help='Catalog file to write. Defaults to the HVAD_CATALOG setting.'),
+    )
+    args = '[app_label.ModelName ...]'
+    help = ('Exports translatable models along with all their translations to a '
+            'catalog file. If no model is given, exports all models whose manager '
+            'was created with catalog=True.')
+
+    def handle(self, *labels, **options):
+        path = options.get('output') or catalog.CATALOG_PATH
+        if not path:
+            raise CommandError('No output file given and HVAD_CATALOG is not set.')
+
+        if labels:
+            try:
+                models = get_translatable_models(labels)
+            except ValueError as e:
+                raise CommandError(str(e))
+        else:
+            models = [snapshot.model for snapshot in translation_cache.get_snapshots()
+                      if isinstance(snapshot, catalog.CatalogSnapshot)]
+            if not models:
+                raise CommandError('No model given and no model uses the catalog.')
+
+        catalog.export_catalog(path, models, using=options.get('database'))
+        self.stdout.write('Exported %d model(s) to %s\n' % (len(models), path))
@@ -0,0 +1,45 @@
+from optparse import make_option
+from django.core.management.base import BaseCommand, CommandError
+from django.db import DEFAULT_DB_ALIAS
+from django.db.models.query import QuerySet
+from hvad.coverage import get_coverage
+from hvad.utils import get_translatable_models
+
+
+class Command(BaseCommand):
+    option_list = BaseCommand.option_list + (
+        make_option('--database', action='store', dest='database',
+                    default=DEFAULT_DB_ALIAS,
+                    help='Database to read translations from. Defaults to "default".'),
+        make_option('-l', '--languages', action='store', dest='languages', default=None,
+                    help='Comma-separated language codes. Defaults to the LANGUAGES setting.'),
+    )
+    args = 'app_label.ModelName [app_label.ModelName ...]'
+    help = ('Shows how many instances of translatable models are translated in '
+            'each language, and how many translations leave each field empty.')
+
+    def handle(self, *labels, **options):
+        if not labels:
+            raise CommandError('Enter at least one model.')
+        languages = options.get('languages')
+        if languages:
+            languages = languages.split(',')
+
+        try:
+            models = get_translatable_models(labels)
+        except ValueError as e:
+            raise CommandError(str(e))
+
+        for label, model in zip(labels, models):
+            coverage = get_coverage(QuerySet(model, using=options.get('database')),
+                                    languages=languages)
+            total = len(coverage)
+            self.stdout.write('%s: %d instance(s)\n' % (label, total))
+            for language_code in coverage.languages:
+                translated = coverage.translated[language_code]
+                self.stdout.write('  %s: %d translated, %d missing\n'
+                                  % (language_code, translated, total - translated))
+                for name in coverage.fields:
+                    empty = coverage.empty[(name, language_code)]
+                    if empty:
+                        self.stdout.write('    %s: %d empty\n' % (name, empty))
@@ -1,8 +1,9 @@
-from collections import defaultdict
+from collections import defaultdict, namedtuple
 import django
 from django.conf import settings
-from django.db import models, transaction, IntegrityError
-from django.db.models.query import QuerySet, ValuesQuerySet, DateQuerySet
+from django.core.exceptions import ValidationError
+from django.db import connections, models, transaction, IntegrityError
+from django.db.models.query import QuerySet, ValuesQuerySet, ValuesListQuerySet, DateQuerySet
 if django.VERSION >= (1, 6):
     from django.db.models.query import DateTimeQuerySet
 try:
@@ -10,10 +11,18 @@ try:
 except ImportError:
     CHUNK_SIZE = 100
 from django.db.models import Q
+from django.db.models.sql.datastructures import EmptyResultSet
+from django.db.models.sql.subqueries import DeleteQuery
+from django.dispatch.dispatcher import _make_id
 from django.utils.translation import get_language
+from hvad import cache as translation_cache
+from hvad.batch import get_batch
 from hvad.fieldtranslator import translate
-from hvad.utils import combine, minimumDjangoVersion
+from hvad.utils import (combine, minimumDjangoVersion, load_available_languages,
+                        refresh_available_languages, track_results)
+from hvad.compat.atomic import atomic
 from hvad.compat.settings import settings_updater
+import keyword
 import logging
 import sys
 import warnings
@@ -74,11 +83,74 @@ class ValuesMixin(object):
        
     def iterator(self):
         qs = self._clone()._add_language_filter()
-        for row in super(ValuesMixin, qs).iterator():
-            if isinstance(row, dict):
-                yield dict((qs._strip_master(k), v) for k,v in row.items())
-            else:
-                yield row
+        if isinstance(qs, ValuesListQuerySet):
+            # Tuples need no key translation, only rows may need wrapping
+            if qs._row_class is not None:
+                make = qs._row_class._make
+                return (make(row) for row in super(ValuesMixin, qs).iterator())
+            return super(ValuesMixin, qs).iterator()
+        return qs._values_iterator()
+
+    def _values_iterator(self):
+        # Same as ValuesQuerySet.iterator(), with keys stripped once per query
+        names = (list(self.query.extra_select) + list(self.field_names) +
+                 list(self.query.aggregate_select))
+        names = [self._strip_master(name) for name in names]
+        for row in self.query.get_compiler(self.db).results_iter():
+            yield dict(zip(names, row))
+
+_BOOLEAN_TYPES = ('BooleanField', 'NullBooleanField')
+
+_row_classes = {}
+ROW_CLASSES_MAX = 100
+
+def _get_row_field_names(names):
+    """
+    Make names usable as named tuple fields: leading underscores are
+    stripped, and names that are still invalid or repeated are replaced with
+    field_<position>.
+    """
+    result = []
+    for index, name in enumerate(names):
+        name = name.lstrip('_')
+        if (not name or name[0].isdigit() or keyword.iskeyword(name) or
+                name in result or not all(c.isalnum() or c == '_' for c in name)):
+            name = 'field_%d' % index
+        result.append(name)
+    return result
+
+def get_row_class(model, names):
+    """
+    Return the named tuple class used for rows of model with given field
+    names, building it on first use. Like the re module, forgets all
+    classes once ROW_CLASSES_MAX are kept.
+    """
+    key = (model, tuple(names))
+    try:
+        return _row_classes[key]
+    except KeyError:
+        if len(_row_classes) >= ROW_CLASSES_MAX:
+            _row_classes.clear()
+        klass = _row_classes[key] = namedtuple('%sRow' % model.__name__,
+                                               _get_row_field_names(names))
+        return klass
+
+def iter_keyset(queryset, key, chunk_size, after=None):
+    """
+    Iterate over queryset ordered by key, which must be unique and match the
+    primary key of returned instances, loading chunk_size instances per query.
+    Each query seeks past the last key of previous chunk instead of using an
+    offset. Iteration resumes after key value after if given.
+    """
+    queryset = queryset.order_by(key)
+    while True:
+        chunk = queryset if after is None else queryset.filter(**{'%s__gt' % key: after})
+        objects = list(chunk[:chunk_size])
+        for obj in objects:
+            yield obj
+        if len(objects) < chunk_size:
+            break
+        after = objects[-1].pk
 
 class SkipMasterSelectMixin(object):
     _skip_master_select = True
@@ -105,9 +177,11 @@ class BetterTranslationsField(object):
                           ' ELSE %d END)' % len(self._fallbacks))
 
     def get_extra_restriction(self, where_class, alias, related_alias):
+        # Translations ranking the same, such as those in languages missing
+        # from fallbacks, are told apart by their id
         return RawConstraint(
-                sql=' '.join((self._langcase, '<', self._langcase, 'OR ('
-                              '%s.language_code = %s.language_code AND '
+                sql=' '.join((self._langcase, '<', self._langcase, 'OR (',
+                              self._langcase, '=', self._langcase, 'AND '
                               '%s.id < %s.id)')),
                 aliases=(alias, related_alias,
                          alias, related_alias,
@@ -120,6 +194,23 @@ class BetterTranslationsField(object):
 #===============================================================================
 
         
+def _can_fast_delete(model):
+    """
+    Whether instances of model can be deleted without loading them: no
+    delete signal receivers other than the cache invalidation, which bulk
+    deletes replace, and no relation to cascade to or set to NULL.
+    """
+    senders = (_make_id(None), _make_id(model))
+    for signal in (models.signals.pre_delete, models.signals.post_delete):
+        for (uid, sender), receiver in signal.receivers:
+            if sender in senders and uid != 'hvad.cache.invalidate':
+                return False
+    if model._meta.many_to_many:
+        return False
+    return all(related.field.rel.on_delete is models.DO_NOTHING
+               for related in model._meta.get_all_related_objects(include_hidden=True))
+
+
 class TranslationQueryset(QuerySet):
     """
     This is where things happen.
@@ -150,6 +241,9 @@ class TranslationQueryset(QuerySet):
         self._language_code = None
         self._related_model_extra_filters = [] # Used for select_related
         self._forced_unique_fields = []  # Used for select_related
+        self._cache_results = False
+        self._cache_timeout = None
+        self._row_class = None
         super(TranslationQueryset, self).__init__(model, *args, **kwargs)
 
         # After super(), make sure we retrieve the shared model:
@@ -268,9 +362,39 @@ class TranslationQueryset(QuerySet):
         qs.__class__ = QuerySet
         # un-select-related the 'master' relation
         del qs.query.select_related['master']
-        accessor = self.shared_model._meta.translations_accessor
+        qs.query.clear_ordering(force_empty=True)
+        if connections[self.db].features.update_can_self_select:
+            # Filter on master ids directly, rather than joining translations
+            # again and nesting a second subquery
+            masters = qs.values('master')
+        else:
+            # MySQL evaluates IN (subquery) once per row of the outer query,
+            # and cannot update a table selected in a subquery
+            masters = list(qs.values_list('master', flat=True).distinct())
         # update using the real manager
-        return QuerySet(self.shared_model, using=self.db).filter(**{'%s__in' % accessor:qs})
+        return QuerySet(self.shared_model, using=self.db).filter(pk__in=masters)
+
+    def _delete_translations(self):
+        """
+        Delete translations matching this queryset, in a single query on
+        backends able to select from the table being deleted from. Falls back
+        to the regular delete if it must send signals or cascade.
+        """
+        qs = QuerySet(self.model, query=self.query.clone(), using=self.db)
+        qs.query.select_related = False
+        qs.query.clear_ordering(force_empty=True)
+        if not _can_fast_delete(self.model):
+            qs.delete()
+        elif django.VERSION >= (1, 5):
+            DeleteQuery(self.model).delete_qs(qs, self.db)
+        elif connections[self.db].features.update_can_self_select:
+            query = DeleteQuery(self.model)
+            query.add_q(Q(pk__in=qs.values('pk')))
+            query.get_compiler(self.db).execute_sql(None)
+        else:
+            pks = list(qs.values_list('pk', flat=True))
+            if pks:
+                DeleteQuery(self.model).delete_batch(pks, self.db)
 
     def _scan_for_language_where_node(self, children):
         found = False
@@ -281,7 +405,7 @@ class TranslationQueryset(QuerySet):
                 else:
                     field_name = node[0].field.name
             except (TypeError, AttributeError):
-                if node.children:
+                if getattr(node, 'children', None):
                     found = self._scan_for_language_where_node(node.children)
             else:
                 found = field_name == 'language_code'
@@ -361,6 +485,14 @@ class TranslationQueryset(QuerySet):
         Get an object by querying the translations model and returning a 
         combined instance.
         """
+        pk = self._get_cacheable_pk(args, kwargs)
+        if pk is not None:
+            language_code = self._language_code or get_language()
+            obj = translation_cache.load_instance(self.shared_model, pk,
+                                                  language_code, self.db)
+            if obj is not None:
+                return obj
+
         qs = self._clone()
         newargs, newkwargs = qs._translate_args_kwargs(*args, **kwargs)
 
@@ -379,7 +511,31 @@ class TranslationQueryset(QuerySet):
             qs._add_language_filter()
 
         # self.iterator already combines! Isn't that nice?
-        return QuerySet.get(qs, *newargs, **newkwargs)
+        obj = QuerySet.get(qs, *newargs, **newkwargs)
+        if pk is not None:
+            translation_cache.store_instance(obj)
+        return obj
+
+    def _get_cacheable_pk(self, args, kwargs):
+        """
+        Return the primary key if get() was called with a lookup the
+        translation cache or snapshot can answer - a single primary key lookup
+        on an unfiltered queryset - or None.
+        """
+        if (args or len(kwargs) != 1 or
+            not (translation_cache.enabled() or translation_cache.get_snapshot(self.shared_model)) or
+            self._language_code == 'all' or self._related_model_extra_filters or
+            self.query.where.children or self.query.extra or
+            self.query.low_mark or self.query.high_mark is not None):
+            return None
+        key, value = list(kwargs.items())[0]
+        pk_field = self.shared_model._meta.pk
+        if key not in ('pk', 'pk__exact', pk_field.name, '%s__exact' % pk_field.name):
+            return None
+        try:
+            return pk_field.to_python(value)
+        except ValidationError:
+            return None
 
     def get_or_create(self, **kwargs):
         """
@@ -468,36 +624,230 @@ class TranslationQueryset(QuerySet):
         qs.query.clear_ordering(force_empty=True)
         return dict((obj._get_pk_val(), obj) for obj in qs.iterator())
 
+    def iterator_chunked(self, chunk_size=1000, after=None):
+        """
+        Iterate over instances in primary key order, loading chunk_size at a
+        time, resuming after primary key after if given. Ordering of this
+        queryset is ignored.
+        """
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be a positive integer.')
+        if self._language_code == 'all':
+            raise ValueError('Cannot use iterator_chunked along with language(\'all\').')
+        qs = self.filter(master__isnull=False)
+        # Resolve language now, so all chunks use the same one
+        qs._language_code = qs._language_code or get_language()
+        return iter_keyset(qs, 'master', chunk_size, after)
+
+    def cache(self, timeout=None):
+        """
+        Cache the results of this queryset. They are reused until timeout
+        expires or any instance of the model is saved, updated or deleted.
+        """
+        qs = self._clone()
+        qs._cache_results, qs._cache_timeout = True, timeout
+        return qs
+
+    def _iter_master_chunks(self, batch_size, filter_language=True):
+        """
+        Yield primary keys of shared instances matching this queryset, in
+        ascending order, as lists of at most batch_size. Chunks are found by
+        walking the key space, so rows altered by previous chunks are skipped.
+        Translations in all languages are matched unless filter_language is set.
+        """
+        qs = self._clone()
+        if filter_language:
+            qs = qs._add_language_filter()
+        base = QuerySet(qs.model, query=qs.query.clone(), using=qs.db)
+        base.query.select_related = False
+        base = (base.filter(master__isnull=False).order_by('master')
+                    .values_list('master', flat=True).distinct())
+        last = None
+        while True:
+            chunk = base if last is None else base.filter(master__gt=last)
+            pks = list(chunk[:batch_size])
+            if not pks:
+                break
+            yield pks
+            if len(pks) < batch_size:
+                break
+            last = pks[-1]
+
+    def _run_chunked(self, method, batch_size, callback, filter_language, *args, **kwargs):
+        """
+        Run method on the part of this queryset matching each chunk of shared
+        instances, each in its own transaction. Returns the list of results.
+        """
+        if batch_size < 1:
+            raise ValueError('batch_size must be a positive integer.')
+        results = []
+        for pks in self._iter_master_chunks(batch_size, filter_language):
+            with atomic(using=self.db):
+                results.append(getattr(self.filter(master__in=pks), method)(*args, **kwargs))
+            if callback is not None:
+                callback(pks)
+        return results
+
     def delete(self):
         qs = self._get_shared_queryset()
         qs.delete()
     delete.alters_data = True
     delete.queryset_only = True
+
+    def delete_chunked(self, batch_size, callback=None):
+        # delete() ignores the language, so chunks must match all translations
+        self._run_chunked('delete', batch_size, callback, False)
+    delete_chunked.alters_data = True
+    delete_chunked.queryset_only = True
     
     def delete_translations(self):
-        self.update(master=None)
-        self.model.objects.filter(master__isnull=True).delete()
+        batch = get_batch()
+        if batch is not None:
+            qs = self._clone()._add_language_filter()
+            batch.delete_translations(qs.model, qs.db, QuerySet.values_list(qs, 'pk', 'master'))
+            return
+        qs = self._clone()._add_language_filter()
+        masters = None
+        if getattr(qs.shared_model._meta, 'available_languages_field', None):
+            masters = set(QuerySet.values_list(qs, 'master', flat=True))
+        translation_cache.invalidate_queryset(qs)
+        qs._delete_translations()
+        translation_cache.bump_generation(qs.shared_model, qs.db)
+        if masters:
+            refresh_available_languages(qs.shared_model, masters, qs.db)
     delete_translations.alters_data = True
+
+    def delete_translations_chunked(self, batch_size, callback=None):
+        self._run_chunked('delete_translations', batch_size, callback, True)
+    delete_translations_chunked.alters_data = True
         
     def update(self, **kwargs):
         qs = self._clone()._add_language_filter()
         shared, translated = qs._split_kwargs(**kwargs)
+        translation_cache.invalidate_queryset(qs)
+        masters = None
+        if (getattr(qs.shared_model._meta, 'available_languages_field', None) and
+                ('language_code' in translated or 'master' in translated)):
+            # Languages of both previous and new masters must be refreshed
+            masters = set(QuerySet.values_list(qs, 'master', flat=True))
+            if translated.get('master') is not None:
+                masters.add(getattr(translated['master'], 'pk', translated['master']))
+            masters.discard(None)
         count = 0
         if translated:
             count += super(TranslationQueryset, qs).update(**translated)
         if shared:
             shared_qs = qs._get_shared_queryset()
             count += shared_qs.update(**shared)
+        translation_cache.bump_generation(qs.shared_model, qs.db)
+        if masters:
+            refresh_available_languages(qs.shared_model, masters, qs.db)
         return count
     update.alters_data = True
 
+    def update_chunked(self, batch_size, values, callback=None):
+        """
+        Update this queryset with the values dictionary, in chunks. Values
+        are not taken as keyword arguments so they cannot clash with the
+        other arguments. Returns the sum of all counts.
+        """
+        return sum(self._run_chunked('update', batch_size, callback, True, **values))
+    update_chunked.alters_data = True
+
     def values(self, *fields):
         fields = self._translate_fieldnames(fields)
-        return super(TranslationQueryset, self).values(*fields)
+        qs = super(TranslationQueryset, self).values(*fields)
+        qs._row_class = None    # rows from as_rows() do not match other fields
+        return qs
 
     def values_list(self, *fields, **kwargs):
         fields = self._translate_fieldnames(fields)
-        return super(TranslationQueryset, self).values_list(*fields, **kwargs)
+        qs = super(TranslationQueryset, self).values_list(*fields, **kwargs)
+        qs._row_class = None    # rows from as_rows() do not match other fields
+        return qs
+
+    def as_rows(self, *fields):
+        """
+        Return a queryset yielding lightweight, read-only rows instead of
+        model instances. Rows are named tuples exposing the given fields as
+        attributes. If no field is given, all shared and translated fields are
+        included, foreign keys being exposed by their attname.
+        """
+        if fields:
+            names = fields
+        else:
+            translated_exclude = ('master', self.model._meta.pk.name)
+            model_fields = (list(self.shared_model._meta.fields) +
+                            [field for field in self.model._meta.fields
+                             if field.name not in translated_exclude])
+            fields = [field.name for field in model_fields]
+            names = [field.attname for field in model_fields]
+        qs = self.values_list(*fields)
+        qs._row_class = get_row_class(self.shared_model, names)
+        return qs
+
+    def pivot(self, fields, languages=None, columns=False):
+        """
+        Return translated fields of matching instances pivoted by language,
+        as a list of (pk, values...) tuples ordered by pk. Values are ordered
+        by field, then by language. Runs a single query, using conditional
+        aggregation. If columns is set, return a dictionary mapping 'pk' and
+        every (field, language) pair to a list of values instead.
+        """
+        qs = self._clone()._add_language_filter()
+        if languages is None:
+            languages = FALLBACK_LANGUAGES
+        opts = self.model._meta
+        model_fields = []
+        for name in fields:
+            field = opts.get_field(name)
+            if field.name in ('master', 'language_code') or field.primary_key:
+                raise ValueError('Cannot pivot field %r' % name)
+            model_fields.append(field)
+
+        ids = QuerySet(self.model, query=qs.query.clone(), using=qs.db)
+        ids = ids.order_by().values_list('master', flat=True)
+        try:
+            inner_sql, inner_params = ids.query.get_compiler(qs.db).as_sql()
+        except EmptyResultSet:
+            rows = []
+        else:
+            connection = connections[qs.db]
+            qn = connection.ops.quote_name
+            master = qn(opts.get_field('master').column)
+            selects, params = [], []
+            for field in model_fields:
+                column = 'T.%s' % qn(field.column)
+                value, value_params = column, []
+                if field.get_internal_type() in _BOOLEAN_TYPES:
+                    # Some databases, PostgreSQL among them, have no MAX()
+                    # for booleans, aggregate them as integers
+                    value = 'CASE WHEN %s = %%s THEN 1 WHEN %s IS NOT NULL THEN 0 END' % (column, column)
+                    value_params = [field.get_db_prep_value(True, connection=connection)]
+                for language_code in languages:
+                    selects.append('MAX(CASE WHEN T.%s = %%s THEN %s END)'
+                                   % (qn('language_code'), value))
+                    params.extend([language_code] + value_params)
+            sql = ('SELECT T.%s, %s FROM %s T WHERE T.%s IN (%s) GROUP BY T.%s ORDER BY T.%s'
+                   % (master, ', '.join(selects), qn(opts.db_table),
+                      master, inner_sql, master, master))
+            cursor = connection.cursor()
+            cursor.execute(sql, params + list(inner_params))
+            def convert(value, field):
+                if value is not None and field.get_internal_type() in _BOOLEAN_TYPES:
+                    return bool(value)
+                return connection.ops.convert_values(value, field)
+            converters = [self.shared_model._meta.pk] + [field for field in model_fields
+                                                         for language_code in languages]
+            rows = [tuple(convert(value, field) for value, field in zip(row, converters))
+                    for row in cursor.fetchall()]
+
+        if not columns:
+            return rows
+        names = ['pk'] + [(field.name, language_code) for field in model_fields
+                                                      for language_code in languages]
+        data = list(zip(*rows)) or [()] * len(names)
+        return dict((name, list(values)) for name, values in zip(names, data))
 
     def dates(self, field_name, kind=None, order='ASC'):
         field_name = self.field_translator.get(field_name)
@@ -626,6 +976,9 @@ class TranslationQueryset(QuerySet):
             '_language_code': self._language_code,
             '_related_model_extra_filters': list(self._related_model_extra_filters),
             '_forced_unique_fields': list(self._forced_unique_fields),
+            '_cache_results': self._cache_results,
+            '_cache_timeout': self._cache_timeout,
+            '_row_class': self._row_class,
         })
         if klass:
             klass = self._get_class(klass)
@@ -642,7 +995,16 @@ class TranslationQueryset(QuerySet):
         Model.objects.untranslated()
         """
         qs = self._clone()._add_language_filter()
-
+        if qs._cache_results and translation_cache.enabled():
+            if qs.query.select_related != {'master': {}}:
+                raise NotImplementedError('Caching results along with '
+                                          'select_related is not supported')
+            return track_results(translation_cache.cached_results(
+                qs, qs.shared_model, qs._combined_iterator, timeout=qs._cache_timeout))
+        return track_results(qs._combined_iterator())
+
+    def _combined_iterator(self):
+        qs = self
         if qs._forced_unique_fields:
             # In order for select_related to properly load data from
             # translated models, we have to force django to treat
@@ -699,16 +1061,133 @@ class TranslationQueryset(QuerySet):
 # Fallbacks
 #===============================================================================
 
-class _SharedFallbackQueryset(QuerySet):
+class SharedQueryset(QuerySet):
+    """
+    Queryset on the shared model, able to filter instances on the presence
+    of a translation.
+    """
+    _load_languages = False
+
+    def load_languages(self):
+        """
+        Load the available languages of all instances returned by this
+        queryset in one extra query, for get_available_languages().
+        """
+        qs = self._clone()
+        qs._load_languages = True
+        return qs
+
+    def iterator(self):
+        results = super(SharedQueryset, self).iterator()
+        if (not self._load_languages or
+                getattr(self.model._meta, 'available_languages_field', None)):
+            return track_results(results)
+        results = list(results)
+        load_available_languages(results, self.db)
+        return track_results(iter(results))
+
+    def _clone(self, klass=None, setup=False, **kwargs):
+        kwargs['_load_languages'] = self._load_languages
+        return super(SharedQueryset, self)._clone(klass, setup, **kwargs)
+
+    def update(self, **kwargs):
+        translation_cache.invalidate_queryset(self)
+        count = super(SharedQueryset, self).update(**kwargs)
+        translation_cache.bump_generation(self.model, self.db)
+        return count
+    update.alters_data = True
+
+    def bulk_create(self, *args, **kwargs):
+        objs = super(SharedQueryset, self).bulk_create(*args, **kwargs)
+        translation_cache.bump_generation(self.model, self.db)
+        return objs
+
+    def iterator_chunked(self, chunk_size=1000, after=None):
+        """
+        Iterate over instances in primary key order, loading chunk_size at a
+        time, resuming after primary key after if given. Ordering of this
+        queryset is ignored.
+        """
+        if chunk_size < 1:
+            raise ValueError('chunk_size must be a positive integer.')
+        return iter_keyset(self, 'pk', chunk_size, after)
+
+    def translated_in(self, language_code=None):
+        """
+        Select instances having a translation in language_code, defaulting
+        to current language.
+        """
+        return self._filter_translation_exists(language_code, negate=False)
+
+    def missing_translation(self, language_code=None):
+        """
+        Select instances having no translation in language_code, defaulting
+        to current language.
+        """
+        return self._filter_translation_exists(language_code, negate=True)
+
+    def _filter_translation_exists(self, language_code, negate):
+        # A subquery does not join nor duplicate rows, and uses the unique
+        # (language_code, master) index. Unlike raw SQL, it is relabelled
+        # along with this queryset when used in another query.
+        translations = QuerySet(self.model._meta.translations_model, using=self.db).filter(
+            language_code=language_code or get_language(), master__isnull=False)
+        lookup = {'pk__in': translations.values('master')}
+        return self.exclude(**lookup) if negate else self.filter(**lookup)
+
+
+class _SharedFallbackQueryset(SharedQueryset):
     translation_fallbacks = None
+    _cache_results = False
+    _cache_timeout = None
 
     def use_fallbacks(self, *fallbacks):
         self.translation_fallbacks = fallbacks or (None,)+FALLBACK_LANGUAGES
         return self
 
+    def cache(self, timeout=None):
+        qs = self._clone()
+        qs._cache_results, qs._cache_timeout = True, timeout
+        return qs
+
+    def iterator(self):
+        fetch = self._translated_iterator
+        snapshot = translation_cache.get_snapshot(self.model)
+        if self.translation_fallbacks and snapshot is not None and snapshot.available(self.db):
+            fetch = self._snapshot_iterator
+        if self._cache_results and translation_cache.enabled():
+            if self.query.select_related:
+                raise NotImplementedError('Caching results along with '
+                                          'select_related is not supported')
+            fallbacks = tuple(get_language() if lang is None else lang
+                              for lang in self.translation_fallbacks or ())
+            return track_results(translation_cache.cached_results(
+                self, self.model, fetch, timeout=self._cache_timeout, extra=fallbacks))
+        return track_results(fetch())
+
+    def _translated_iterator(self):
+        return super(_SharedFallbackQueryset, self).iterator()
+
+    def _snapshot_iterator(self):
+        fallbacks = [get_language() if lang is None else lang
+                     for lang in self.translation_fallbacks]
+        snapshot = translation_cache.get_snapshot(self.model)
+        return snapshot.iter_fallbacks(super(_SharedFallbackQueryset, self).iterator(),
+                                       fallbacks)
+
+    def iterator_chunked(self, chunk_size=1000, after=None):
+        qs = self._clone()
+        if qs.translation_fallbacks:
+            # Resolve current language now, so all chunks use the same one
+            qs.translation_fallbacks = tuple(get_language() if lang is None else lang
+                                             for lang in qs.translation_fallbacks)
+        return super(_SharedFallbackQueryset, qs).iterator_chunked(chunk_size, after)
+
     def _clone(self, klass=None, setup=False, **kwargs):
         kwargs.update({
             'translation_fallbacks': self.translation_fallbacks,
+            '_cache_results': self._cache_results,
+            '_cache_timeout': self._cache_timeout,
         })
         return super(_SharedFallbackQueryset, self)._clone(klass, setup, **kwargs)
 
@@ -746,14 +1225,21 @@ class LegacyFallbackQueryset(_SharedFallbackQueryset):
         # arguably faster than running one query for each result or even worse
         # one query per result per language until we find something
         translations_manager = self.model._meta.translations_model.objects
-        baseqs = translations_manager.select_related('master')
-        translations = baseqs.filter(language_code__in=fallbacks,
-                                     master__pk__in=base_ids)
+        translations = translations_manager.filter(language_code__in=fallbacks,
+                                                   master__pk__in=base_ids)
         fallback_objects = defaultdict(dict)
         # turn the results into a dict of dicts with shared model primary key as
         # keys for the first dict and language codes for the second dict
         for obj in translations:
-            fallback_objects[obj.master.pk][obj.language_code] = obj
+            fallback_objects[obj.master_id][obj.language_code] = obj
+        # instances with none of the fallbacks get any translation, the first
+        # one created, as the single query fallbacks do
+        missing = [pk for pk in base_ids
+                   if not any(lang in fallback_objects[pk] for lang in fallbacks)]
+        if missing:
+            for obj in translations_manager.filter(master__pk__in=missing).order_by('-pk'):
+                fallback_objects[obj.master_id][None] = obj
+            fallbacks.append(None)
         # iterate over the share dmodel results
         for instance in base_results:
             translation = None
@@ -762,21 +1248,23 @@ class LegacyFallbackQueryset(_SharedFallbackQueryset):
                 translation = fallback_objects[instance.pk].get(fallback, None)
                 if translation is not None:
                     break
-            # if we found a translation, yield the combined result
+            # if we found a translation, yield the combined result, keeping
+            # the shared instance so extra selects and annotations are kept
             if translation:
+                translation.master = instance
                 yield combine(translation, self.model)
             else:
                 # otherwise yield the shared instance only
                 logger.error("no translation for %s.%s (pk=%s)" % (instance._meta.app_label, instance.__class__.__name__, str(instance.pk)))
                 yield instance
 
-    def iterator(self):
+    def _translated_iterator(self):
         """
         The logic for this method was taken from django-polymorphic by Bert
         Constantin (https://github.com/bconstantin/django_polymorphic) and was
         slightly altered to fit the needs of django-hvad.
         """
-        base_iter = super(LegacyFallbackQueryset, self).iterator()
+        base_iter = super(LegacyFallbackQueryset, self)._translated_iterator()
 
         # only do special stuff when we actually want fallbacks
         if self.translation_fallbacks:
@@ -810,7 +1298,7 @@ class LegacyFallbackQueryset(_SharedFallbackQueryset):
                 yield instance
 
 class SelfJoinFallbackQueryset(_SharedFallbackQueryset):
-    def iterator(self):
+    def _translated_iterator(self):
         # only do special stuff when we actually want fallbacks
         if self.translation_fallbacks:
             fallbacks = [get_language() if lang is None else lang
@@ -843,7 +1331,7 @@ class SelfJoinFallbackQueryset(_SharedFallbackQueryset):
             # Unfortunately, this means we must load everything in one go
             getattr(qs.model, taccessor).related.field._unique = True
             objects = []
-            for instance in super(SelfJoinFallbackQueryset, qs).iterator():
+            for instance in super(SelfJoinFallbackQueryset, qs)._translated_iterator():
                 try:
                     translation = getattr(instance, taccessorcache)
                 except AttributeError:
@@ -855,7 +1343,7 @@ class SelfJoinFallbackQueryset(_SharedFallbackQueryset):
             getattr(qs.model, taccessor).related.field._unique = False
             return iter(objects)
         else:
-            return super(SelfJoinFallbackQueryset, self).iterator()
+            return super(SelfJoinFallbackQueryset, self)._translated_iterator()
 
 
 FallbackQueryset = LegacyFallbackQueryset if LEGACY_FALLBACKS else SelfJoinFallbackQueryset
@@ -899,14 +1387,28 @@ class TranslationManager(models.Manager):
 
     queryset_class = TranslationQueryset
     fallback_class = FallbackQueryset
-    default_class = QuerySet
+    default_class = SharedQueryset
+    snapshot = False
+    catalog = False
 
     def __init__(self, *args, **kwargs):
         self.queryset_class = kwargs.pop('queryset_class', self.queryset_class)
         self.fallback_class = kwargs.pop('fallback_class', self.fallback_class)
         self.default_class = kwargs.pop('default_class', self.default_class)
+        self.snapshot = kwargs.pop('snapshot', self.snapshot)
+        self.catalog = kwargs.pop('catalog', self.catalog)
         super(TranslationManager, self).__init__(*args, **kwargs)
 
+    def contribute_to_class(self, model, name):
+        super(TranslationManager, self).contribute_to_class(model, name)
+        if model._meta.abstract:
+            return
+        if self.catalog:
+            from hvad.catalog import CatalogSnapshot
+            translation_cache.register_snapshot(model, CatalogSnapshot(model))
+        elif self.snapshot:
+            translation_cache.register_snapshot(model)
+
     def using_translations(self):
         warnings.warn('using_translations() is deprecated, use language() instead', DeprecationWarning, stacklevel=2)
         qs = self.queryset_class(self.model, using=self.db)
@@ -931,6 +1433,13 @@ class TranslationManager(models.Manager):
 
     def get_queryset(self):
         return self._make_queryset(self.default_class)
+    get_query_set = get_queryset        # old name for Django < 1.6
+
+    def translated_in(self, language_code=None):
+        return self.get_queryset().translated_in(language_code)
+
+    def missing_translation(self, language_code=None):
+        return self.get_queryset().missing_translation(language_code)
 
     #===========================================================================
     # Internals
@@ -1112,6 +1621,53 @@ class TranslationAwareManager(models.Manager):
 #===============================================================================
 
 
+class TranslationsModelQueryset(QuerySet):
+    def delete(self):
+        model = self.model._meta.shared_model
+        masters = None
+        if getattr(model._meta, 'available_languages_field', None):
+            masters = set(self.values_list('master', flat=True))
+            masters.discard(None)
+        super(TranslationsModelQueryset, self).delete()
+        if masters:
+            refresh_available_languages(model, masters, self.db)
+    delete.alters_data = True
+    delete.queryset_only = True
+
+    def update(self, **kwargs):
+        model = self.model._meta.shared_model
+        translation_cache.invalidate_queryset(self)
+        masters = None
+        if (getattr(model._meta, 'available_languages_field', None) and
+                ('language_code' in kwargs or 'master' in kwargs)):
+            # Languages of both previous and new masters must be refreshed
+            masters = set(self.values_list('master', flat=True))
+            if kwargs.get('master') is not None:
+                masters.add(getattr(kwargs['master'], 'pk', kwargs['master']))
+            masters.discard(None)
+        count = super(TranslationsModelQueryset, self).update(**kwargs)
+        translation_cache.bump_generation(model, self.db)
+        if masters:
+            refresh_available_languages(model, masters, self.db)
+        return count
+    update.alters_data = True
+
+    def bulk_create(self, objs, *args, **kwargs):
+        model = self.model._meta.shared_model
+        objs = super(TranslationsModelQueryset, self).bulk_create(objs, *args, **kwargs)
+        translation_cache.bump_generation(model, self.db)
+        if getattr(model._meta, 'available_languages_field', None):
+            masters = set(obj.master_id for obj in objs)
+            masters.discard(None)
+            if masters:
+                refresh_available_languages(model, masters, self.db)
+        return objs
+
+
 class TranslationsModelManager(models.Manager):
     def get_language(self, language):
         return self.get(language_code=language)
+
+    def get_queryset(self):
+        return TranslationsModelQueryset(self.model, using=self.db)
+    get_query_set = get_queryset        # old name for Django < 1.6
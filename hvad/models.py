@@ -4,10 +4,12 @@ from django.db import models
 from django.db.models.base import ModelBase
 from django.db.models.signals import post_save
 from django.utils.translation import get_language
+from hvad import cache as translation_cache
+from hvad.batch import get_batch
 from hvad.compat.metaclasses import with_metaclass
 from hvad.descriptors import LanguageCodeAttribute, TranslatedAttribute
 from hvad.manager import TranslationManager, TranslationsModelManager
-from hvad.utils import SmartGetFieldByName
+from hvad.utils import SmartGetFieldByName, report_lazy_load, refresh_available_languages
 from hvad.compat.method_type import MethodType
 from hvad.compat.settings import settings_updater
 import sys
@@ -33,7 +35,9 @@ def create_translations_model(model, related_name, meta, **fields):
     'related_name' is the related name for the reverse FK from the translations
     model.
     'meta' is a (optional) dictionary of attributes for the translations model's
-    inner Meta class.
+    inner Meta class. Its 'available_languages' key, if any, is the name of
+    a field to add to the shared model, maintained with the list of languages
+    the instance is translated in.
     'fields' is a dictionary of fields to put on the translations model.
     
     Two fields are enforced on the translations model:
@@ -44,7 +48,8 @@ def create_translations_model(model, related_name, meta, **fields):
     Those two fields are unique together, this get's enforced in the inner Meta
     class of the translations table
     """
-    meta = meta or {}
+    meta = dict(meta or {})
+    languages_field = meta.pop('available_languages', None)
 
     # Build a list of translation models from base classes. Depth-first scan.
     abstract = model._meta.abstract
@@ -96,6 +101,14 @@ def create_translations_model(model, related_name, meta, **fields):
         translations_model.DoesNotExist = DNE
     opts = translations_model._meta
     opts.shared_model = model
+    translations_model._has_auto_now = any(getattr(field, 'auto_now', False)
+                                           for field in opts.fields)
+
+    if languages_field and not abstract:
+        model.add_to_class(languages_field, models.TextField(blank=True, default='',
+                                                            editable=False))
+        model._meta.available_languages_field = languages_field
+        post_save.connect(_translation_saved, sender=translations_model, weak=False)
 
     # We need to set it here so it is available when we scan subclasses
     model._meta.translations_model = translations_model
@@ -110,6 +123,21 @@ def create_translations_model(model, related_name, meta, **fields):
     return translations_model
 
 
+def _refresh_master_languages(translation, pks=None):
+    model = translation._meta.shared_model
+    values = refresh_available_languages(model, pks or [translation.master_id],
+                                         translation._state.db)
+    # Update the in-memory master, if any, such as the instance being saved
+    cache_name = translation._meta.get_field('master').get_cache_name()
+    master = getattr(translation, cache_name, None)
+    if master is not None:
+        setattr(master, model._meta.available_languages_field, values[master.pk])
+
+def _translation_saved(sender, instance, created, raw=False, **kwargs):
+    if created and not raw and instance.master_id is not None:
+        _refresh_master_languages(instance)
+
+
 class TranslatedFields(object):
     """
     Wrapper class to define translated fields on a model.
@@ -130,9 +158,84 @@ class BaseTranslationModel(models.Model):
     Needed for detection of translation models. Due to the way dynamic classes
     are created, we cannot put the 'language_code' field on here.
     """
-    def __init__(self, *args, **kwargs):
-        super(BaseTranslationModel, self).__init__(*args, **kwargs)
-        
+    # Set by create_translations_model, such fields change on every save
+    _has_auto_now = False
+    # Field values when last saved, or before the first change made through
+    # the shared instance since the translation was loaded, if any
+    _saved_values = None
+
+    def _track_changes(self):
+        """
+        Snapshot field values of a translation that exists in the database,
+        unless done already, before its fields are changed.
+        """
+        if self._saved_values is None and not self._state.adding and self.pk is not None:
+            self._saved_values = self._get_field_values()
+
+    def _get_field_values(self):
+        # Read from __dict__, so deferred fields are not loaded
+        values = self.__dict__
+        return dict((field.attname, values[field.attname])
+                    for field in self._meta.fields if field.attname in values)
+
+    def get_dirty_fields(self):
+        """
+        Returns the names of fields changed since the translation was last
+        saved, or since it was loaded if changed through its shared instance,
+        or all fields if it is not in the database yet. Values altered in
+        place are not detected.
+        """
+        values, saved = self.__dict__, self._saved_values
+        if self._state.adding or self.pk is None:
+            return [field.name for field in self._meta.fields if field.attname in values]
+        if saved is None:
+            return []
+        return [field.name for field in self._meta.fields
+                if (field.attname in values) != (field.attname in saved)
+                or values.get(field.attname) != saved.get(field.attname)]
+
+    def _get_saved_key(self, update_fields=None):
+        """
+        Returns the master id and language code the translation has in the
+        database, if they can be changed by saving it and its shared model has
+        an available languages field. Returns None otherwise.
+        """
+        if (not getattr(self._meta.shared_model._meta, 'available_languages_field', None)
+                or self._state.adding or self.pk is None):
+            return None
+        if (update_fields is not None and
+                not set(update_fields).intersection(('master', 'master_id', 'language_code'))):
+            return None
+        saved = self._saved_values
+        if saved is not None and 'master_id' in saved and 'language_code' in saved:
+            return saved['master_id'], saved['language_code']
+        # Changed without a snapshot, such as directly after loading it
+        keys = list(type(self)._default_manager.using(self._state.db)
+                    .filter(pk=self.pk).values_list('master', 'language_code'))
+        return keys[0] if keys else None
+
+    def save(self, *args, **kwargs):
+        previous = self._get_saved_key(kwargs.get('update_fields'))
+        super(BaseTranslationModel, self).save(*args, **kwargs)
+        self._saved_values = self._get_field_values()
+        if previous is not None and previous != (self.master_id, self.language_code):
+            # Moved to another master or language: refresh old and new masters
+            masters = set((previous[0], self.master_id))
+            masters.discard(None)
+            if masters:
+                _refresh_master_languages(self, sorted(masters))
+
+    def delete(self, using=None):
+        batch = get_batch()
+        if batch is not None:
+            batch.discard(self)
+        # Deleting the master deletes translations through the ORM's collector,
+        # which does not call this: languages of deleted masters are left alone.
+        super(BaseTranslationModel, self).delete(using=using)
+        if (self.master_id is not None and
+            getattr(self._meta.shared_model._meta, 'available_languages_field', None)):
+            _refresh_master_languages(self)
+
     class Meta:
         abstract = True
         
@@ -196,8 +299,20 @@ class TranslatableModelBase(ModelBase):
                 "No TranslatedFields found on %r, subclasses of "
                 "TranslatableModel must define TranslatedFields." % new_model
             )
+
+        # Field names accepted by __init__, computed once for all instances.
+        # Related objects are not loaded yet, but __init__ does not accept them.
+        new_model._shared_field_names = frozenset(
+            name for field in opts.fields + opts.many_to_many
+            for name in (field.name, field.attname)
+        )
+        new_model._translated_field_names = frozenset(
+            name for field in opts.translations_model._meta.fields
+            for name in (field.name, field.attname)
+        ).difference(('pk', opts.pk.name, 'master_id'))
         
         post_save.connect(new_model.save_translations, sender=new_model, weak=False)
+        translation_cache.register_model(new_model)
         
         if not isinstance(opts.get_field_by_name, SmartGetFieldByName):
             smart_get_field_by_name = SmartGetFieldByName(opts.get_field_by_name)
@@ -221,23 +336,16 @@ class TranslatableModel(with_metaclass(TranslatableModelBase, models.Model)):
         abstract = True
     
     def __init__(self, *args, **kwargs):
-        tkwargs = {} # translated fields
-        skwargs = {} # shared fields
-        
-        if 'master' in kwargs.keys():
-            raise RuntimeError(
-                    "Cannot init  %s class with a 'master' argument" % \
-                    self.__class__.__name__
-            )
-        
-        # filter out all the translated fields (including 'master' and 'language_code')
-        primary_key_names = ('pk', self._meta.pk.name)
-        for key in list(kwargs.keys()):
-            if key in self._translated_field_names:
-                if not key in primary_key_names:
-                    # we exclude the pk of the shared model
-                    tkwargs[key] = kwargs.pop(key)
-        if not tkwargs.keys():
+        # filter out all the translated fields (including 'language_code'),
+        # the pk of the shared model is excluded from _translated_field_names
+        if kwargs:
+            if 'master' in kwargs:
+                raise RuntimeError(
+                        "Cannot init  %s class with a 'master' argument" % \
+                        self.__class__.__name__
+                )
+            translated = self._translated_field_names.intersection(kwargs)
+        if not kwargs or not translated:
             # if there where no translated options, then we assume this is a
             # regular init and don't want to do any funky stuff
             super(TranslatableModel, self).__init__(*args, **kwargs)
@@ -245,10 +353,10 @@ class TranslatableModel(with_metaclass(TranslatableModelBase, models.Model)):
         
         # there was at least one of the translated fields (or a language_code) 
         # in kwargs. We need to do magic.
+        tkwargs = dict((key, kwargs[key]) for key in translated)
         # extract all the shared fields (including the pk)
-        for key in list(kwargs.keys()):
-            if key in self._shared_field_names:
-                skwargs[key] = kwargs.pop(key)
+        skwargs = dict((key, kwargs[key])
+                       for key in self._shared_field_names.intersection(kwargs))
         # do the regular init minus the translated fields
         super(TranslatableModel, self).__init__(*args, **skwargs)
         # prepopulate the translations model cache with an translation model
@@ -270,6 +378,8 @@ class TranslatableModel(with_metaclass(TranslatableModelBase, models.Model)):
         opts.translations_model = rel.model
         opts.translations_cache = '%s_cache' % rel.get_accessor_name()
         trans_opts = opts.translations_model._meta
+        opts.available_languages_field = getattr(trans_opts.shared_model._meta,
+                                                 'available_languages_field', None)
         
         # Set descriptors
         ignore_fields = [
@@ -286,17 +396,64 @@ class TranslatableModel(with_metaclass(TranslatableModelBase, models.Model)):
                 attr = TranslatedAttribute(opts, field.name)
             setattr(cls, field.name, attr)
     
+    def save(self, *args, **kwargs):
+        batch = get_batch()
+        if batch is not None and not batch.flushing:
+            if not self._state.adding and not args:
+                batch.save_shared(self, kwargs)
+                return
+            batch.get_database(self, kwargs.get('using'))
+        update_fields = kwargs.get('update_fields')
+        if update_fields is None:
+            return super(TranslatableModel, self).save(*args, **kwargs)
+        # Split update_fields between the shared model and the translation,
+        # which is not saved if none of its fields are included.
+        translated = self._translated_field_names.difference(('master',))
+        kwargs['update_fields'] = [name for name in update_fields if name not in translated]
+        super(TranslatableModel, self).save(*args, **kwargs)
+        translated = [name for name in update_fields if name in translated]
+        if translated:
+            self._save_translation(translated)
+
+    def delete(self, *args, **kwargs):
+        batch = get_batch()
+        if batch is not None:
+            # Queued saves would write the instance back when flushed
+            batch.discard(self)
+        return super(TranslatableModel, self).delete(*args, **kwargs)
+    delete.alters_data = True
+
     @classmethod
     def save_translations(cls, instance, **kwargs):
         """
         When this instance is saved, also save the (cached) translation
         """
-        opts = cls._meta
-        if hasattr(instance, opts.translations_cache):
-            trans = getattr(instance, opts.translations_cache)
+        # Saves given update_fields handle the translation themselves
+        if kwargs.get('update_fields') is None:
+            instance._save_translation()
+
+    def _save_translation(self, update_fields=None):
+        opts = self._meta
+        if hasattr(self, opts.translations_cache):
+            trans = getattr(self, opts.translations_cache)
             if not trans.master_id:
-                trans.master = instance
-            trans.save()
+                trans.master = self
+            batch = get_batch()
+            if batch is not None:
+                batch.save_translation(trans, self, update_fields)
+                return
+            if trans.pk is None or trans._state.adding:
+                trans.save()
+            elif update_fields is not None:
+                trans.save(update_fields=update_fields)
+            elif trans._has_auto_now or trans.get_dirty_fields():
+                trans.save()
+            else:
+                # Unchanged since it was loaded or saved
+                return
+            languages = self._available_languages
+            if languages is not None and trans.language_code not in languages:
+                self._available_languages = sorted(languages + [trans.language_code])
     
     def translate(self, language_code):
         """
@@ -330,7 +487,10 @@ class TranslatableModel(with_metaclass(TranslatableModelBase, models.Model)):
             return stuff
 
         # get all translations
-        translations = getattr(self, self._meta.translations_accessor).all()
+        translations = self._get_snapshot_translations()
+        if translations is None:
+            report_lazy_load(self, 'lazy_translation_getter()')
+            translations = getattr(self, self._meta.translations_accessor).all()
 
         # if no translation exists, bail out now
         if len(translations) == 0:
@@ -354,22 +514,34 @@ class TranslatableModel(with_metaclass(TranslatableModelBase, models.Model)):
         return getattr(translation, name, default)
 
     def get_available_languages(self):
+        name = self._meta.available_languages_field
+        if name is not None:
+            value = getattr(self, name)
+            return value.split(',') if value else []
+        if self._available_languages is not None:
+            return list(self._available_languages)
         qs = getattr(self, self._meta.translations_accessor).all()
         if qs._result_cache is not None:
             return [obj.language_code for obj in qs]
+        translations = self._get_snapshot_translations()
+        if translations is not None:
+            return [obj.language_code for obj in translations]
+        report_lazy_load(self, 'get_available_languages()')
         return qs.values_list('language_code', flat=True)
     
     #===========================================================================
     # Internals
     #===========================================================================
+
+    def _get_snapshot_translations(self):
+        snapshot = translation_cache.get_snapshot(self.__class__)
+        if snapshot is None or self.pk is None:
+            return None
+        return snapshot.load_translations(self)
     
-    @property
-    def _shared_field_names(self):
-        if getattr(self, '_shared_field_names_cache', None) is None:
-            self._shared_field_names_cache = self._meta.get_all_field_names()
-        return self._shared_field_names_cache
-    @property
-    def _translated_field_names(self):
-        if getattr(self, '_translated_field_names_cache', None) is None:
-            self._translated_field_names_cache = self._meta.translations_model._meta.get_all_field_names()
-        return self._translated_field_names_cache
+    # Set by TranslatableModelBase on concrete and proxy models
+    _shared_field_names = frozenset()
+    _translated_field_names = frozenset()
+
+    # Set by hvad.utils.load_available_languages
+    _available_languages = None
@@ -0,0 +1,53 @@
+from django.db import router
+from django.db.models.query import QuerySet
+from django.db.models.sql.subqueries import DeleteQuery
+from hvad import cache as translation_cache
+from hvad.compat.atomic import atomic
+from hvad.manager import _can_fast_delete
+
+def _get_orphans(model, using):
+    tmodel = model._meta.translations_model
+    if using is None:
+        using = router.db_for_write(tmodel)
+    return QuerySet(tmodel, using=using).filter(master__isnull=True)
+
+def count_orphans(model, using=None):
+    """
+    Return the number of translations of model that have no master.
+    """
+    return _get_orphans(model, using).count()
+
+def delete_orphans(model, batch_size=1000, limit=None, using=None, callback=None):
+    """
+    Delete translations of model that have no master, batch_size at a time,
+    each batch in its own transaction. Stops after limit translations if
+    given, so large tables can be cleaned up over several runs. Callback,
+    if given, is called after each batch with the number of translations
+    deleted so far. Returns the number of deleted translations.
+    """
+    if batch_size < 1:
+        raise ValueError('batch_size must be a positive integer.')
+    qs = _get_orphans(model, using).order_by('pk').values_list('pk', flat=True)
+    tmodel, using = qs.model, qs.db
+    fast = _can_fast_delete(tmodel)
+    deleted = 0
+    while limit is None or deleted < limit:
+        size = batch_size if limit is None else min(batch_size, limit - deleted)
+        pks = list(qs[:size])
+        if not pks:
+            break
+        with atomic(using=using):
+            if fast:
+                DeleteQuery(tmodel).delete_batch(pks, using)
+            else:
+                # Signals must be sent, or relations collected
+                QuerySet(tmodel, using=using).filter(pk__in=pks).delete()
+        deleted += len(pks)
+        if callback is not None:
+            callback(deleted)
+        if len(pks) < size:
+            break
+    if deleted:
+        # Querysets not filtering on language could have cached orphans
+        translation_cache.bump_generation(model, using)
+    return deleted
@@ -20,6 +20,28 @@ class LanguageOverride(object):
         activate(self.oldlang)
 
 
+class StrictLoads(object):
+    """
+    Override the HVAD_STRICT_LOADS setting in current thread for the duration
+    of the block, so that lazy translation loads on instances iterated over
+    issue a warning ('warn') or raise ('raise').
+    """
+    def __init__(self, mode='raise'):
+        self.mode = mode
+
+    def __enter__(self):
+        from hvad import utils
+        self.oldmode = utils._local.__dict__.get('strict_loads', self)
+        utils._local.strict_loads = self.mode
+
+    def __exit__(self, type, value, traceback):
+        from hvad import utils
+        if self.oldmode is self:
+            del utils._local.strict_loads
+        else:
+            utils._local.strict_loads = self.oldmode
+
+
 class TemporaryDirectory:
     """Create and return a temporary directory.  This has the same
     behavior as mkdtemp but can be used as a context manager.  For
@@ -1,6 +1,7 @@
 import django
 from django.db import models
 from django.template.defaultfilters import slugify
+from hvad.manager import TranslationManager
 from hvad.models import TranslatableModel, TranslatedFields
 if django.VERSION >= (1, 4, 2):
     from django.utils.encoding import python_2_unicode_compatible
@@ -185,3 +186,25 @@ class AutoPopulated(TranslatableModel):
         super(AutoPopulated, self).save(*args, **kwargs)
 
 
+class Unit(TranslatableModel):
+    symbol = models.CharField(max_length=15)
+    translations = TranslatedFields(
+        name = models.CharField(max_length=255)
+    )
+    objects = TranslationManager(snapshot=True)
+
+
+class Country(TranslatableModel):
+    code = models.CharField(max_length=2)
+    translations = TranslatedFields(
+        name = models.CharField(max_length=255)
+    )
+    objects = TranslationManager(catalog=True)
+
+
+class Article(TranslatableModel):
+    slug = models.SlugField(max_length=255)
+    translations = TranslatedFields(
+        meta={'available_languages': 'languages'},
+        title = models.CharField(max_length=255),
+    )
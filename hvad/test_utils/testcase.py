@@ -1,8 +1,15 @@
 import django
+from django.core.management import call_command
+from django.core.management.base import CommandError
 from django.test.testcases import TestCase
 from hvad.test_utils.context_managers import UserLoginContext
 from hvad.test_utils.request_factory import RequestFactory
+import sys
 import warnings
+try:
+    from StringIO import StringIO   # python 2, accepts native strings
+except ImportError:
+    from io import StringIO
 
 
 def minimumDjangoVersion(*args):
@@ -59,6 +66,19 @@ class HvadTestCase(TestCase):
     def assertThrowsWarning(self, klass, number=1):
         return _AssertThrowsWarningContext(self, klass, number)
 
+    def assertCommandError(self, name, *args, **options):
+        options.setdefault('stdout', StringIO())
+        if django.VERSION >= (1, 5):
+            self.assertRaises(CommandError, call_command, name, *args, **options)
+            return
+        # Older versions print the error to stderr and exit
+        stderr, sys.stderr = sys.stderr, StringIO()
+        try:
+            self.assertRaises(SystemExit, call_command, name, *args, **options)
+            self.assertIn('Error: ', sys.stderr.getvalue())
+        finally:
+            sys.stderr = stderr
+
 # method was renamed from assertItemsEqual in Python 3
 if not hasattr(HvadTestCase, 'assertCountEqual'):
     HvadTestCase.assertCountEqual = HvadTestCase.assertItemsEqual
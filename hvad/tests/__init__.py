@@ -2,24 +2,34 @@ import django
 if django.VERSION < (1, 6): # Starting from django 1.6 we use DiscoverRunner instead
     from hvad.tests.admin import (NormalAdminTests, AdminEditTests,
         AdminNoFixturesTests, AdminDeleteTranslationsTests, AdminRelationTests,
-        TranslatableInlineAdminTests)
+        TranslatableInlineAdminTests, KeysetPaginationTests)
     from hvad.tests.basic import (OptionsTest, BasicQueryTest, AlternateCreateTest,
                                   CreateTest, GetTest, TranslatedTest,
                                   DeleteLanguageCodeTest, GetByLanguageTest,
                                   GetAllLanguagesTest, DescriptorTests,
                                   DefinitionTests, TableNameTest, GetOrCreateTest,
-                                  BooleanTests)
+                                  BooleanTests, StrictLoadsTests,
+                                  AvailableLanguagesFieldTests, DirtyTrackingTests)
+    from hvad.tests.batch import BatchTests
+    from hvad.tests.cache import TranslationCacheTests, QuerysetCacheTests, SnapshotTests
+    from hvad.tests.catalog import CatalogTests
+    from hvad.tests.coverage import CoverageTests
     from hvad.tests.dates import LatestTests, DatesTests
     from hvad.tests.docs import DocumentationTests
     from hvad.tests.fallbacks import (FallbackTests, FallbackFilterTests, FallbackCachingTests,
-                                      FallbackIterTests, FallbackValuesListTests,
+                                      FallbackIterTests, FallbackChunkedIterTests,
+                                      FallbackValuesListTests,
                                       FallbackValuesTests, FallbackInBulkTests,
                                       FallbackNotImplementedTests)
     from hvad.tests.fieldtranslator import FieldtranslatorTests
-    from hvad.tests.forms import FormTests
+    from hvad.tests.forms import FormTests, FormFactoryCacheTests, FormSetTests, GridFormSetTests
     from hvad.tests.ordering import OrderingTest, DefaultOrderingTest
-    from hvad.tests.query import (FilterTests, QueryCachingTests, IterTests, UpdateTests,
-        ValuesListTests, ValuesTests, InBulkTests, DeleteTests, GetTranslationFromInstanceTests,
+    from hvad.tests.orphans import OrphanTests
+    from hvad.tests.query import (FilterTests, QueryCachingTests, IterTests, ChunkedIterTests,
+        UpdateTests,
+        ValuesListTests, RowsTests, PivotTests, TranslationExistsTests,
+        ValuesTests, InBulkTests, DeleteTests, ChunkedWriteTests,
+        GetTranslationFromInstanceTests,
         AggregateTests, NotImplementedTests, ExcludeTests, ComplexFilterTests,
         MinimumVersionTests)
     from hvad.tests.related import (NormalToNormalFKTest, StandardToTransFKTest,
@@ -3,9 +3,14 @@ import django
 from django.conf import settings
 from django.contrib import admin
 from django.contrib.auth.models import User
+from django.contrib.contenttypes.models import ContentType
+from django.contrib.admin.views.main import ORDER_VAR, PAGE_VAR
 from django.core.urlresolvers import reverse
-from django.http import HttpResponseForbidden, HttpResponseRedirect
+from django.db import connection
+from django.http import HttpResponseForbidden, HttpResponseRedirect, QueryDict
+from hvad import manager
 from hvad.admin import InlineModelForm
+from hvad.admin import TranslatableAdmin, KeysetChangeList, KeysetPaginator, CURSOR_VAR
 from hvad.admin import translatable_modelform_factory
 from hvad.forms import TranslatableModelForm
 from hvad.test_utils.context_managers import LanguageOverride
@@ -145,6 +150,34 @@ class NormalAdminTests(HvadTestCase, BaseAdminTests, SuperuserMixin):
             self.assertEqual(myadmin.get_object(get_request, obj.pk).translated_field, '')
 
             
+    def test_change_view_queries(self):
+        obj = Normal.objects.language('en').create(shared_field='shared',
+                                                   translated_field='English')
+        obj.translate('ja')
+        obj.translated_field = u'日本語'
+        obj.save()
+        url = reverse('admin:app_normal_change', args=(obj.pk,))
+        ContentType.objects.get_for_model(Normal)
+
+        with LanguageOverride('en'):
+            with self.login_user_context(username='admin', password='admin'):
+                for language, translated in (('ja', True), ('fr', False)):
+                    # session, user, object and its languages, inline objects.
+                    # Atomic views add savepoints. Legacy fallbacks load the
+                    # translation separately, then any other one if missing.
+                    queries = 5 + (2 if django.VERSION >= (1, 6) else 0)
+                    if manager.LEGACY_FALLBACKS:
+                        queries += 1 if translated else 2
+                    with self.assertNumQueries(queries):
+                        response = self.client.get(url, {'language': language})
+                    self.assertEqual(response.status_code, 200)
+                    form = response.context['adminform'].form
+                    self.assertEqual(response.context['current_is_translated'], translated)
+                    self.assertTrue(response.context['allow_deletion'])
+                    self.assertEqual(form.instance.language_code, language)
+                    self.assertEqual(form.initial.get('translated_field'),
+                                     u'日本語' if translated else '')
+
     def test_get_object_nonexisting(self):
         # In case the object doesnt exist, it should return None
         myadmin = self._get_admin(Normal)
@@ -384,6 +417,36 @@ class AdminEditTests(HvadTestCase, BaseAdminTests, TwoTranslatedNormalMixin,
                 queryset = normaladmin.queryset(request)
             self.assertEqual(queryset.count(), 2)
 
+    def test_changelist_languages(self):
+        Normal.objects.language('ja').create(shared_field='Shared3',
+                                             translated_field=u'日本語三')
+        url = reverse('admin:app_normal_changelist')
+        request = self.request_factory.get(url)
+        normaladmin = self._get_admin(Normal)
+        with LanguageOverride('en'):
+            if django.VERSION >= (1, 6):
+                queryset = normaladmin.get_queryset(request)
+            else:
+                queryset = normaladmin.queryset(request)
+            objs = list(queryset.order_by('shared_field'))
+            with self.assertNumQueries(0):
+                self.assertEqual([obj.get_available_languages() for obj in objs],
+                                 [['en', 'ja'], ['en', 'ja'], ['ja']])
+                html = normaladmin.all_translations(objs[0])
+            self.assertTrue('<strong>' in html)
+            self.assertTrue('?language=ja' in html)
+
+        # a single query loads languages for the whole page
+        with self.assertNumQueries(2):
+            objs = list(Normal.objects.untranslated().load_languages())
+        with self.assertNumQueries(0):
+            for obj in objs:
+                obj.get_available_languages()
+        objs[0].translate('fr')
+        objs[0].translated_field = 'French'
+        objs[0].save()
+        self.assertTrue('fr' in objs[0].get_available_languages())
+
 
 class AdminDeleteTranslationsTests(HvadTestCase, BaseAdminTests, SuperuserMixin):
     def test_delete_last_translation(self):
@@ -560,3 +623,88 @@ class TranslatableInlineAdminTests(HvadTestCase, BaseAdminTests, SuperuserMixin)
                 form = ExampleInlineForm(instance=instance)
 
                 self.assertTrue(form.initial["id"] == instance.id)
+
+
+class KeysetNormalAdmin(TranslatableAdmin):
+    paginator = KeysetPaginator
+    list_per_page = 2
+    list_display = ('shared_field', 'title')
+
+    def title(self, obj):
+        return obj.translated_field
+    title.admin_order_field = 'translated_field'
+
+    def get_changelist(self, request, **kwargs):
+        return KeysetChangeList
+
+
+@minimumDjangoVersion(1, 4)
+class KeysetPaginationTests(HvadTestCase, BaseAdminTests):
+    def setUp(self):
+        super(KeysetPaginationTests, self).setUp()
+        for index, letter in enumerate('edcba'):
+            Normal.objects.language('en').create(shared_field='Shared%d' % (index + 1),
+                                                 translated_field=letter)
+        self.modeladmin = KeysetNormalAdmin(Normal, admin.site)
+
+    def _get_changelist(self, params):
+        request = self.request_factory.get(reverse('admin:app_normal_changelist'), params)
+        m = self.modeladmin
+        with LanguageOverride('en'):
+            return m.get_changelist(request)(request, Normal, m.list_display,
+                                             m.list_display_links, m.list_filter,
+                                             m.date_hierarchy, m.search_fields,
+                                             m.list_select_related, m.list_per_page,
+                                             m.list_max_show_all, m.list_editable, m)
+
+    def _follow_pages(self, params):
+        pages = []
+        while True:
+            cl = self._get_changelist(params)
+            pages.append([obj.pk for obj in cl.result_list])
+            if cl.page_num > 0:
+                self.assertFalse('OFFSET' in str(cl.result_list.query))
+            if cl.page_num + 1 >= cl.paginator.num_pages:
+                return pages
+            params = QueryDict(cl.get_query_string({PAGE_VAR: cl.page_num + 1})[1:])
+
+    def test_shared_ordering(self):
+        self.assertEqual(self._follow_pages({}), [[5, 4], [3, 2], [1]])
+
+    def test_translated_ordering(self):
+        Normal.objects.language('ja').create(shared_field='Shared6', translated_field='a')
+        cl = self._get_changelist({ORDER_VAR: '1'})
+        self.assertFalse(hasattr(cl._get_root_queryset(), 'shared_model'))
+        # Untranslated objects are listed, sorting as NULL values
+        if connection.vendor in ('postgresql', 'oracle'):
+            self.assertEqual(self._follow_pages({ORDER_VAR: '1'}), [[5, 4], [3, 2], [1, 6]])
+            self.assertEqual(self._follow_pages({ORDER_VAR: '-1'}), [[6, 1], [2, 3], [4, 5]])
+        else:
+            self.assertEqual(self._follow_pages({ORDER_VAR: '1'}), [[6, 5], [4, 3], [2, 1]])
+            self.assertEqual(self._follow_pages({ORDER_VAR: '-1'}), [[1, 2], [3, 4], [5, 6]])
+
+    def test_stale_cursor(self):
+        cl = self._get_changelist({})
+        query = QueryDict(cl.get_query_string({PAGE_VAR: 1})[1:])
+        self.assertTrue(CURSOR_VAR in query)
+        params = {PAGE_VAR: '2', CURSOR_VAR: query[CURSOR_VAR]}
+        cl = self._get_changelist(params)
+        self.assertEqual([obj.pk for obj in cl.result_list], [1])
+        self.assertFalse(CURSOR_VAR in cl.params)
+        params[CURSOR_VAR] = 'garbage'
+        cl = self._get_changelist(params)
+        self.assertEqual([obj.pk for obj in cl.result_list], [1])
+
+    def test_paginator(self):
+        qs = Normal.objects.language('en').order_by('translated_field', 'pk')
+        paginator = KeysetPaginator(qs, 2)
+        self.assertEqual([(lookup, descending) for lookup, field, descending in paginator.get_keys()],
+                         [('translated_field', False), ('master__pk', False)])
+        first = paginator.page(1).object_list
+        cursor = paginator.get_cursor(first[1])
+        self.assertEqual(cursor, ['b', '4'])
+        with self.assertNumQueries(1):
+            self.assertEqual([obj.pk for obj in paginator.page_after(2, cursor).object_list], [3, 2])
+        self.assertRaises(ValueError, paginator.page_after, 2, ['b'])
+        self.assertEqual(KeysetPaginator(qs.order_by('?'), 2).get_keys(), None)
+        self.assertEqual(KeysetPaginator(qs.order_by('translated_field'), 2).get_keys(), None)
@@ -2,17 +2,22 @@
 from __future__ import with_statement
 import django
 from django.core.exceptions import ImproperlyConfigured
+from django.db import models
 from django.db.models.manager import Manager
 from django.db.models.query_utils import Q
+from hvad.exceptions import LazyLoadError, LazyLoadWarning
 from hvad.manager import TranslationManager
 from hvad.models import TranslatableModelBase, TranslatableModel
-from hvad.test_utils.context_managers import LanguageOverride
+from hvad.test_utils.context_managers import LanguageOverride, StrictLoads
 from hvad.test_utils.data import DOUBLE_NORMAL
 from hvad.test_utils.fixtures import (OneSingleTranslatedNormalMixin, 
     TwoTranslatedNormalMixin)
 from hvad.test_utils.testcase import HvadTestCase, minimumDjangoVersion
-from hvad.test_utils.project.app.models import Normal, MultipleFields, Boolean
+from hvad.test_utils.project.app.models import (Normal, MultipleFields, Boolean, Article,
+                                                Related)
+from hvad.utils import refresh_available_languages, get_strict_loads, get_cached_translation
 from hvad.test_utils.project.alternate_models_app.models import NormalAlternate
+import threading
 
 
 class InvalidModel2(object):
@@ -55,6 +60,15 @@ class OptionsTest(HvadTestCase):
         relmodel = Normal._meta.get_field_by_name(opts.translations_accessor)[0].model
         self.assertEqual(relmodel, opts.translations_model)
 
+    def test_field_names(self):
+        self.assertEqual(Normal._shared_field_names, frozenset(('id', 'shared_field')))
+        self.assertEqual(Normal._translated_field_names,
+                         frozenset(('translated_field', 'language_code', 'master')))
+        # field names are computed per class, not stored on instances
+        obj = Normal(shared_field='shared', translated_field='English')
+        self.assertFalse('_shared_field_names_cache' in obj.__dict__)
+        self.assertFalse('_translated_field_names_cache' in obj.__dict__)
+
 
 class AlternateCreateTest(HvadTestCase):
     def test_create_instance_simple(self):
@@ -81,6 +95,17 @@ class CreateTest(HvadTestCase):
     
     def test_invalid_instantiation(self):
         self.assertRaises(RuntimeError, Normal, master=None)
+
+    def test_create_instance_attname(self):
+        normal = Normal.objects.language('en').create(shared_field='shared',
+                                                      translated_field='English')
+        obj = Related(normal_id=normal.pk, translated_id=normal.pk, language_code='en')
+        self.assertEqual(obj.normal_id, normal.pk)
+        self.assertEqual(get_cached_translation(obj).translated_id, normal.pk)
+        obj.save()
+        obj = Related.objects.language('en').get(pk=obj.pk)
+        self.assertEqual(obj.normal.pk, normal.pk)
+        self.assertEqual(obj.translated.pk, normal.pk)
     
     def test_create_nolang(self):
         with self.assertNumQueries(2):
@@ -339,6 +364,74 @@ class DescriptorTests(HvadTestCase):
         self.assertRaises(AttributeError, delattr, Normal(), 'language_code')
 
 
+class StrictLoadsTests(HvadTestCase, TwoTranslatedNormalMixin):
+    def test_loaded_translations(self):
+        with StrictLoads('raise'):
+            for obj in Normal.objects.language('en'):
+                self.assertEqual(obj.translated_field,
+                                 DOUBLE_NORMAL[obj.pk]['translated_field_en'])
+                self.assertEqual(obj.lazy_translation_getter('translated_field'),
+                                 DOUBLE_NORMAL[obj.pk]['translated_field_en'])
+
+    def test_descriptor(self):
+        with LanguageOverride('en'):
+            with StrictLoads('raise'):
+                for obj in Normal.objects.untranslated():
+                    self.assertRaises(LazyLoadError, getattr, obj, 'translated_field')
+            with StrictLoads('warn'):
+                with self.assertThrowsWarning(LazyLoadWarning, 2):
+                    for obj in Normal.objects.untranslated():
+                        self.assertEqual(obj.translated_field,
+                                         DOUBLE_NORMAL[obj.pk]['translated_field_en'])
+
+    def test_lazy_translation_getter(self):
+        with LanguageOverride('ja'):
+            with StrictLoads('raise'):
+                for obj in Normal.objects.untranslated():
+                    self.assertRaises(LazyLoadError, obj.lazy_translation_getter,
+                                      'translated_field')
+
+    def test_get_available_languages(self):
+        with StrictLoads('raise'):
+            for obj in Normal.objects.untranslated():
+                self.assertRaises(LazyLoadError, obj.get_available_languages)
+            if django.VERSION >= (1, 4):
+                for obj in Normal.objects.untranslated().prefetch_related('translations'):
+                    self.assertCountEqual(obj.get_available_languages(), ['en', 'ja'])
+
+    def test_single_instance(self):
+        # Only instances iterated over along with others are reported
+        with LanguageOverride('en'):
+            with StrictLoads('raise'):
+                obj = Normal.objects.untranslated().get(pk=1)
+                self.assertEqual(obj.translated_field, DOUBLE_NORMAL[1]['translated_field_en'])
+                obj = list(Normal.objects.untranslated().filter(pk=1))[0]
+                self.assertCountEqual(obj.get_available_languages(), ['en', 'ja'])
+
+    def test_other_thread(self):
+        # StrictLoads only applies to current thread
+        modes = []
+        def run():
+            modes.append(get_strict_loads())
+        with StrictLoads('raise'):
+            thread = threading.Thread(target=run)
+            thread.start()
+            thread.join()
+            self.assertEqual(get_strict_loads(), 'raise')
+        self.assertEqual(modes, [None])
+
+    def test_call_site(self):
+        with StrictLoads('raise'):
+            objs = list(Normal.objects.untranslated())
+            try:
+                objs[0].translated_field
+            except LazyLoadError as e:
+                self.assertTrue(__file__.rstrip('co') in str(e), str(e))
+                self.assertTrue('test_call_site' in str(e), str(e))
+            else:
+                self.fail('LazyLoadError not raised')
+
+
 class TableNameTest(HvadTestCase):
     def test_table_name_separator(self):
         from hvad.models import TranslatedFields
@@ -517,9 +610,210 @@ class GetOrCreateTest(HvadTestCase):
         self.assertNotEqual(en.pk, ja.pk)
 
 
+class DirtyTrackingTests(HvadTestCase, OneSingleTranslatedNormalMixin):
+    def test_dirty_fields(self):
+        obj = Normal.objects.language('en').get(pk=1)
+        trans = get_cached_translation(obj)
+        self.assertEqual(trans.get_dirty_fields(), [])
+        self.assertNotIn('_saved_values', trans.__dict__)     # snapshot is lazy
+        obj.translated_field = 'changed'
+        self.assertEqual(trans.get_dirty_fields(), ['translated_field'])
+        obj.save()
+        self.assertEqual(trans.get_dirty_fields(), [])
+        # once saved, direct changes are detected as well
+        trans.translated_field = 'changed again'
+        self.assertEqual(trans.get_dirty_fields(), ['translated_field'])
+
+        new = Normal._meta.translations_model(language_code='ja', translated_field='new')
+        new.master = Normal.objects.untranslated().get(pk=1)
+        self.assertIn('master', new.get_dirty_fields())
+
+    def test_instantiation(self):
+        # no hook runs on attribute assignment, nor is any snapshot taken
+        Translation = Normal._meta.translations_model
+        self.assertIs(Translation.__setattr__, object.__setattr__)
+        trans = Translation(1, 'value', 'en', 1)
+        self.assertNotIn('_saved_values', trans.__dict__)
+
+    def test_skip_unchanged(self):
+        # Django < 1.6 checks whether the row exists before updating it
+        queries = 1 if django.VERSION >= (1, 6) else 2
+        obj = Normal.objects.language('en').get(pk=1)
+        with self.assertNumQueries(queries):
+            obj.save()      # shared model only
+        obj.translated_field = 'changed'
+        with self.assertNumQueries(2 * queries):
+            obj.save()
+        with self.assertNumQueries(queries):
+            obj.save()
+        self.assertEqual(Normal.objects.language('en').get(pk=1).translated_field, 'changed')
+
+        # saving the translation directly always writes
+        trans = obj._meta.translations_model.objects.get(master__pk=1, language_code='en')
+        with self.assertNumQueries(queries):
+            trans.save()
+
+    def test_save_deleted_translation(self):
+        obj = Normal.objects.language('en').get(pk=1)
+        trans = obj._meta.translations_model.objects.get(master__pk=1, language_code='en')
+        obj._meta.translations_model.objects.filter(pk=trans.pk).delete()
+        obj.save()      # the unchanged cached translation is not written back
+        self.assertEqual(obj._meta.translations_model.objects.count(), 0)
+        trans.save()
+        self.assertEqual(Normal.objects.language('en').get(pk=1).translated_field,
+                         trans.translated_field)
+
+    @minimumDjangoVersion(1, 5)
+    def test_update_fields(self):
+        obj = Normal.objects.language('en').get(pk=1)
+        original = obj.translated_field
+        obj.shared_field = 'shared'
+        obj.translated_field = 'translated'
+        with self.assertNumQueries(1):
+            obj.save(update_fields=['shared_field'])
+        fresh = Normal.objects.language('en').get(pk=1)
+        self.assertEqual(fresh.shared_field, 'shared')
+        self.assertEqual(fresh.translated_field, original)
+
+        with self.assertNumQueries(1):
+            obj.save(update_fields=['translated_field'])
+        fresh = Normal.objects.language('en').get(pk=1)
+        self.assertEqual(fresh.translated_field, 'translated')
+
+        obj.shared_field = 'shared2'
+        obj.translated_field = 'translated2'
+        with self.assertNumQueries(2):
+            obj.save(update_fields=['shared_field', 'translated_field'])
+        fresh = Normal.objects.language('en').get(pk=1)
+        self.assertEqual((fresh.shared_field, fresh.translated_field), ('shared2', 'translated2'))
+
+
 class BooleanTests(HvadTestCase):
     def test_boolean_on_shared(self):
         Boolean.objects.language('en').create(shared_flag=True, translated_flag=False)
         en = Boolean.objects.language('en').get()
         self.assertEqual(en.shared_flag, True)
         self.assertEqual(en.translated_flag, False)
+
+
+class AvailableLanguagesFieldTests(HvadTestCase):
+    def setUp(self):
+        super(AvailableLanguagesFieldTests, self).setUp()
+        self.article = Article.objects.language('en').create(slug='first', title='First')
+
+    def get_languages(self, pk):
+        return Article.objects.untranslated().values_list('languages', flat=True).get(pk=pk)
+
+    def test_definition(self):
+        field = Article._meta.get_field('languages')
+        self.assertFalse(field.editable)
+        self.assertIsInstance(field, models.TextField)
+        self.assertEqual(Article._meta.available_languages_field, 'languages')
+        self.assertEqual(Normal._meta.available_languages_field, None)
+        self.assertFalse(hasattr(Article._meta.translations_model._meta, 'available_languages'))
+
+    def test_save(self):
+        self.assertEqual(self.article.languages, 'en')
+        self.assertEqual(self.get_languages(self.article.pk), 'en')
+        self.article.translate('de')
+        self.article.title = 'Erste'
+        self.article.save()
+        self.assertEqual(self.article.languages, 'de,en')
+        self.assertEqual(self.get_languages(self.article.pk), 'de,en')
+
+        # saving an existing translation does not refresh languages
+        # Django < 1.6 checks whether rows exist before updating them
+        self.article.title = 'Erster'
+        with self.assertNumQueries(2 if django.VERSION >= (1, 6) else 4):
+            self.article.save()
+
+    def test_get_available_languages(self):
+        self.article.translate('ja')
+        self.article.save()
+        obj = Article.objects.untranslated().get(pk=self.article.pk)
+        with StrictLoads('raise'):
+            with self.assertNumQueries(0):
+                self.assertEqual(obj.get_available_languages(), ['en', 'ja'])
+        self.assertEqual(Article(slug='new').get_available_languages(), [])
+
+    def test_delete_translation(self):
+        self.article.translate('ja')
+        self.article.save()
+        Article.objects.language('ja').get(pk=self.article.pk).translations.get(language_code='ja').delete()
+        self.assertEqual(self.get_languages(self.article.pk), 'en')
+
+        Article.objects.language('en').filter(pk=self.article.pk).delete_translations()
+        self.assertEqual(self.get_languages(self.article.pk), '')
+        self.assertEqual(Article.objects.untranslated().get(pk=self.article.pk)
+                                        .get_available_languages(), [])
+
+    def test_update_translation(self):
+        tmodel = Article._meta.translations_model
+        other = Article.objects.language('ja').create(slug='second', title='Second')
+
+        translation = tmodel.objects.get(master=self.article)
+        translation.language_code = 'fr'
+        translation.save()
+        self.assertEqual(self.get_languages(self.article.pk), 'fr')
+
+        # moving the translation refreshes both masters, using the snapshot
+        translation.master = other
+        with self.assertNumQueries(0):
+            self.assertEqual(translation._get_saved_key(), (self.article.pk, 'fr'))
+        translation.save()
+        self.assertEqual(self.get_languages(self.article.pk), '')
+        self.assertEqual(self.get_languages(other.pk), 'fr,ja')
+        self.assertEqual(other.languages, 'fr,ja')  # the cached master is updated
+
+        # other fields do not refresh languages
+        translation.title = 'Changed'
+        with self.assertNumQueries(1 if django.VERSION >= (1, 6) else 2):
+            translation.save()
+
+    def test_bulk_update(self):
+        other = Article.objects.language('ja').create(slug='second', title='Second')
+        Article.objects.language('en').update(language_code='fr')
+        self.assertEqual(self.get_languages(self.article.pk), 'fr')
+        self.assertEqual(self.get_languages(other.pk), 'ja')
+
+    def test_translations_queryset_writes(self):
+        tmodel = Article._meta.translations_model
+        self.article.translations.update(language_code='fr')
+        self.assertEqual(self.get_languages(self.article.pk), 'fr')
+        if django.VERSION >= (1, 4):
+            tmodel.objects.bulk_create([tmodel(master=self.article, language_code='ja',
+                                               title='Japanese')])
+            self.assertEqual(self.get_languages(self.article.pk), 'fr,ja')
+
+    def test_refresh(self):
+        Article.objects.untranslated().update(languages='')
+        self.assertEqual(refresh_available_languages(Article), {self.article.pk: 'en'})
+        self.assertEqual(self.get_languages(self.article.pk), 'en')
+        self.assertEqual(refresh_available_languages(Normal), None)
+
+    def test_delete_translation_queryset(self):
+        self.article.translate('ja')
+        self.article.save()
+        self.article.translations.filter(language_code='ja').delete()
+        self.assertEqual(self.get_languages(self.article.pk), 'en')
+
+    def test_delete_many_instances(self):
+        for slug in ('second', 'third'):
+            Article.objects.language('en').create(slug=slug, title=slug)
+        for obj in Article.objects.language('en'):
+            for language in ('de', 'fr', 'ja'):
+                obj.translate(language)
+                obj.title = language
+                obj.save()
+        # Languages of deleted instances are not refreshed: two queries load
+        # instances and translations, three delete them.
+        with self.assertNumQueries(5):
+            Article.objects.language('en').delete()
+        self.assertEqual(Article.objects.untranslated().count(), 0)
+        self.assertEqual(Article._meta.translations_model.objects.count(), 0)
+
+    def test_delete_instance(self):
+        self.article.translate('ja')
+        self.article.save()
+        Article.objects.untranslated().get(pk=self.article.pk).delete()
+        self.assertEqual(Article.objects.untranslated().count(), 0)
@@ -0,0 +1,122 @@
+# -*- coding: utf-8 -*-
+from hvad.batch import batch, get_batch, Batch
+from hvad.test_utils.data import DOUBLE_NORMAL
+from hvad.test_utils.fixtures import TwoTranslatedNormalMixin
+from hvad.test_utils.testcase import HvadTestCase
+from hvad.test_utils.project.app.models import Normal, Article
+
+
+class BatchTests(HvadTestCase, TwoTranslatedNormalMixin):
+    def test_coalesce(self):
+        obj = Normal.objects.language('en').get(shared_field='Shared1')
+        with batch():
+            with self.assertNumQueries(0):
+                for index in range(3):
+                    obj.shared_field = 'shared%d' % index
+                    obj.translated_field = 'translated%d' % index
+                    obj.save()
+            self.assertEqual(Normal.objects.language('en').get(pk=obj.pk).translated_field,
+                             DOUBLE_NORMAL[1]['translated_field_en'])
+        fresh = Normal.objects.language('en').get(pk=obj.pk)
+        self.assertEqual(fresh.shared_field, 'shared2')
+        self.assertEqual(fresh.translated_field, 'translated2')
+        self.assertEqual(obj.translations.get(language_code='en').get_dirty_fields(), [])
+
+    def test_translate(self):
+        objs = list(Normal.objects.untranslated().order_by('pk'))
+        with batch():
+            with self.assertNumQueries(0):
+                for obj in objs:
+                    obj.translate('fr')
+                    obj.translated_field = u'Français%d' % obj.pk
+                    obj.save()
+                    # Saving again coalesces
+                    obj.save()
+        self.assertTrue(all(obj.translations_cache.pk is not None for obj in objs))
+        for obj in objs:
+            self.assertEqual(Normal.objects.language('fr').get(pk=obj.pk).translated_field,
+                             u'Français%d' % obj.pk)
+            self.assertEqual(sorted(obj.get_available_languages()), ['en', 'fr', 'ja'])
+
+    def test_new_instance(self):
+        with batch():
+            obj = Normal.objects.language('de').create(shared_field='new',
+                                                       translated_field='neu')
+            self.assertNotEqual(obj.pk, None)
+            self.assertFalse(Normal.objects.language('de').filter(pk=obj.pk).exists())
+        self.assertEqual(Normal.objects.language('de').get(pk=obj.pk).translated_field, 'neu')
+
+    def test_delete_translations(self):
+        article = Article.objects.language('en').create(slug='first', title='First')
+        article.translate('ja')
+        article.title = u'最初'
+        article.save()
+        with batch():
+            Normal.objects.language('ja').delete_translations()
+            Article.objects.language('ja').delete_translations()
+            self.assertEqual(Normal.objects.language('ja').count(), 2)
+            # Deleting then creating a translation in the same batch works
+            obj = Normal.objects.untranslated().get(shared_field='Shared1')
+            obj.translate('ja')
+            obj.translated_field = u'新しい'
+            obj.save()
+        self.assertEqual(list(Normal.objects.language('ja').values_list('translated_field', flat=True)),
+                         [u'新しい'])
+        self.assertEqual(Normal.objects.language('en').count(), 2)
+        self.assertEqual(Article.objects.untranslated().get(pk=article.pk).languages, 'en')
+
+    def test_delete(self):
+        obj = Normal.objects.language('en').get(shared_field='Shared1')
+        with batch():
+            new = Normal.objects.language('de').create(shared_field='new',
+                                                       translated_field='neu')
+            obj.translated_field = 'changed'
+            obj.save()
+            # Queued saves of deleted instances are dropped
+            new.delete()
+            obj.delete()
+        self.assertFalse(Normal.objects.untranslated().filter(pk__in=[new.pk, obj.pk]).exists())
+        Translation = Normal._meta.translations_model
+        self.assertFalse(Translation.objects.filter(master__in=[new.pk, obj.pk]).exists())
+
+        obj = Normal.objects.language('en').get(shared_field='Shared2')
+        with batch():
+            obj.translated_field = 'changed'
+            obj.save()
+            obj.translations_cache.delete()
+        self.assertFalse(Normal.objects.language('en').filter(pk=obj.pk).exists())
+
+    def test_other_database(self):
+        obj = Normal.objects.language('en').get(shared_field='Shared1')
+        current = Batch('other')
+        self.assertRaises(ValueError, current.save_shared, obj, {})
+        self.assertRaises(ValueError, current.save_shared, obj, {'using': 'default'})
+        self.assertRaises(ValueError, current.delete_translations,
+                          Normal._meta.translations_model, 'default', [])
+        self.assertEqual(Batch('default').get_database(obj), 'default')
+
+    def test_rollback(self):
+        obj = Normal.objects.language('en').get(shared_field='Shared1')
+        try:
+            with batch():
+                obj.translated_field = 'changed'
+                obj.save()
+                Normal.objects.language('ja').delete_translations()
+                raise ValueError
+        except ValueError:
+            pass
+        self.assertEqual(get_batch(), None)
+        self.assertEqual(Normal.objects.language('en').get(pk=obj.pk).translated_field,
+                         DOUBLE_NORMAL[1]['translated_field_en'])
+        self.assertEqual(Normal.objects.language('ja').count(), 2)
+
+    def test_nested(self):
+        obj = Normal.objects.language('en').get(shared_field='Shared1')
+        with batch() as outer:
+            with batch() as inner:
+                self.assertIs(inner, outer)
+                obj.translated_field = 'changed'
+                obj.save()
+            self.assertEqual(Normal.objects.language('en').get(pk=obj.pk).translated_field,
+                             DOUBLE_NORMAL[1]['translated_field_en'])
+        self.assertEqual(Normal.objects.language('en').get(pk=obj.pk).translated_field, 'changed')
@@ -0,0 +1,330 @@
+# -*- coding: utf-8 -*-
+import django
+from django.core.signals import request_started
+from django.db.models.signals import post_save, post_delete
+from django.dispatch.dispatcher import _make_id
+from hvad import cache as translation_cache
+from hvad.manager import LegacyFallbackQueryset, SelfJoinFallbackQueryset
+from hvad.test_utils.context_managers import LanguageOverride, StrictLoads
+from hvad.test_utils.data import DOUBLE_NORMAL
+from hvad.test_utils.testcase import HvadTestCase, minimumDjangoVersion
+from hvad.test_utils.project.app.models import Normal, NormalProxy, SimpleRelated, Standard, Unit
+from hvad.test_utils.fixtures import TwoTranslatedNormalMixin
+from hvad.utils import get_translation
+if django.VERSION >= (1, 4):
+    from django.test.utils import override_settings
+else:
+    override_settings = lambda **kwargs: (lambda x: x)
+
+
+@minimumDjangoVersion(1, 4)
+@override_settings(HVAD_TRANSLATION_CACHE='default')
+class TranslationCacheTests(HvadTestCase, TwoTranslatedNormalMixin):
+    def setUp(self):
+        super(TranslationCacheTests, self).setUp()
+        translation_cache.get_backend().clear()
+
+    def tearDown(self):
+        translation_cache.get_backend().clear()
+        super(TranslationCacheTests, self).tearDown()
+
+    def test_get_translation(self):
+        obj = Normal.objects.untranslated().get(pk=1)
+        with self.assertNumQueries(1):
+            trans = get_translation(obj, 'ja')
+        with self.assertNumQueries(0):
+            cached = get_translation(obj, 'ja')
+        self.assertEqual(cached.pk, trans.pk)
+        self.assertEqual(cached.translated_field, DOUBLE_NORMAL[1]['translated_field_ja'])
+        self.assertEqual(cached.language_code, 'ja')
+        self.assertTrue(cached.master is obj)
+
+    def test_descriptor(self):
+        with LanguageOverride('en'):
+            obj = Normal.objects.untranslated().get(pk=1)
+            with self.assertNumQueries(1):
+                self.assertEqual(obj.translated_field, DOUBLE_NORMAL[1]['translated_field_en'])
+            obj = Normal.objects.untranslated().get(pk=1)
+            with self.assertNumQueries(0):
+                self.assertEqual(obj.translated_field, DOUBLE_NORMAL[1]['translated_field_en'])
+
+    def test_get_by_pk(self):
+        with self.assertNumQueries(1):
+            obj = Normal.objects.language('ja').get(pk=1)
+        with self.assertNumQueries(0):
+            cached = Normal.objects.language('ja').get(pk='1')
+            self.assertEqual(cached.pk, obj.pk)
+            self.assertEqual(cached.shared_field, DOUBLE_NORMAL[1]['shared_field'])
+            self.assertEqual(cached.translated_field, DOUBLE_NORMAL[1]['translated_field_ja'])
+            self.assertEqual(cached.language_code, 'ja')
+        with self.assertNumQueries(0):
+            proxied = NormalProxy.objects.language('ja').get(id=1)
+            self.assertTrue(isinstance(proxied, NormalProxy))
+        # other languages and lookups are not affected
+        with self.assertNumQueries(1):
+            self.assertEqual(Normal.objects.language('en').get(pk=1).translated_field,
+                             DOUBLE_NORMAL[1]['translated_field_en'])
+        with self.assertNumQueries(1):
+            Normal.objects.language('ja').get(pk=1, shared_field=DOUBLE_NORMAL[1]['shared_field'])
+        with self.assertNumQueries(1):
+            Normal.objects.language('ja').filter(shared_field__contains='Shared').get(pk=1)
+
+    def test_save_invalidates(self):
+        obj = Normal.objects.language('ja').get(pk=1)
+        obj.shared_field = 'changed shared'
+        obj.translated_field = 'changed translated'
+        obj.save()
+        with self.assertNumQueries(1):
+            obj = Normal.objects.language('ja').get(pk=1)
+        self.assertEqual(obj.shared_field, 'changed shared')
+        self.assertEqual(obj.translated_field, 'changed translated')
+
+    def test_delete_invalidates(self):
+        Normal.objects.language('ja').get(pk=1)
+        Normal.objects.language('ja').get(pk=1).translations.get(language_code='ja').delete()
+        self.assertRaises(Normal.DoesNotExist, Normal.objects.language('ja').get, pk=1)
+        Normal.objects.language('en').get(pk=2)
+        Normal.objects.untranslated().get(pk=2).delete()
+        self.assertRaises(Normal.DoesNotExist, Normal.objects.language('en').get, pk=2)
+
+    def test_update_invalidates(self):
+        Normal.objects.language('ja').get(pk=1)
+        Normal.objects.language('ja').update(translated_field='updated')
+        self.assertEqual(Normal.objects.language('ja').get(pk=1).translated_field, 'updated')
+        Normal.objects.language('ja').update(shared_field='updated')
+        self.assertEqual(Normal.objects.language('ja').get(pk=1).shared_field, 'updated')
+        Normal.objects.language('ja').filter(pk=1).delete_translations()
+        self.assertRaises(Normal.DoesNotExist, Normal.objects.language('ja').get, pk=1)
+
+    def test_receivers(self):
+        # Other models keep fast deletes
+        def senders(signal):
+            return set(sender for (uid, sender), receiver in signal.receivers
+                       if uid == 'hvad.cache.invalidate')
+        for signal in (post_save, post_delete):
+            self.assertIn(_make_id(Normal), senders(signal))
+            self.assertIn(_make_id(Normal._meta.translations_model), senders(signal))
+            self.assertNotIn(_make_id(Standard), senders(signal))
+            self.assertNotIn(_make_id(None), senders(signal))
+
+    def test_plain_update_invalidates(self):
+        Normal.objects.language('ja').get(pk=1)
+        Normal.objects.filter(pk=1).update(shared_field='updated')
+        self.assertEqual(Normal.objects.language('ja').get(pk=1).shared_field, 'updated')
+        (Normal._meta.translations_model.objects.filter(master__pk=1, language_code='ja')
+                                                .update(translated_field='updated'))
+        self.assertEqual(Normal.objects.language('ja').get(pk=1).translated_field, 'updated')
+
+    def test_plain_bulk_create_invalidates(self):
+        qs = Normal.objects.untranslated().use_fallbacks('ja').cache()
+        self.assertEqual(len(list(qs.all())), 2)
+        Normal.objects.bulk_create([Normal(shared_field='bulk')])
+        self.assertEqual(len(list(qs.all())), 3)
+
+    def test_disabled(self):
+        Normal.objects.language('ja').get(pk=1)
+        with override_settings(HVAD_TRANSLATION_CACHE=None):
+            with self.assertNumQueries(1):
+                Normal.objects.language('ja').get(pk=1)
+
+
+@minimumDjangoVersion(1, 4)
+@override_settings(HVAD_TRANSLATION_CACHE='default')
+class QuerysetCacheTests(HvadTestCase, TwoTranslatedNormalMixin):
+    def setUp(self):
+        super(QuerysetCacheTests, self).setUp()
+        translation_cache.get_backend().clear()
+
+    def tearDown(self):
+        translation_cache.get_backend().clear()
+        super(QuerysetCacheTests, self).tearDown()
+
+    def test_translated(self):
+        with LanguageOverride('ja'):
+            with self.assertNumQueries(1):
+                objs = list(Normal.objects.language().cache().order_by('pk'))
+            with self.assertNumQueries(0):
+                cached = list(Normal.objects.language().cache().order_by('pk'))
+                self.assertEqual([obj.pk for obj in cached], [obj.pk for obj in objs])
+                for obj in cached:
+                    self.assertEqual(obj.shared_field, DOUBLE_NORMAL[obj.pk]['shared_field'])
+                    self.assertEqual(obj.translated_field, DOUBLE_NORMAL[obj.pk]['translated_field_ja'])
+                    self.assertEqual(obj.language_code, 'ja')
+        # language and filters are part of the key
+        with self.assertNumQueries(1):
+            objs = list(Normal.objects.language('en').cache().order_by('pk'))
+            self.assertEqual(objs[0].translated_field, DOUBLE_NORMAL[1]['translated_field_en'])
+        with self.assertNumQueries(1):
+            self.assertEqual(len(Normal.objects.language('ja').cache().filter(pk=1)), 1)
+        with self.assertNumQueries(1):
+            self.assertEqual(len(Normal.objects.language('ja').filter(pk=1)), 1)
+
+    def test_proxy(self):
+        list(Normal.objects.language('ja').cache())
+        with self.assertNumQueries(0):
+            objs = list(NormalProxy.objects.language('ja').cache())
+        self.assertTrue(all(isinstance(obj, NormalProxy) for obj in objs))
+
+    def test_fallbacks(self):
+        classes = [(LegacyFallbackQueryset, 2)]
+        if django.VERSION >= (1, 6):
+            classes.append((SelfJoinFallbackQueryset, 1))
+        for qs_class, num_queries in classes:
+            translation_cache.get_backend().clear()
+            with LanguageOverride('ja'):
+                qs = qs_class(Normal).use_fallbacks('en').cache().order_by('pk')
+                with self.assertNumQueries(num_queries):
+                    objs = list(qs)
+                with self.assertNumQueries(0):
+                    cached = list(qs_class(Normal).use_fallbacks('en').cache().order_by('pk'))
+                    self.assertEqual([obj.pk for obj in cached], [obj.pk for obj in objs])
+                    for obj in cached:
+                        self.assertEqual(obj.translated_field, DOUBLE_NORMAL[obj.pk]['translated_field_en'])
+                # fallbacks are part of the key
+                with self.assertNumQueries(num_queries):
+                    list(qs_class(Normal).use_fallbacks('ja').cache().order_by('pk'))
+
+    def test_save_invalidates(self):
+        list(Normal.objects.language('ja').cache())
+        obj = Normal.objects.language('en').get(pk=1)
+        obj.translated_field = 'changed'
+        obj.save()
+        with self.assertNumQueries(1):
+            list(Normal.objects.language('ja').cache())
+        obj = Normal.objects.untranslated().get(pk=1)
+        obj.shared_field = 'changed'
+        obj.save()
+        with self.assertNumQueries(1):
+            objs = list(Normal.objects.language('ja').cache().order_by('pk'))
+        self.assertEqual(objs[0].shared_field, 'changed')
+
+    def test_bulk_invalidates(self):
+        list(Normal.objects.language('ja').cache())
+        Normal.objects.language('ja').filter(pk=1).update(translated_field='updated')
+        self.assertEqual(Normal.objects.language('ja').cache().get(pk=1).translated_field, 'updated')
+        Normal.objects.untranslated().filter(pk=1).update(shared_field='updated')
+        self.assertEqual(Normal.objects.language('ja').cache().get(pk=1).shared_field, 'updated')
+        Normal.objects.language('ja').filter(pk=1).delete_translations()
+        self.assertEqual([obj.pk for obj in Normal.objects.language('ja').cache()], [2])
+        Normal.objects.language('ja').filter(pk=2).delete()
+        self.assertEqual(list(Normal.objects.language('ja').cache()), [])
+
+    def test_select_related(self):
+        qs = SimpleRelated.objects.language('ja').select_related('normal').cache()
+        self.assertRaises(NotImplementedError, list, qs)
+
+    def test_disabled(self):
+        list(Normal.objects.language('ja').cache())
+        with override_settings(HVAD_TRANSLATION_CACHE=None):
+            with self.assertNumQueries(1):
+                list(Normal.objects.language('ja').cache())
+
+
+class SnapshotTests(HvadTestCase):
+    def setUp(self):
+        super(SnapshotTests, self).setUp()
+        self.snapshot = translation_cache.get_snapshot(Unit)
+        self.snapshot.clear()
+        self.meter = Unit.objects.language('en').create(symbol='m', name='meter')
+        self.meter.translate('ja')
+        self.meter.name = u'メートル'
+        self.meter.save()
+        self.gram = Unit.objects.language('en').create(symbol='g', name='gram')
+
+    def tearDown(self):
+        self.snapshot.clear()
+        super(SnapshotTests, self).tearDown()
+
+    def test_get_by_pk(self):
+        with self.assertNumQueries(2):
+            obj = Unit.objects.language('ja').get(pk=self.meter.pk)
+        self.assertEqual(obj.symbol, 'm')
+        self.assertEqual(obj.name, u'メートル')
+        self.assertEqual(obj.language_code, 'ja')
+        with self.assertNumQueries(0):
+            obj = Unit.objects.language('en').get(pk=self.gram.pk)
+            self.assertEqual(obj.name, 'gram')
+        # missing translations are looked up in the database
+        with self.assertNumQueries(1):
+            self.assertRaises(Unit.DoesNotExist,
+                              Unit.objects.language('ja').get, pk=self.gram.pk)
+
+    def test_descriptor(self):
+        obj = Unit.objects.untranslated().get(pk=self.meter.pk)
+        self.snapshot.load_translations(obj)
+        with LanguageOverride('ja'):
+            with StrictLoads():
+                with self.assertNumQueries(0):
+                    self.assertEqual(obj.name, u'メートル')
+                    obj.name = 'changed'
+                    self.assertEqual(obj.name, 'changed')
+        self.assertEqual(Unit.objects.language('ja').get(pk=self.meter.pk).name, u'メートル')
+
+    def test_helpers(self):
+        obj = Unit.objects.untranslated().get(pk=self.meter.pk)
+        self.snapshot.load_translations(obj)
+        with self.assertNumQueries(0):
+            self.assertEqual(sorted(obj.get_available_languages()), ['en', 'ja'])
+            with LanguageOverride('ja'):
+                self.assertEqual(obj.lazy_translation_getter('name'), u'メートル')
+
+    def test_fallbacks(self):
+        with LanguageOverride('ja'):
+            with self.assertNumQueries(3):
+                objs = list(Unit.objects.untranslated().use_fallbacks().order_by('symbol'))
+            with self.assertNumQueries(1):
+                objs = list(Unit.objects.untranslated().use_fallbacks().order_by('symbol'))
+        self.assertEqual([obj.name for obj in objs], ['gram', u'メートル'])
+
+    def test_invalidation(self):
+        Unit.objects.language('en').get(pk=self.meter.pk)
+        obj = Unit.objects.language('en').get(pk=self.meter.pk)
+        obj.name = 'metre'
+        obj.save()
+        self.assertEqual(Unit.objects.language('en').get(pk=self.meter.pk).name, 'metre')
+        Unit.objects.language('en').filter(pk=self.meter.pk).update(name='meter')
+        self.assertEqual(Unit.objects.language('en').get(pk=self.meter.pk).name, 'meter')
+        Unit.objects.language('en').filter(pk=self.meter.pk).delete()
+        self.assertRaises(Unit.DoesNotExist,
+                          Unit.objects.language('en').get, pk=self.meter.pk)
+
+    def test_plain_update_invalidates(self):
+        Unit.objects.language('en').get(pk=self.meter.pk)
+        Unit.objects.filter(pk=self.meter.pk).update(symbol='M')
+        (Unit._meta.translations_model.objects.filter(master__pk=self.meter.pk, language_code='en')
+                                              .update(name='metre'))
+        obj = Unit.objects.language('en').get(pk=self.meter.pk)
+        self.assertEqual((obj.symbol, obj.name), ('M', 'metre'))
+
+    @minimumDjangoVersion(1, 4)
+    def test_shared_generation(self):
+        with override_settings(HVAD_TRANSLATION_CACHE='default'):
+            translation_cache.get_backend().clear()
+            Unit.objects.language('en').get(pk=self.meter.pk)
+            with self.assertNumQueries(0):
+                Unit.objects.language('en').get(pk=self.meter.pk)
+            # Another process changing the model
+            translation_cache.get_backend().incr(
+                translation_cache._make_generation_key(None, Unit))
+            with self.assertNumQueries(0):
+                Unit.objects.language('en').get(pk=self.meter.pk)
+            request_started.send(sender=None)
+            with self.assertNumQueries(2):
+                Unit.objects.language('en').get(pk=self.meter.pk)
+            translation_cache.get_backend().clear()
+
+    @minimumDjangoVersion(1, 4)
+    def test_shared_generation_without_cache(self):
+        with override_settings(HVAD_GENERATION_CACHE='default'):
+            self.assertFalse(translation_cache.enabled())
+            backend = translation_cache.get_backend('default')
+            backend.clear()
+            Unit.objects.language('en').get(pk=self.meter.pk)
+            with self.assertNumQueries(0):
+                Unit.objects.language('en').get(pk=self.meter.pk)
+            # Another process changing the model
+            backend.incr(translation_cache._make_generation_key(None, Unit))
+            request_started.send(sender=None)
+            with self.assertNumQueries(2):
+                Unit.objects.language('en').get(pk=self.meter.pk)
+            backend.clear()
@@ -0,0 +1,128 @@
+# -*- coding: utf-8 -*-
+import django
+import os
+from django.core.management import call_command
+from django.core.signals import request_started
+from hvad import cache as translation_cache, catalog
+from hvad.test_utils.context_managers import LanguageOverride, StrictLoads
+from hvad.test_utils.testcase import HvadTestCase, minimumDjangoVersion
+from hvad.test_utils.tmpdir import temp_dir
+from hvad.test_utils.project.app.models import Country, Normal
+try:
+    from StringIO import StringIO   # python 2, accepts native strings
+except ImportError:
+    from io import StringIO
+if django.VERSION >= (1, 4):
+    from django.test.utils import override_settings
+else:
+    override_settings = lambda **kwargs: (lambda x: x)
+
+
+@minimumDjangoVersion(1, 4)
+class CatalogTests(HvadTestCase):
+    def setUp(self):
+        super(CatalogTests, self).setUp()
+        self.france = Country.objects.language('en').create(code='fr', name='France')
+        self.france.translate('ja')
+        self.france.name = u'フランス'
+        self.france.save()
+        self.japan = Country.objects.language('ja').create(code='jp', name=u'日本')
+        self.snapshot = translation_cache.get_snapshot(Country)
+
+    def tearDown(self):
+        self.snapshot.clear()
+        super(CatalogTests, self).tearDown()
+
+    def export(self, path):
+        call_command('exportcatalog', 'app.Country', output=path, stdout=StringIO())
+        # simulate a new request, so the catalog is looked up again
+        request_started.send(sender=None)
+
+    def test_format(self):
+        with temp_dir() as directory:
+            path = os.path.join(directory, 'catalog')
+            catalog.export_catalog(path, [Country, Normal])
+            data = catalog.Catalog(path)
+            self.assertEqual(data.find(Country, self.france.pk, 'ja')[1], u'フランス')
+            self.assertEqual(data.find(Country, self.japan.pk, 'ja')[1], u'日本')
+            shared, languages = data.find(Country, self.france.pk)
+            self.assertEqual(shared[1], 'fr')
+            self.assertEqual(languages, ('en', 'ja'))
+            self.assertEqual(data.find(Country, self.japan.pk, 'en'), None)
+            self.assertEqual(data.find(Country, 42, 'en'), None)
+            self.assertEqual(data.find(Normal, self.france.pk), None)
+            self.assertTrue(data.is_current(Country))
+            self.assertFalse(data.is_current(Country, using='other'))
+            data.close()
+            self.assertTrue(data.closed)
+
+    def test_lookups(self):
+        with temp_dir() as directory:
+            path = os.path.join(directory, 'catalog')
+            with override_settings(HVAD_CATALOG=path):
+                self.export(path)
+                with self.assertNumQueries(0):
+                    obj = Country.objects.language('ja').get(pk=self.france.pk)
+                    self.assertEqual(obj.code, 'fr')
+                    self.assertEqual(obj.name, u'フランス')
+                    self.assertEqual(sorted(obj.get_available_languages()), ['en', 'ja'])
+                # missing translations are looked up in the database
+                with self.assertNumQueries(1):
+                    self.assertRaises(Country.DoesNotExist,
+                                      Country.objects.language('en').get, pk=self.japan.pk)
+
+                obj = Country.objects.untranslated().get(pk=self.france.pk)
+                with StrictLoads():
+                    with LanguageOverride('en'):
+                        with self.assertNumQueries(0):
+                            self.assertEqual(obj.name, 'France')
+
+                with LanguageOverride('en'):
+                    with self.assertNumQueries(1):
+                        objs = list(Country.objects.untranslated().use_fallbacks().order_by('code'))
+                self.assertEqual([country.name for country in objs], ['France', u'日本'])
+
+    def test_local_changes(self):
+        with temp_dir() as directory:
+            path = os.path.join(directory, 'catalog')
+            with override_settings(HVAD_CATALOG=path):
+                self.export(path)
+                Country.objects.language('ja').filter(pk=self.japan.pk).update(name='Nippon')
+                with self.assertNumQueries(1):
+                    self.assertEqual(Country.objects.language('ja').get(pk=self.japan.pk).name, 'Nippon')
+                # catalog stays disabled until it is exported again
+                request_started.send(sender=None)
+                with self.assertNumQueries(1):
+                    Country.objects.language('ja').get(pk=self.japan.pk)
+                self.export(path)
+                with self.assertNumQueries(0):
+                    self.assertEqual(Country.objects.language('ja').get(pk=self.japan.pk).name, 'Nippon')
+
+    def test_replaced_file(self):
+        with temp_dir() as directory:
+            path = os.path.join(directory, 'catalog')
+            with override_settings(HVAD_CATALOG=path):
+                self.export(path)
+                previous = catalog.get_catalog()
+                self.export(path)
+                with self.assertNumQueries(0):
+                    Country.objects.language('ja').get(pk=self.japan.pk)
+                self.assertIsNot(catalog.get_catalog(), previous)
+                self.assertTrue(previous.closed)
+
+    def test_missing_file(self):
+        with temp_dir() as directory:
+            path = os.path.join(directory, 'catalog')
+            with override_settings(HVAD_CATALOG=path):
+                request_started.send(sender=None)
+                with self.assertNumQueries(1):
+                    self.assertEqual(Country.objects.language('ja').get(pk=self.japan.pk).name, u'日本')
+
+    def test_command(self):
+        with temp_dir() as directory:
+            path = os.path.join(directory, 'catalog')
+            with override_settings(HVAD_CATALOG=path):
+                call_command('exportcatalog', stdout=StringIO())
+                self.assertTrue(catalog.Catalog(path).is_current(Country))
+            self.assertCommandError('exportcatalog', 'app.Nothing', output=path)
+            self.assertCommandError('exportcatalog', 'app.Standard', output=path)
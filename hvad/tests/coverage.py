@@ -0,0 +1,69 @@
+# -*- coding: utf-8 -*-
+from django.core.management import call_command
+from hvad.coverage import get_coverage
+from hvad.test_utils.testcase import HvadTestCase
+from hvad.test_utils.project.app.models import Normal, AggregateModel
+try:
+    from StringIO import StringIO   # python 2, accepts native strings
+except ImportError:
+    from io import StringIO
+
+
+class CoverageTests(HvadTestCase):
+    def setUp(self):
+        super(CoverageTests, self).setUp()
+        self.both = Normal.objects.language('en').create(shared_field='both',
+                                                         translated_field='English')
+        self.both.translate('ja')
+        self.both.translated_field = ''
+        self.both.save()
+        self.english = Normal.objects.language('en').create(shared_field='english',
+                                                            translated_field='English')
+        self.french = Normal.objects.language('fr').create(shared_field='french',
+                                                           translated_field='French')
+        self.none = Normal.objects.untranslated().create(shared_field='none')
+
+    def test_coverage(self):
+        with self.assertNumQueries(1):
+            coverage = get_coverage(Normal, languages=['en', 'ja'])
+        self.assertEqual(len(coverage), 4)
+        self.assertEqual(coverage.pks, [self.both.pk, self.english.pk,
+                                        self.french.pk, self.none.pk])
+        self.assertEqual(coverage.matrix(), [[True, True], [True, False],
+                                             [False, False], [False, False]])
+        self.assertEqual(coverage.translated, {'en': 2, 'ja': 1})
+        self.assertEqual(coverage.empty, {('translated_field', 'en'): 0,
+                                          ('translated_field', 'ja'): 1})
+        self.assertTrue(coverage.has_translation(self.both.pk, 'ja'))
+        self.assertFalse(coverage.has_translation(self.english.pk, 'ja'))
+        self.assertEqual(coverage.missing('en'), [self.french.pk, self.none.pk])
+
+    def test_querysets(self):
+        with self.settings(LANGUAGES=(('en', 'English'), ('fr', 'French'))):
+            coverage = get_coverage(Normal.objects.untranslated().filter(shared_field__startswith='f'))
+        self.assertEqual(coverage.languages, ('en', 'fr'))
+        self.assertEqual(coverage.pks, [self.french.pk])
+        self.assertEqual(coverage.masks, [2])
+
+        coverage = get_coverage(Normal.objects.language('en'), languages=['en', 'fr'])
+        self.assertEqual(coverage.pks, [self.both.pk, self.english.pk])
+
+        with self.assertNumQueries(0):
+            coverage = get_coverage(Normal.objects.untranslated().filter(pk__in=[]))
+        self.assertEqual(len(coverage), 0)
+
+    def test_non_text_fields(self):
+        AggregateModel.objects.language('en').create(number=1, translated_number=0)
+        coverage = get_coverage(AggregateModel, languages=['en'])
+        self.assertEqual(coverage.empty, {('translated_number', 'en'): 0})
+
+    def test_command(self):
+        output = StringIO()
+        call_command('translationcoverage', 'app.Normal', languages='en,ja', stdout=output)
+        self.assertEqual(output.getvalue(), 'app.Normal: 4 instance(s)\n'
+                                            '  en: 2 translated, 2 missing\n'
+                                            '  ja: 1 translated, 3 missing\n'
+                                            '    translated_field: 1 empty\n')
+        self.assertCommandError('translationcoverage')
+        self.assertCommandError('translationcoverage', 'app.Nothing')
+        self.assertCommandError('translationcoverage', 'app.Standard')
@@ -49,9 +49,19 @@ class FallbackTests(HvadTestCase, TwoTranslatedNormalMixin):
                 self.assertEqual(len(objs), 3)
                 obj = dict([(obj.pk, obj) for obj in objs])[pk]
                 self.assertEqual(obj.language_code, 'ja')
-            with self.assertNumQueries(2 if LEGACY_FALLBACKS else 1):
+            with self.assertNumQueries(3 if LEGACY_FALLBACKS else 1):
                 objs = list(Normal.objects.untranslated().use_fallbacks('en'))
                 self.assertEqual(len(objs), 3)
+                obj = dict([(item.pk, item) for item in objs])[pk]
+                self.assertEqual(obj.language_code, 'ja')
+
+    def test_no_matching_fallback(self):
+        # none of the fallbacks exist, any translation must do, only once
+        with LanguageOverride('de'):
+            with self.assertNumQueries(3 if LEGACY_FALLBACKS else 1):
+                objs = list(Normal.objects.untranslated().use_fallbacks('fr'))
+                self.assertEqual(len(objs), 2)
+                self.assertTrue(all(obj.language_code in ('en', 'ja') for obj in objs))
 
 
 class FallbackFilterTests(HvadTestCase, TwoTranslatedNormalMixin):
@@ -169,6 +179,31 @@ class FallbackIterTests(HvadTestCase, TwoTranslatedNormalMixin):
 
 
 
+class FallbackChunkedIterTests(HvadTestCase, TwoTranslatedNormalMixin):
+    def test_iterator_chunked(self):
+        Normal.objects.language('ja').create(shared_field='Shared3', translated_field=u'日本語三')
+        qs = Normal.objects.untranslated().use_fallbacks('en', 'ja').order_by('-shared_field')
+        with self.assertNumQueries(4 if LEGACY_FALLBACKS else 2):
+            objs = list(qs.iterator_chunked(chunk_size=2))
+        self.assertEqual([(obj.pk, obj.language_code) for obj in objs],
+                         [(1, 'en'), (2, 'en'), (3, 'ja')])
+        self.assertEqual([obj.pk for obj in qs.iterator_chunked(chunk_size=2, after=2)], [3])
+
+    def test_iterator_chunked_shared(self):
+        # last chunk is full, so one more query finds nothing left
+        with self.assertNumQueries(3):
+            objs = list(Normal.objects.untranslated().iterator_chunked(chunk_size=1))
+        self.assertEqual([obj.pk for obj in objs], [1, 2])
+        self.assertRaises(ValueError, Normal.objects.untranslated().iterator_chunked, chunk_size=0)
+
+    def test_deferred_fallbacks(self):
+        with LanguageOverride('ja'):
+            iterator = Normal.objects.untranslated().use_fallbacks().iterator_chunked(chunk_size=1)
+        with LanguageOverride('en'):
+            objs = list(iterator)
+        self.assertEqual([obj.language_code for obj in objs], ['ja', 'ja'])
+
+
 class FallbackValuesListTests(HvadTestCase, TwoTranslatedNormalMixin):
     def test_values_list_shared(self):
         values = (Normal.objects.untranslated()
@@ -1,13 +1,24 @@
 # -*- coding: utf-8 -*-
+import django
 from django.core.exceptions import FieldError
-from hvad.forms import TranslatableModelForm, TranslatableModelFormMetaclass
+from hvad.forms import (TranslatableModelForm, TranslatableModelFormMetaclass,
+                        translatable_modelform_factory, clear_form_class_cache,
+                        translatable_modelformset_factory, translatable_inlineformset_factory,
+                        translationgridformset_factory)
+from hvad.manager import LEGACY_FALLBACKS
 from hvad.test_utils.context_managers import LanguageOverride
-from hvad.test_utils.testcase import HvadTestCase
+from hvad.test_utils.testcase import HvadTestCase, minimumDjangoVersion
 from hvad.test_utils.project.app.models import Normal, SimpleRelated
 from hvad.test_utils.data import DOUBLE_NORMAL
 from hvad.test_utils.fixtures import TwoTranslatedNormalMixin
+from hvad.test_utils.forms import FormData
 from django.db import models
 from django import forms
+import threading
+if django.VERSION >= (1, 4):
+    from django.test.utils import override_settings
+else:
+    override_settings = lambda **kwargs: (lambda x: x)
 
 class NormalForm(TranslatableModelForm):
     class Meta:
@@ -182,3 +193,162 @@ class FormTests(HvadTestCase, TwoTranslatedNormalMixin):
             rendered = form['normal'].as_widget()
             self.assertIn(DOUBLE_NORMAL[1]['translated_field_ja'], rendered)
             self.assertIn(DOUBLE_NORMAL[2]['translated_field_ja'], rendered)
+
+
+def normal_formfield(field, **kwargs):
+    return field.formfield(**kwargs)
+
+@minimumDjangoVersion(1, 4)
+class FormFactoryCacheTests(HvadTestCase):
+    def setUp(self):
+        super(FormFactoryCacheTests, self).setUp()
+        clear_form_class_cache()
+
+    def test_cached(self):
+        form = translatable_modelform_factory('en', Normal, fields=['translated_field'])
+        self.assertIs(translatable_modelform_factory('en', Normal, fields=('translated_field',)), form)
+        self.assertIsNot(translatable_modelform_factory('ja', Normal, fields=['translated_field']), form)
+        self.assertIsNot(translatable_modelform_factory('en', Normal), form)
+        self.assertIsNot(translatable_modelform_factory('en', Normal, form=NormalForm,
+                                                        fields=['translated_field']), form)
+
+        form = translatable_modelform_factory('en', Normal, exclude=['shared_field'],
+                                              formfield_callback=normal_formfield)
+        self.assertIs(translatable_modelform_factory('en', Normal, exclude=['shared_field'],
+                                                     formfield_callback=normal_formfield), form)
+        self.assertEqual(list(form.base_fields), ['translated_field'])
+
+    def test_not_cached(self):
+        # closures may depend on anything, typically the request
+        def callback(field, **kwargs):
+            return normal_formfield(field, **kwargs)
+        def make_callback():
+            return lambda field, **kwargs: callback(field, **kwargs)
+        form = translatable_modelform_factory('en', Normal, formfield_callback=make_callback())
+        self.assertIsNot(translatable_modelform_factory('en', Normal, formfield_callback=make_callback()),
+                         form)
+
+    def test_bounded(self):
+        with override_settings(HVAD_FORM_CLASS_CACHE_SIZE=2):
+            forms = [translatable_modelform_factory(language, Normal)
+                     for language in ('en', 'ja', 'fr')]
+            self.assertIs(translatable_modelform_factory('fr', Normal), forms[2])
+            self.assertIs(translatable_modelform_factory('ja', Normal), forms[1])
+            self.assertIsNot(translatable_modelform_factory('en', Normal), forms[0])
+
+        with override_settings(HVAD_FORM_CLASS_CACHE_SIZE=0):
+            form = translatable_modelform_factory('en', Normal)
+            self.assertIsNot(translatable_modelform_factory('en', Normal), form)
+
+
+    def test_threads(self):
+        errors = []
+        def run(language):
+            try:
+                for index in range(50):
+                    translatable_modelform_factory(language, Normal)
+            except Exception as e:
+                errors.append(e)
+        with override_settings(HVAD_FORM_CLASS_CACHE_SIZE=1):
+            threads = [threading.Thread(target=run, args=(language,))
+                       for language in ('en', 'ja', 'fr', 'de')]
+            for thread in threads:
+                thread.start()
+            for thread in threads:
+                thread.join()
+            self.assertEqual(errors, [])
+            form = translatable_modelform_factory('en', Normal)
+            self.assertIs(translatable_modelform_factory('en', Normal), form)
+
+
+class FormSetTests(HvadTestCase, TwoTranslatedNormalMixin):
+    def setUp(self):
+        super(FormSetTests, self).setUp()
+        self.english = Normal.objects.language('en').create(shared_field='Shared3',
+                                                            translated_field='English3')
+
+    def test_modelformset_queries(self):
+        FormSet = translatable_modelformset_factory('ja', Normal, extra=0,
+                                                    fields=['shared_field', 'translated_field'])
+        with self.assertNumQueries(2):
+            formset = FormSet(queryset=Normal.objects.order_by('shared_field'))
+            self.assertEqual([form['translated_field'].value() for form in formset],
+                             [DOUBLE_NORMAL[1]['translated_field_ja'],
+                              DOUBLE_NORMAL[2]['translated_field_ja'], ''])
+
+        data = FormData(formset)
+        data.set_formset_field(formset, 2, 'translated_field', u'日本語三')
+        # Django checks the primary key of each bound form on its own
+        with self.assertNumQueries(2 + len(formset.forms)):
+            formset = FormSet(data, queryset=Normal.objects.order_by('shared_field'))
+            self.assertTrue(formset.is_valid())
+        formset.save()
+        obj = Normal.objects.language('ja').get(pk=self.english.pk)
+        self.assertEqual(obj.translated_field, u'日本語三')
+        self.assertEqual(obj.shared_field, 'Shared3')
+
+    def test_inlineformset_queries(self):
+        normal = Normal.objects.untranslated().get(pk=self.english.pk)
+        for index in range(3):
+            related = SimpleRelated.objects.language('en').create(
+                normal=normal, translated_field='English%d' % index)
+            if index:
+                related.translate('ja')
+                related.translated_field = u'日本語%d' % index
+                related.save()
+        FormSet = translatable_inlineformset_factory('ja', Normal, SimpleRelated, extra=0,
+                                                     fields=['translated_field'])
+        with self.assertNumQueries(2):
+            formset = FormSet(instance=normal)
+            self.assertEqual(sorted(form['translated_field'].value() for form in formset),
+                             ['', u'日本語1', u'日本語2'])
+
+
+class GridFormSetTests(HvadTestCase, TwoTranslatedNormalMixin):
+    def setUp(self):
+        super(GridFormSetTests, self).setUp()
+        self.english = Normal.objects.language('en').create(shared_field='Shared3',
+                                                            translated_field='English3')
+
+    def test_grid(self):
+        FormSet = translationgridformset_factory('ja', Normal)
+        queryset = Normal.objects.untranslated().order_by('shared_field')
+        # legacy fallbacks load translations separately, then any other
+        # language for Shared3
+        queries = 3 if LEGACY_FALLBACKS else 1
+        with self.assertNumQueries(queries):
+            formset = FormSet(queryset=queryset)
+            self.assertEqual([list(form.fields) for form in formset],
+                             [['translated_field', 'id']] * 3)
+            self.assertEqual([form['translated_field'].value() for form in formset],
+                             [DOUBLE_NORMAL[1]['translated_field_ja'],
+                              DOUBLE_NORMAL[2]['translated_field_ja'], ''])
+
+        data = FormData(formset)
+        data.set_formset_field(formset, 0, 'translated_field', u'日本語1')
+        data.set_formset_field(formset, 2, 'translated_field', u'日本語3')
+        with self.assertNumQueries(queries):
+            formset = FormSet(data, queryset=queryset)
+            self.assertTrue(formset.is_valid())
+        objs = formset.save()
+        self.assertEqual([obj.shared_field for obj in objs], ['Shared1', 'Shared3'])
+        self.assertEqual(len(formset.changed_objects), 2)
+
+        objs = Normal.objects.language('ja').order_by('shared_field')
+        self.assertEqual([obj.translated_field for obj in objs],
+                         [u'日本語1', DOUBLE_NORMAL[2]['translated_field_ja'], u'日本語3'])
+        self.assertCountEqual(Normal.objects.untranslated().get(pk=self.english.pk)
+                                                           .get_available_languages(),
+                              ['en', 'ja'])
+
+    def test_invalid_pk(self):
+        FormSet = translationgridformset_factory('ja', Normal)
+        formset = FormSet()
+        data = FormData(formset)
+        data.set_formset_field(formset, 0, 'id', '42')
+        formset = FormSet(data)
+        self.assertFalse(formset.is_valid())
+
+    def test_shared_fields(self):
+        self.assertRaises(FieldError, translationgridformset_factory, 'ja', Normal,
+                          fields=['shared_field', 'translated_field'])
@@ -1,11 +1,13 @@
 # -*- coding: utf-8 -*-
+from django.db.models.signals import post_save
 from django.forms import ModelForm
 from hvad.admin import TranslatableModelAdminMixin
-from hvad.forms import translatable_inlineformset_factory, translationformset_factory
+from hvad.forms import (translatable_inlineformset_factory, translationformset_factory,
+                        BaseTranslationFormSet)
 from hvad.test_utils.context_managers import LanguageOverride
 from hvad.test_utils.testcase import HvadTestCase
 from hvad.test_utils.request_factory import RequestFactory
-from hvad.test_utils.project.app.models import Normal, Related
+from hvad.test_utils.project.app.models import Normal, Related, Article
 from hvad.test_utils.forms import FormData
 
 
@@ -30,6 +32,10 @@ class TestBasicInline(HvadTestCase):
             self.assertTrue("translated_to_translated" in formset.forms[0].fields)
             self.assertFalse("language_code" in formset.forms[0].fields)
 
+class BulkTranslationFormSet(BaseTranslationFormSet):
+    bulk_save = True
+
+
 class TestTranslationsInline(HvadTestCase):
     def setUp(self):
         with LanguageOverride('en'):
@@ -132,3 +138,58 @@ class TestTranslationsInline(HvadTestCase):
         self.assertEqual(obj.shared_field, 'test')
         self.assertEqual(obj.translated_field, 'translated_test_de')
 
+
+    def test_bulk_save(self):
+        Formset = translationformset_factory(Normal, formset=BulkTranslationFormSet, extra=2)
+        saved = []
+        def receiver(sender, instance, **kwargs):
+            saved.append(instance.pk)
+        post_save.connect(receiver, sender=Normal)
+        try:
+            initial = Formset(instance=self.object)
+            data = FormData(initial)
+            data.set_formset_field(initial, 0, 'DELETE', 'DELETE')
+            data.set_formset_field(initial, 1, 'translated_field', 'updated_fr')
+            data.set_formset_field(initial, 2, 'language_code', 'de')
+            data.set_formset_field(initial, 2, 'translated_field', 'translated_test_de')
+            data.set_formset_field(initial, 3, 'language_code', 'ja')
+            data.set_formset_field(initial, 3, 'translated_field', 'translated_test_ja')
+
+            formset = Formset(data=data, instance=self.object)
+            self.assertTrue(formset.is_valid())
+            objs = formset.save()
+            self.assertEqual(saved, [])     # master is unchanged
+        finally:
+            post_save.disconnect(receiver, sender=Normal)
+
+        self.assertEqual(sorted(obj.language_code for obj in objs), ['de', 'fr', 'ja'])
+        self.assertTrue(all(obj.pk is not None for obj in objs))
+        self.assertEqual([obj.language_code for obj in formset.deleted_objects], ['en'])
+        self.assertCountEqual(self.object.get_available_languages(), ('de', 'fr', 'ja'))
+
+        obj = Normal.objects.language('fr').get(pk=self.object.pk)
+        self.assertEqual(obj.shared_field, 'test')
+        self.assertEqual(obj.translated_field, 'updated_fr')
+        obj = Normal.objects.language('de').get(pk=self.object.pk)
+        self.assertEqual(obj.translated_field, 'translated_test_de')
+        obj = Normal.objects.language('ja').get(pk=self.object.pk)
+        self.assertEqual(obj.translated_field, 'translated_test_ja')
+
+    def test_bulk_save_master(self):
+        article = Article.objects.language('en').create(slug='test', title='Test')
+        Formset = translationformset_factory(Article, formset=BulkTranslationFormSet, extra=1)
+        initial = Formset(instance=article)
+        data = FormData(initial)
+        data.set_formset_field(initial, 1, 'language_code', 'fr')
+        data.set_formset_field(initial, 1, 'title', 'Essai')
+
+        formset = Formset(data=data, instance=article)
+        article.slug = 'changed'
+        self.assertTrue(formset.is_valid())
+        formset.save()
+        self.assertEqual(article.languages, 'en,fr')
+
+        obj = Article.objects.language('fr').get(pk=article.pk)
+        self.assertEqual(obj.slug, 'changed')
+        self.assertEqual(obj.title, 'Essai')
+        self.assertEqual(obj.languages, 'en,fr')
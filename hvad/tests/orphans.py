@@ -0,0 +1,92 @@
+# -*- coding: utf-8 -*-
+from django.core.management import call_command
+from django.db.models.signals import post_delete
+from hvad.orphans import count_orphans, delete_orphans
+from hvad.test_utils.testcase import HvadTestCase
+from hvad.test_utils.project.app.models import Normal, Article
+from hvad.test_utils.fixtures import TwoTranslatedNormalMixin
+from hvad.utils import get_translatable_models
+try:
+    from StringIO import StringIO   # python 2, accepts native strings
+except ImportError:
+    from io import StringIO
+
+
+class OrphanTests(HvadTestCase, TwoTranslatedNormalMixin):
+    def setUp(self):
+        super(OrphanTests, self).setUp()
+        self.Translation = Normal._meta.translations_model
+        for index in range(3):
+            self.Translation.objects.create(language_code='fr', master=None,
+                                            translated_field='orphan%d' % index)
+
+    def test_translatable_models(self):
+        models = get_translatable_models()
+        self.assertIn(Normal, models)
+        self.assertIn(Article, models)
+        self.assertTrue(all(hasattr(model._meta, 'translations_model') for model in models))
+        self.assertEqual(get_translatable_models(['app.Article', 'app.Normal']), [Article, Normal])
+        self.assertRaises(ValueError, get_translatable_models, ['app.Nothing'])
+        self.assertRaises(ValueError, get_translatable_models, ['app.Standard'])
+        self.assertRaises(ValueError, get_translatable_models, ['Normal'])
+
+    def test_count(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(count_orphans(Normal), 3)
+        self.assertEqual(count_orphans(Article), 0)
+
+    def test_delete(self):
+        progress = []
+        self.assertEqual(delete_orphans(Normal, batch_size=2, callback=progress.append), 3)
+        self.assertEqual(progress, [2, 3])
+        self.assertEqual(count_orphans(Normal), 0)
+        self.assertEqual(self.Translation.objects.count(), 4)
+        with self.assertNumQueries(1):
+            self.assertEqual(delete_orphans(Normal), 0)
+
+    def test_delete_signals(self):
+        deleted = []
+        def receiver(instance, **kwargs):
+            deleted.append(instance.translated_field)
+        post_delete.connect(receiver, sender=self.Translation)
+        try:
+            self.assertEqual(delete_orphans(Normal, batch_size=2), 3)
+        finally:
+            post_delete.disconnect(receiver, sender=self.Translation)
+        self.assertEqual(sorted(deleted), ['orphan0', 'orphan1', 'orphan2'])
+        self.assertEqual(count_orphans(Normal), 0)
+        self.assertEqual(self.Translation.objects.count(), 4)
+
+    def test_delete_limit(self):
+        self.assertEqual(delete_orphans(Normal, batch_size=10, limit=2), 2)
+        self.assertEqual(count_orphans(Normal), 1)
+        self.assertEqual(delete_orphans(Normal, batch_size=10, limit=2), 1)
+        self.assertEqual(count_orphans(Normal), 0)
+        self.assertRaises(ValueError, delete_orphans, Normal, batch_size=0)
+
+    def test_command(self):
+        output = StringIO()
+        call_command('deleteorphantranslations', 'app.Normal', dry_run=True, stdout=output)
+        self.assertEqual(output.getvalue(), 'app.Normal: 3 orphan translation(s)\n')
+        self.assertEqual(count_orphans(Normal), 3)
+
+        output = StringIO()
+        call_command('deleteorphantranslations', 'app.Normal', limit=1, stdout=output)
+        self.assertEqual(output.getvalue(), 'app.Normal: 1 orphan translation(s) deleted\n')
+
+        output = StringIO()
+        call_command('deleteorphantranslations', 'app.Normal', 'app.Article', stdout=output)
+        self.assertEqual(output.getvalue(), 'app.Normal: 2 orphan translation(s) deleted\n'
+                                            'app.Article: 0 orphan translation(s) deleted\n')
+        self.assertEqual(count_orphans(Normal), 0)
+
+        self.assertCommandError('deleteorphantranslations', 'app.Nothing')
+        self.assertCommandError('deleteorphantranslations', 'app.Standard')
+        self.assertCommandError('deleteorphantranslations', batch_size=0)
+
+    def test_command_all_models(self):
+        # Models without tables, such as those of test modules, are skipped
+        output = StringIO()
+        call_command('deleteorphantranslations', dry_run=True, stdout=output)
+        self.assertIn('app.Normal: 3 orphan translation(s)\n', output.getvalue())
+        self.assertIn('app.Article: 0 orphan translation(s)\n', output.getvalue())
@@ -1,10 +1,15 @@
 # -*- coding: utf-8 -*-
 import django
+from django.db import connection
+from django.db.models.fields import FieldDoesNotExist
+from django.db.models.signals import post_delete
 from django.db.models.query_utils import Q
+from hvad import manager
 from hvad.test_utils.context_managers import LanguageOverride
 from hvad.test_utils.data import DOUBLE_NORMAL
 from hvad.test_utils.testcase import HvadTestCase
-from hvad.test_utils.project.app.models import Normal, AggregateModel, Standard, SimpleRelated
+from hvad.test_utils.project.app.models import (Normal, AggregateModel, Standard, SimpleRelated,
+                                                Related, Boolean)
 from hvad.test_utils.fixtures import TwoTranslatedNormalMixin
 
 class FilterTests(HvadTestCase, TwoTranslatedNormalMixin):
@@ -148,6 +153,38 @@ class IterTests(HvadTestCase, TwoTranslatedNormalMixin):
                 self.assertEqual(obj.translated_field, DOUBLE_NORMAL[index]['translated_field_ja'])
 
 
+class ChunkedIterTests(HvadTestCase, TwoTranslatedNormalMixin):
+    def setUp(self):
+        super(ChunkedIterTests, self).setUp()
+        for index in range(3, 6):
+            Normal.objects.language('en').create(shared_field='Shared%d' % index,
+                                                 translated_field='English%d' % index)
+
+    def test_iterator_chunked(self):
+        qs = Normal.objects.language('en').order_by('-translated_field')
+        with self.assertNumQueries(3):
+            objs = list(qs.iterator_chunked(chunk_size=2))
+        self.assertEqual([obj.pk for obj in objs], [1, 2, 3, 4, 5])
+        self.assertEqual([obj.translated_field for obj in objs],
+                         ['English%d' % index for index in range(1, 6)])
+        with self.assertNumQueries(1):
+            self.assertEqual(len(list(qs.iterator_chunked(chunk_size=10))), 5)
+
+    def test_iterator_chunked_resume(self):
+        qs = Normal.objects.language('en').filter(shared_field__in=['Shared1', 'Shared3', 'Shared4'])
+        self.assertEqual([obj.pk for obj in qs.iterator_chunked(chunk_size=1, after=1)], [3, 4])
+        with LanguageOverride('ja'):
+            qs = Normal.objects.language()
+            iterator = qs.iterator_chunked(chunk_size=1)
+        with LanguageOverride('en'):
+            objs = list(iterator)
+        self.assertEqual([(obj.pk, obj.language_code) for obj in objs], [(1, 'ja'), (2, 'ja')])
+
+    def test_iterator_chunked_invalid(self):
+        self.assertRaises(ValueError, Normal.objects.language('en').iterator_chunked, chunk_size=0)
+        self.assertRaises(ValueError, Normal.objects.language('all').iterator_chunked)
+
+
 class UpdateTests(HvadTestCase, TwoTranslatedNormalMixin):
     def test_update_shared(self):
         NEW_SHARED = 'new shared'
@@ -270,6 +307,181 @@ class ValuesListTests(HvadTestCase, TwoTranslatedNormalMixin):
         ]
         self.assertEqual(values_list, check)
 
+class RowsTests(HvadTestCase, TwoTranslatedNormalMixin):
+    def setUp(self):
+        super(RowsTests, self).setUp()
+        self.normal_id = dict((index, Normal.objects.untranslated().get(shared_field=data['shared_field']).pk)
+                              for index, data in DOUBLE_NORMAL.items())
+
+    def test_rows_default_fields(self):
+        with self.assertNumQueries(1):
+            rows = list(Normal.objects.language('ja').order_by('pk').as_rows())
+        self.assertEqual(rows[0]._fields, ('id', 'shared_field', 'translated_field', 'language_code'))
+        for index, row in enumerate(rows, 1):
+            self.assertEqual(row.id, self.normal_id[index])
+            self.assertEqual(row.shared_field, DOUBLE_NORMAL[index]['shared_field'])
+            self.assertEqual(row.translated_field, DOUBLE_NORMAL[index]['translated_field_ja'])
+            self.assertEqual(row.language_code, 'ja')
+        self.assertEqual(type(rows[0]).__slots__, ())
+
+    def test_rows_given_fields(self):
+        qs = Normal.objects.language('en').filter(shared_field=DOUBLE_NORMAL[2]['shared_field'])
+        rows = list(qs.as_rows('translated_field', 'pk'))
+        self.assertEqual(rows, [(DOUBLE_NORMAL[2]['translated_field_en'], self.normal_id[2])])
+        self.assertEqual(rows[0].pk, self.normal_id[2])
+        self.assertIs(type(rows[0]), type(next(iter(qs.as_rows('translated_field', 'pk')))))
+
+    def test_rows_foreign_key(self):
+        normal = Normal.objects.untranslated().get(pk=self.normal_id[1])
+        related = SimpleRelated.objects.language('en').create(normal=normal,
+                                                              translated_field='related')
+        row = SimpleRelated.objects.language('en').as_rows().get()
+        self.assertEqual(row, (related.pk, normal.pk, 'related', 'en'))
+        self.assertEqual(row.normal_id, normal.pk)
+
+    def test_rows_field_names(self):
+        normal = Normal.objects.untranslated().get(pk=self.normal_id[1])
+        SimpleRelated.objects.language('en').create(normal=normal, translated_field='related')
+        row = SimpleRelated.objects.language('en').as_rows('normal__shared_field', 'pk', 'pk').get()
+        self.assertEqual(row._fields, ('normal__shared_field', 'pk', 'field_2'))
+        self.assertEqual(row.normal__shared_field, DOUBLE_NORMAL[1]['shared_field'])
+        self.assertEqual(manager._get_row_field_names(['_private', 'class', '__']),
+                         ['private', 'field_1', 'field_2'])
+
+    def test_rows_classes_bounded(self):
+        for index in range(manager.ROW_CLASSES_MAX + 1):
+            manager.get_row_class(Normal, ['field%d' % index])
+        self.assertTrue(len(manager._row_classes) <= manager.ROW_CLASSES_MAX)
+
+    def test_rows_then_values(self):
+        qs = Normal.objects.language('en').as_rows('shared_field')
+        self.assertEqual(sorted(qs.values_list('pk', flat=True)), sorted(self.normal_id.values()))
+        self.assertEqual(sorted(qs.values_list('pk', 'translated_field')),
+                         sorted((self.normal_id[key], DOUBLE_NORMAL[key]['translated_field_en'])
+                                for key in self.normal_id))
+        self.assertEqual(sorted(row['pk'] for row in qs.values('pk')),
+                         sorted(self.normal_id.values()))
+
+    def test_rows_all_languages(self):
+        rows = Normal.objects.language('all').filter(pk=self.normal_id[1]).as_rows('language_code')
+        self.assertEqual(sorted(row.language_code for row in rows), ['en', 'ja'])
+
+
+class PivotTests(HvadTestCase, TwoTranslatedNormalMixin):
+    def setUp(self):
+        super(PivotTests, self).setUp()
+        self.normal_id = dict((index, Normal.objects.untranslated().get(shared_field=data['shared_field']).pk)
+                              for index, data in DOUBLE_NORMAL.items())
+        self.english = Normal.objects.language('en').create(shared_field='Shared3',
+                                                            translated_field='English3')
+
+    def test_pivot(self):
+        with self.assertNumQueries(1):
+            rows = Normal.objects.language('all').pivot(['translated_field'], ['ja', 'en'])
+        self.assertEqual(rows, [
+            (self.normal_id[1], DOUBLE_NORMAL[1]['translated_field_ja'], DOUBLE_NORMAL[1]['translated_field_en']),
+            (self.normal_id[2], DOUBLE_NORMAL[2]['translated_field_ja'], DOUBLE_NORMAL[2]['translated_field_en']),
+            (self.english.pk, None, 'English3'),
+        ])
+
+    def test_pivot_filtered(self):
+        rows = Normal.objects.language('ja').pivot(['translated_field'], ['en'])
+        self.assertEqual(rows, [
+            (self.normal_id[1], DOUBLE_NORMAL[1]['translated_field_en']),
+            (self.normal_id[2], DOUBLE_NORMAL[2]['translated_field_en']),
+        ])
+        rows = (Normal.objects.language('en').filter(shared_field='Shared3')
+                                             .pivot(['translated_field'], ['en', 'ja']))
+        self.assertEqual(rows, [(self.english.pk, 'English3', None)])
+        with self.assertNumQueries(0):
+            self.assertEqual(Normal.objects.language('en').filter(pk__in=[]).pivot(['translated_field']), [])
+
+    def test_pivot_columns(self):
+        with self.settings(LANGUAGES=(('en', 'English'), ('ja', 'Japanese'))):
+            columns = Normal.objects.language('en').pivot(['translated_field'], columns=True)
+        self.assertEqual(columns, {
+            'pk': [self.normal_id[1], self.normal_id[2], self.english.pk],
+            ('translated_field', 'en'): [DOUBLE_NORMAL[1]['translated_field_en'],
+                                         DOUBLE_NORMAL[2]['translated_field_en'], 'English3'],
+            ('translated_field', 'ja'): [DOUBLE_NORMAL[1]['translated_field_ja'],
+                                         DOUBLE_NORMAL[2]['translated_field_ja'], None],
+        })
+        columns = Normal.objects.language('fr').pivot(['translated_field'], ['en'], columns=True)
+        self.assertEqual(columns, {'pk': [], ('translated_field', 'en'): []})
+
+    def test_pivot_numbers(self):
+        obj = AggregateModel.objects.language('en').create(number=1, translated_number=10)
+        obj.translate('ja')
+        obj.translated_number = 20
+        obj.save()
+        rows = AggregateModel.objects.language('all').pivot(['translated_number'], ['en', 'ja'])
+        self.assertEqual(rows, [(obj.pk, 10, 20)])
+
+    def test_pivot_booleans(self):
+        obj = Boolean.objects.language('en').create(translated_flag=True)
+        obj.translate('ja')
+        obj.translated_flag = False
+        obj.save()
+        rows = Boolean.objects.language('all').pivot(['translated_flag'], ['en', 'ja', 'fr'])
+        self.assertEqual(rows, [(obj.pk, True, False, None)])
+
+    def test_pivot_invalid_field(self):
+        qs = Normal.objects.language('en')
+        self.assertRaises(ValueError, qs.pivot, ['master'])
+        self.assertRaises(ValueError, qs.pivot, ['language_code'])
+        self.assertRaises(FieldDoesNotExist, qs.pivot, ['shared_field'])
+
+
+class TranslationExistsTests(HvadTestCase, TwoTranslatedNormalMixin):
+    def setUp(self):
+        super(TranslationExistsTests, self).setUp()
+        self.english = Normal.objects.language('en').create(shared_field='Shared3',
+                                                            translated_field='English3')
+
+    def test_translated_in(self):
+        with self.assertNumQueries(1):
+            self.assertEqual(list(Normal.objects.translated_in('ja')
+                                                .order_by('shared_field')
+                                                .values_list('shared_field', flat=True)),
+                             ['Shared1', 'Shared2'])
+        self.assertEqual(Normal.objects.translated_in('en').count(), 3)
+        self.assertEqual(Normal.objects.translated_in('fr').count(), 0)
+        with LanguageOverride('ja'):
+            self.assertEqual(Normal.objects.translated_in().count(), 2)
+
+    def test_missing_translation(self):
+        self.assertEqual([obj.pk for obj in Normal.objects.missing_translation('ja')],
+                         [self.english.pk])
+        self.assertEqual(Normal.objects.missing_translation('en').count(), 0)
+        self.assertEqual(Normal.objects.missing_translation('fr').count(), 3)
+        with LanguageOverride('ja'):
+            self.assertEqual(Normal.objects.missing_translation().get().pk, self.english.pk)
+
+    def test_subquery(self):
+        # The subquery selects from the same table, under another alias
+        shared1 = Normal.objects.untranslated().get(shared_field='Shared1')
+        Related.objects.language('en').create(normal=self.english, translated=shared1)
+        inner = Normal.objects.untranslated().missing_translation('ja').values('pk')
+        qs = Normal.objects.untranslated().filter(rel3__master__normal__in=inner)
+        self.assertEqual([obj.pk for obj in qs], [shared1.pk])
+        inner = Normal.objects.untranslated().translated_in('ja').values('pk')
+        self.assertEqual(Normal.objects.untranslated().exclude(pk__in=inner).get().pk,
+                         self.english.pk)
+
+    def test_orphan_translations(self):
+        Normal._meta.translations_model.objects.create(language_code='fr', master=None,
+                                                       translated_field='Orphan')
+        self.assertEqual(Normal.objects.translated_in('fr').count(), 0)
+        self.assertEqual(Normal.objects.missing_translation('fr').count(), 3)
+
+    def test_fallback_queryset(self):
+        qs = Normal.objects.untranslated().use_fallbacks('ja', 'en').missing_translation('ja')
+        self.assertEqual([obj.translated_field for obj in qs], ['English3'])
+        qs = (Normal.objects.untranslated().translated_in('en').translated_in('ja')
+                                           .filter(shared_field='Shared2'))
+        self.assertEqual(qs.get().shared_field, 'Shared2')
+
+
 class ValuesTests(HvadTestCase, TwoTranslatedNormalMixin):
     def test_values_shared(self):
         values = Normal.objects.language('en').values('shared_field')
@@ -330,6 +542,16 @@ class ValuesTests(HvadTestCase, TwoTranslatedNormalMixin):
         ]
         self.assertEqual(values_list, check)
 
+    def test_values_extra(self):
+        values = (Normal.objects.language('en').extra(select={'answer': '42'})
+                                .values('shared_field', 'answer'))
+        values_list = list(values)
+        check = [
+            {'shared_field': DOUBLE_NORMAL[1]['shared_field'], 'answer': 42},
+            {'shared_field': DOUBLE_NORMAL[2]['shared_field'], 'answer': 42},
+        ]
+        self.assertEqual(values_list, check)
+
 class InBulkTests(HvadTestCase, TwoTranslatedNormalMixin):
     def setUp(self):
         super(InBulkTests, self).setUp()
@@ -400,6 +622,37 @@ class DeleteTests(HvadTestCase, TwoTranslatedNormalMixin):
         self.assertEqual(Normal.objects.untranslated().count(), 2)
         self.assertEqual(Normal._meta.translations_model.objects.count(), 2)
 
+    def test_delete_translation_queries(self):
+        with self.assertNumQueries(1):
+            Normal.objects.language('en').delete_translations()
+        with self.assertNumQueries(1 if connection.features.update_can_self_select else 2):
+            (Normal.objects.language('ja')
+                           .filter(shared_field=DOUBLE_NORMAL[1]['shared_field'])
+                           .delete_translations())
+        self.assertEqual(Normal._meta.translations_model.objects.count(), 1)
+
+    def test_delete_translation_signals(self):
+        # receivers get their signals, as the regular delete is used then
+        deleted = []
+        def receiver(sender, instance, **kwargs):
+            deleted.append(instance.language_code)
+        Translation = Normal._meta.translations_model
+        post_delete.connect(receiver, sender=Translation)
+        try:
+            Normal.objects.language('en').delete_translations()
+        finally:
+            post_delete.disconnect(receiver, sender=Translation)
+        self.assertEqual(deleted, ['en', 'en'])
+        self.assertEqual(Translation.objects.count(), 2)
+
+    def test_delete_translation_keeps_orphans(self):
+        # translations detached from their master are not swept along
+        Translation = Normal._meta.translations_model
+        Translation.objects.filter(master=2, language_code='ja').update(master=None)
+        Normal.objects.language('en').delete_translations()
+        self.assertEqual(Translation.objects.filter(master__isnull=True).count(), 1)
+        self.assertEqual(Translation.objects.count(), 2)
+
     def test_delete_translation_deferred_language(self):
         self.assertEqual(Normal._meta.translations_model.objects.count(), 4)
         with LanguageOverride('ja'):
@@ -411,6 +664,78 @@ class DeleteTests(HvadTestCase, TwoTranslatedNormalMixin):
         self.assertEqual(Normal.objects.language('en').count(), 0)
 
 
+class ChunkedWriteTests(HvadTestCase, TwoTranslatedNormalMixin):
+    def test_update_chunked(self):
+        chunks = []
+        count = (Normal.objects.language('en')
+                               .update_chunked(1, {'shared_field': 'new shared',
+                                                   'translated_field': 'new translated'},
+                                               callback=chunks.append))
+        self.assertEqual(count, 4)
+        self.assertEqual(chunks, [[1], [2]])
+        self.assertEqual(Normal.objects.language('en').filter(translated_field='new translated').count(), 2)
+        self.assertEqual(Normal.objects.language('ja').filter(shared_field='new shared').count(), 2)
+
+    def test_update_chunked_filtered(self):
+        chunks = []
+        count = (Normal.objects.language('ja')
+                               .filter(shared_field=DOUBLE_NORMAL[2]['shared_field'])
+                               .update_chunked(10, {'translated_field': 'new translated'},
+                                               callback=chunks.append))
+        self.assertEqual(count, 1)
+        self.assertEqual(chunks, [[2]])
+        self.assertEqual(Normal.objects.language('ja').get(pk=2).translated_field, 'new translated')
+        self.assertEqual(Normal.objects.language('ja').get(pk=1).translated_field,
+                         DOUBLE_NORMAL[1]['translated_field_ja'])
+
+    def test_delete_chunked(self):
+        chunks = []
+        Normal.objects.language('en').delete_chunked(1, callback=chunks.append)
+        self.assertEqual(chunks, [[1], [2]])
+        self.assertEqual(Normal.objects.untranslated().count(), 0)
+        self.assertEqual(Normal._meta.translations_model.objects.count(), 0)
+
+    def test_delete_chunked_matches_delete(self):
+        # delete() matches shared instances regardless of the language
+        def create():
+            Normal.objects.untranslated().delete()
+            Normal.objects.language('en').create(shared_field='one', translated_field='English')
+            Normal.objects.language('ja').create(shared_field='two', translated_field='Japanese')
+        create()
+        Normal.objects.language('en').delete()
+        expected = list(Normal.objects.untranslated().values_list('shared_field', flat=True))
+        create()
+        Normal.objects.language('en').delete_chunked(10)
+        self.assertEqual(list(Normal.objects.untranslated().values_list('shared_field', flat=True)),
+                         expected)
+        self.assertEqual(expected, [])
+
+    def test_delete_translations_chunked(self):
+        chunks = []
+        Normal.objects.language('ja').delete_translations_chunked(1, callback=chunks.append)
+        self.assertEqual(chunks, [[1], [2]])
+        self.assertEqual(Normal.objects.untranslated().count(), 2)
+        self.assertEqual(Normal._meta.translations_model.objects.count(), 2)
+
+    def test_chunked_empty(self):
+        chunks = []
+        with self.assertNumQueries(1):
+            Normal.objects.language('de').delete_translations_chunked(10, callback=chunks.append)
+        with self.assertNumQueries(1):
+            (Normal.objects.language('en').filter(translated_field='missing')
+                           .delete_chunked(10, callback=chunks.append))
+        self.assertEqual(chunks, [])
+        self.assertEqual(Normal.objects.language('de').update_chunked(10, {'shared_field': 'x'}), 0)
+
+    def test_invalid_batch_size(self):
+        self.assertRaises(ValueError, Normal.objects.language('en').delete_chunked, 0)
+        self.assertEqual(Normal.objects.untranslated().count(), 2)
+
+    def test_field_names_not_shadowed(self):
+        # update() only takes field values, so no field name is reserved
+        self.assertRaises(FieldDoesNotExist, Normal.objects.language('en').update, batch_size=1)
+
+
 class GetTranslationFromInstanceTests(HvadTestCase):
     def test_simple(self):
         # Create the instances
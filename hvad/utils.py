@@ -1,7 +1,41 @@
 import django
+from django.conf import settings
+from django.db import connections, router, transaction
+from django.db.models import Model
 from django.db.models.fields import FieldDoesNotExist
+from django.db.models.query import QuerySet
+from django.db.models.sql.subqueries import DeleteQuery
 from django.utils.translation import get_language
-from hvad.exceptions import WrongManager
+from hvad import cache as translation_cache
+from hvad.compat.force_unicode import force_unicode
+from hvad.compat.settings import settings_updater
+from hvad.exceptions import WrongManager, LazyLoadWarning, LazyLoadError
+import os
+import sys
+import threading
+import warnings
+import weakref
+if django.VERSION >= (1, 7):
+    from django.apps import apps
+    get_model, get_models = apps.get_model, apps.get_models
+else:
+    from django.db.models import get_model, get_models
+
+@settings_updater
+def update_settings(*args, **kwargs):
+    global STRICT_LOADS
+    STRICT_LOADS = getattr(settings, 'HVAD_STRICT_LOADS', None)
+
+# Per thread override of HVAD_STRICT_LOADS, set by StrictLoads, and instances
+# yielded along with others by queryset iterators.
+_local = threading.local()
+
+# Modules performing lazy loads on behalf of the user, skipped when looking
+# for the call site of a lazy load.
+_LAZY_LOAD_MODULES = frozenset(
+    os.path.join(os.path.dirname(os.path.abspath(__file__)), name)
+    for name in ('utils', 'descriptors', 'models')
+)
 
 def combine(trans, klass):
     """
@@ -25,8 +59,282 @@ def get_translation(instance, language_code=None):
     opts = instance._meta
     if not language_code:
         language_code = get_language()
-    accessor = getattr(instance, opts.translations_accessor)
-    return accessor.get(language_code=language_code)
+    trans = translation_cache.load_translation(instance, language_code)
+    if trans is None:
+        accessor = getattr(instance, opts.translations_accessor)
+        trans = accessor.get(language_code=language_code)
+        translation_cache.store_translation(trans)
+    return trans
+
+def _find_lazy_load_caller():
+    frame = sys._getframe(1)
+    while frame.f_back is not None:
+        filename = os.path.splitext(os.path.abspath(frame.f_code.co_filename))[0]
+        if filename not in _LAZY_LOAD_MODULES:
+            break
+        frame = frame.f_back
+    return '%s:%d, in %s()' % (frame.f_code.co_filename, frame.f_lineno,
+                               frame.f_code.co_name)
+
+def get_strict_loads():
+    """
+    Return the lazy load reporting mode of current thread: the one set by
+    StrictLoads if any, the HVAD_STRICT_LOADS setting otherwise.
+    """
+    return getattr(_local, 'strict_loads', STRICT_LOADS)
+
+def track_results(results):
+    """
+    Wrap an iterator over queryset results, so that lazy loads on its
+    instances are reported if it yields more than one, as they would then
+    run once per iteration of a loop. Does nothing unless reporting is on.
+    """
+    if not get_strict_loads():
+        return results
+    return _track_results(results)
+
+def _track_results(results):
+    tracked = getattr(_local, 'results', None)
+    if tracked is None:
+        tracked = _local.results = weakref.WeakValueDictionary()
+    first = None
+    for index, instance in enumerate(results):
+        if isinstance(instance, Model):
+            if index == 0:
+                first = instance
+            else:
+                if index == 1 and first is not None:
+                    tracked[id(first)] = first
+                tracked[id(instance)] = instance
+        yield instance
+
+def report_lazy_load(instance, reason):
+    """
+    Report an implicit query loading translations of instance, if it was
+    returned along with other results by a queryset, according to the
+    lazy load reporting mode: None ignores it, 'warn' issues a
+    LazyLoadWarning and 'raise' raises a LazyLoadError.
+    """
+    mode = get_strict_loads()
+    if not mode:
+        return
+    tracked = getattr(_local, 'results', None)
+    if tracked is None or tracked.get(id(instance)) is not instance:
+        return
+    message = ('%s lazily loaded translations of %s (pk=%s) from %s' %
+               (reason, instance.__class__.__name__, instance.pk,
+                _find_lazy_load_caller()))
+    if mode == 'raise':
+        raise LazyLoadError(message)
+    warnings.warn(message, LazyLoadWarning, stacklevel=3)
+
+def _chunked(iterable, size):
+    """
+    Yield lists of at most size items from iterable.
+    """
+    chunk = []
+    for item in iterable:
+        chunk.append(item)
+        if len(chunk) == size:
+            yield chunk
+            chunk = []
+    if chunk:
+        yield chunk
+
+def refresh_available_languages(model, pks=None, using=None):
+    """
+    Recompute the available languages field of model instances with given
+    primary keys, or all instances. Returns a dictionary mapping primary keys
+    to their new field value. Does nothing and returns None if the model does
+    not maintain such a field.
+    Instances are locked while their languages are read, so concurrent
+    refreshes cannot overwrite each other with stale values. Runs two queries
+    per 500 instances and one update per distinct value.
+    """
+    name = getattr(model._meta, 'available_languages_field', None)
+    if name is None:
+        return None
+    using = using or router.db_for_write(model)
+    if django.VERSION >= (1, 6):
+        with transaction.atomic(using=using, savepoint=False):
+            return _refresh_available_languages(model, name, pks, using)
+    # Earlier versions always run queries inside a transaction
+    return _refresh_available_languages(model, name, pks, using)
+
+def _refresh_available_languages(model, name, pks, using):
+    if pks is None:
+        pks = QuerySet(model, using=using).values_list('pk', flat=True)
+    pks = list(pks)
+    languages = dict((pk, []) for pk in pks)
+    tmodel = model._meta.translations_model
+    for chunk in _chunked(pks, 500):
+        if django.VERSION >= (1, 4):
+            list(QuerySet(model, using=using).filter(pk__in=chunk)
+                 .select_for_update().values_list('pk', flat=True))
+        qs = QuerySet(tmodel, using=using).filter(master__in=chunk)
+        for master_id, language_code in qs.values_list('master', 'language_code'):
+            languages[master_id].append(force_unicode(language_code))
+
+    values = dict((pk, ','.join(sorted(codes))) for pk, codes in languages.items())
+    groups = {}
+    for pk, value in values.items():
+        groups.setdefault(value, []).append(pk)
+    for value, group in groups.items():
+        for chunk in _chunked(group, 500):
+            qs = QuerySet(model, using=using).filter(pk__in=chunk)
+            translation_cache.invalidate_queryset(qs)
+            qs.update(**{name: value})
+    if groups:
+        translation_cache.bump_generation(model, using)
+    return values
+
+def write_translations(model, using, updated=(), created=(), deleted=None):
+    """
+    Write translations of model directly, without calling their save() or
+    delete() methods and without sending signals:
+        - updated is a list of (translation, update_fields) tuples, each
+          translation is written with one UPDATE of the named fields, or of
+          its dirty fields if update_fields is None;
+        - created translations are written with a single INSERT;
+        - deleted maps primary keys of translations to their master's, they
+          are deleted with a single DELETE.
+    Available languages of affected instances are refreshed. Returns their
+    new value, as refresh_available_languages() does.
+    """
+    tmodel = model._meta.translations_model
+    updates, refreshed = [], set()
+    for translation, update_fields in updated:
+        names = (translation.get_dirty_fields() if update_fields is None
+                 else update_fields)
+        fields = []
+        for field in tmodel._meta.fields:
+            if getattr(field, 'auto_now', False):
+                field.pre_save(translation, False)
+            elif field.name not in names or field.primary_key:
+                continue
+            fields.append(field)
+        if fields:
+            updates.append((translation, fields))
+            if 'language_code' in names:
+                refreshed.add(translation.master_id)
+    deleted = deleted or {}
+
+    written = list(deleted)
+    written.extend(item[0].pk for item in updates)
+    if written:
+        translation_cache.invalidate_queryset(
+            QuerySet(tmodel, using=using).filter(pk__in=written))
+    for translation, fields in updates:
+        QuerySet(tmodel, using=using).filter(pk=translation.pk).update(
+            **dict((field.name, getattr(translation, field.attname)) for field in fields))
+        translation._saved_values = translation._get_field_values()
+    if deleted:
+        DeleteQuery(tmodel).delete_batch(list(deleted), using)
+        refreshed.update(deleted.values())
+    if created:
+        if django.VERSION >= (1, 4):
+            QuerySet(tmodel, using=using).bulk_create(created)
+        else:
+            for translation in created:
+                translation.save(force_insert=True, using=using)
+        # Bulk inserts do not set primary keys on most databases
+        if any(translation.pk is None for translation in created):
+            qs = QuerySet(tmodel, using=using).filter(
+                master__in=set(translation.master_id for translation in created),
+                language_code__in=set(translation.language_code for translation in created))
+            pks = dict(((master_id, language_code), pk) for master_id, language_code, pk
+                       in qs.values_list('master', 'language_code', 'pk'))
+            for translation in created:
+                translation.pk = pks[(translation.master_id, translation.language_code)]
+        for translation in created:
+            translation._state.adding, translation._state.db = False, using
+            translation._saved_values = translation._get_field_values()
+            refreshed.add(translation.master_id)
+
+    refreshed.discard(None)
+    values = refresh_available_languages(model, refreshed, using) if refreshed else None
+    if updates or deleted or created:
+        translation_cache.bump_generation(model, using)
+    return values
+
+def load_available_languages(instances, using=None):
+    """
+    Load the available languages of all instances at once, so their
+    get_available_languages() method runs no query. Instances must belong to
+    the same model. Runs one query per 500 instances.
+    """
+    instances = [instance for instance in instances if instance.pk is not None]
+    if not instances:
+        return
+    languages = dict((instance.pk, []) for instance in instances)
+    pks = list(languages)
+    tmodel = instances[0]._meta.translations_model
+    for chunk in _chunked(pks, 500):
+        qs = QuerySet(tmodel, using=using).filter(master__in=chunk)
+        for master_id, language_code in qs.values_list('master', 'language_code'):
+            languages[master_id].append(force_unicode(language_code))
+    for instance in instances:
+        instance._available_languages = sorted(languages[instance.pk])
+
+def load_translations(instances, language_code, using=None):
+    """
+    Load the translation in language_code of all instances at once, so they
+    can be used by forms without running a query each. Instances that have no
+    such translation get a new, unsaved one, as with translate(). Instances
+    must belong to the same model. Runs one query per 500 instances.
+    """
+    instances = [instance for instance in instances if instance.pk is not None]
+    if not instances:
+        return
+    opts = instances[0]._meta
+    missing = dict((instance.pk, instance) for instance in instances
+                   if getattr(get_cached_translation(instance), 'language_code', None) != language_code)
+    pks = list(missing)
+    for chunk in _chunked(pks, 500):
+        qs = QuerySet(opts.translations_model, using=using).filter(
+            master__in=chunk, language_code=language_code)
+        for translation in qs:
+            instance = missing.pop(translation.master_id)
+            translation.master = instance
+            setattr(instance, opts.translations_cache, translation)
+    for instance in missing.values():
+        instance.translate(language_code)
+
+def get_translatable_models(labels=None, using=None):
+    """
+    Return translatable models named by 'app_label.ModelName' labels, or all
+    installed translatable models whose tables exist on their database, or
+    on database using if given. Proxies are excluded from the latter, as they
+    share the translations table of their concrete model. Raises ValueError
+    if a label does not name a translatable model.
+    """
+    if labels:
+        models = []
+        for label in labels:
+            try:
+                app_label, model_name = label.split('.')
+                model = get_model(app_label, model_name)
+            except (ValueError, LookupError):
+                model = None
+            if model is None:
+                raise ValueError('Unknown model: %s' % label)
+            if not hasattr(model._meta, 'translations_model'):
+                raise ValueError('%s is not a translatable model' % label)
+            models.append(model)
+        return models
+
+    tables = {}
+    models = []
+    for model in get_models():
+        if not hasattr(model._meta, 'translations_model') or model._meta.proxy:
+            continue
+        alias = using or router.db_for_write(model)
+        if alias not in tables:
+            tables[alias] = set(connections[alias].introspection.table_names())
+        if (model._meta.db_table in tables[alias] and
+            model._meta.translations_model._meta.db_table in tables[alias]):
+            models.append(model)
+    return models
 
 def get_translation_aware_manager(model):
     from hvad.manager import TranslationAwareManager